@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 import keras
 from common.exceptions import InvalidArgumentException
+from common.augmentation import ImageAugmenter
 from common.functions import get_features, sentences_to_hot_vector
 import logging
 
@@ -19,20 +20,36 @@ class DataGenerator(keras.utils.Sequence):
                  batch_size: int = 32,
                  n_channels: int = 1,
                  shuffle: bool = True,
-                 augmentations=10) -> None:
-        """Initialization"""
+                 augmentations=10,
+                 image_provider=None,
+                 augmenter: ImageAugmenter = None) -> None:
+        """
+        Initialization
+        :param augmenter: if given, augmentations are applied on the fly to the decoded images,
+                          instead of reading the augmented images listed in augmentations.parquet
+        """
 
         self.shuffle = shuffle
+        self.image_provider = image_provider
+        self.augmenter = augmenter
+        self.question_embeddings = data_access.load_embeddings('question_embedding')
         self.prediction_vector = self.__get_prediction_vector(prediction_vector)
 
-        orig_data = data_access.load_processed_data()
+        # Question embeddings are gathered from self.question_embeddings
+        orig_data = data_access.load_processed_data(attach_embeddings=False)
 
-        df_augmentations = data_access.load_augmentation_data(augmentations=augmentations).sort_values(
-            'augmentation').reset_index(drop=True)
+        if augmenter is not None:
+            # Augmentation 0 is the original image
+            augmentation_count = max(int(augmentations or 1), 1)
+            joined = pd.concat([orig_data.assign(augmentation=i) for i in range(augmentation_count)],
+                               ignore_index=True)
+        else:
+            df_augmentations = data_access.load_augmentation_data(augmentations=augmentations).sort_values(
+                'augmentation').reset_index(drop=True)
 
-        data = orig_data.set_index('path')
-        augs = df_augmentations.set_index('original_path')
-        joined = data.join(augs, how='left').reset_index(drop=True)
+            data = orig_data.set_index('path')
+            augs = df_augmentations.set_index('original_path')
+            joined = data.join(augs, how='left').reset_index(drop=True)
         self.data = joined.sort_values(by='augmentation')
 
         self.batch_size = batch_size
@@ -76,14 +93,16 @@ class DataGenerator(keras.utils.Sequence):
             if self.shuffle:
                 data = data.sample(frac=1)  # .reset_index(drop=True)
 
-            X, y = self._generate_data(data, self.prediction_vector)
+            X, y = self._generate_data(data, self.prediction_vector, self.image_provider, self.augmenter,
+                                      self.question_embeddings)
         except Exception as ex:
             logger.exception('Got an error while loading data')
             raise
         return X, y
 
     def get_full_data(self):
-        X, y = self._generate_data(self.data, self.prediction_vector)
+        X, y = self._generate_data(self.data, self.prediction_vector, self.image_provider, self.augmenter,
+                                  self.question_embeddings)
         return X, y
 
     @lru_cache(2)
@@ -97,14 +116,23 @@ class DataGenerator(keras.utils.Sequence):
         self.indexes = np.arange(len(self.data))
 
     @staticmethod
-    def _generate_data(df: pd.DataFrame, prediction_vector: iter) -> (iter, iter):
+    def _generate_data(df: pd.DataFrame, prediction_vector: iter, image_provider=None,
+                       augmenter: ImageAugmenter = None, question_embeddings: np.ndarray = None) -> (iter, iter):
         """Generates data containing batch_size samples"""  # X : (n_samples, *dim, n_channels)
         # Initialization
         # X = np.empty((self.batch_size, *self.dim, self.n_channels))
         # y = np.empty((self.batch_size), dtype=int)
         try:
             # with VerboseTimer(f'Getting {item_count} train features'):
-            features = get_features(df)
+            features = get_features(df, image_provider=image_provider, question_embeddings=question_embeddings)
+            if augmenter is not None:
+                question_features, image_features = features
+                if image_features.ndim != 4:
+                    raise InvalidArgumentException(argument_name='augmenter', argument=augmenter,
+                                                   message='Augmentations can only be applied to images, '
+                                                           f'but got features of shape {image_features.shape}')
+                image_features = augmenter.augment(image_features, df['path'], df['augmentation'])
+                features = [question_features, image_features]
             # with VerboseTimer(f'Getting {item_count} train labels'):
             labels = sentences_to_hot_vector(labels=df.processed_answer, classes=prediction_vector)
 
@@ -18,6 +18,8 @@ DEFAULT_IMAGE_WEIGHTS = 'imagenet'
 #  Since VGG was trained as a image of 224x224, every new image
 # is required to go through the same transformation
 image_size_by_base_models = {'imagenet': (224, 224)}
+# The length of VGG19 last convolution block after the global average pooling
+IMAGE_FEATURES_DIM = 512
 
 LSTM_UNITS = 64
 POST_CONCAT_DENSE_UNITS = 16  # 64  # 256
@@ -36,7 +38,8 @@ class VqaModelBuilder(object):
                  optimizer: str = OPTIMIZER,
                  prediction_vector_name: str = 'answers',
                  question_category: str = '',
-                 use_text_inputs_attention=False) -> None:
+                 use_text_inputs_attention=False,
+                 use_bottleneck_features=False) -> None:
         """"""
         super(VqaModelBuilder, self).__init__()
         self.loss_function = loss_function
@@ -52,6 +55,7 @@ class VqaModelBuilder(object):
 
         self.lstm_units = lstm_units
         self.use_text_inputs_attention = use_text_inputs_attention
+        self.use_bottleneck_features = use_bottleneck_features
         if isinstance(post_concat_dense_units, int):
             post_concat_arr = (post_concat_dense_units,)
         else:
@@ -97,7 +101,12 @@ class VqaModelBuilder(object):
         return model
 
     @staticmethod
-    def get_image_model(base_model_weights=DEFAULT_IMAGE_WEIGHTS):
+    def get_image_model(base_model_weights=DEFAULT_IMAGE_WEIGHTS, use_bottleneck_features=False):
+        if use_bottleneck_features:
+            # The frozen layers were already applied offline (see BottleneckFeatureStore)
+            image_features_input = Input(shape=(IMAGE_FEATURES_DIM,), name='image_features_input')
+            return image_features_input, image_features_input
+
         base_model_weights = base_model_weights
 
         base_model = VGG19(weights=base_model_weights, include_top=False)
@@ -113,6 +122,12 @@ class VqaModelBuilder(object):
         model = x
         return base_model.input, model
 
+    @staticmethod
+    def get_image_features_model(base_model_weights=DEFAULT_IMAGE_WEIGHTS) -> Model:
+        """The frozen part of the image model, for computing the bottleneck features offline"""
+        image_input_tensor, image_model = VqaModelBuilder.get_image_model(base_model_weights)
+        return Model(inputs=image_input_tensor, outputs=image_model)
+
     def get_vqa_model(self):
         use_text_inputs_attention = self.use_text_inputs_attention
         use_post_merge_attention = False
@@ -135,7 +150,8 @@ class VqaModelBuilder(object):
 
             logger.debug("Getting image model")
 
-            image_input_tensor, image_model = self.get_image_model()
+            image_input_tensor, image_model = \
+                self.get_image_model(use_bottleneck_features=self.use_bottleneck_features)
 
             logger.debug("merging final model")
             fc_tensors = keras_layers.concatenate([image_model, lstm_model])
@@ -185,8 +201,11 @@ class VqaModelBuilder(object):
     def save_model(model: Model,
                    prediction_df_name: str,
                    question_category: str = None,
-                   folder_suffix: str = '') -> ModelFolder:
-        additional_info = {'prediction_data': prediction_df_name, 'question_category': question_category}
+                   folder_suffix: str = '',
+                   use_bottleneck_features: bool = False) -> ModelFolder:
+        additional_info = {'prediction_data': prediction_df_name,
+                           'question_category': question_category,
+                           'use_bottleneck_features': use_bottleneck_features}
         model_folder: ModelFolder = save_model(model,
                                                vqa_models_folder,
                                                additional_info,
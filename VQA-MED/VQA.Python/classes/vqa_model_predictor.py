@@ -2,11 +2,9 @@ import logging
 import pandas as pd
 import numpy as np
 from collections import defaultdict
-import itertools
 from pathlib import Path
 from typing import Union
 
-import tqdm
 from keras import Model as keras_model
 
 from common import DAL
@@ -16,8 +14,10 @@ from common.os_utils import File
 from common.settings import data_access as data_acces_api
 from data_access.model_folder import ModelFolder
 from common.DAL import get_models_data_frame, get_model_by_id, Model as ModelDal
-from common.functions import get_features
+from common.functions import get_features, probabilities_to_words
 from common.utils import VerboseTimer
+from common.image_cache import get_image_cache
+from common.image_loading import get_image_decoder
 
 logger = logging.getLogger(__name__)
 
@@ -28,9 +28,14 @@ logger = logging.getLogger(__name__)
 class VqaModelPredictor(object):
     """"""
 
-    def __init__(self, model: Union[str, int, ModelFolder, keras_model, None], specialized_classifiers=None):
-        """"""
+    def __init__(self, model: Union[str, int, ModelFolder, keras_model, None], specialized_classifiers=None,
+                 data_access=None):
+        """
+        :param data_access: the data access to get stored question embeddings from (for processed data that holds
+                            an index to its embeddings). Defaults to the data access in settings
+        """
         super().__init__()
+        self.data_access = data_access or data_acces_api
         self.__model_arg = model
         self.__specialized_classifiers_arg = specialized_classifiers
         self.model, model_idx_in_db, model_folder = self.get_model(model)
@@ -49,11 +54,16 @@ class VqaModelPredictor(object):
         question_categories = sorted(DAL.get_question_categories_data_frame().Category.values)
         bad_category_keys = [k for k in specialized_classifiers.keys() if k not in question_categories]
         assert len(bad_category_keys) == 0, f'Got unexpected question categories classifiers: {bad_category_keys}'
+        # Categories that share a classifier get the same model object, so it can predict all of them at once
+        loaded_classifiers = {}
         for category in question_categories:
             clf = specialized_classifiers.get(category)
             clf_model_folder = None
             if clf is not None:
-                clf, clf_model_idx_in_db, clf_model_folder = self.get_model(clf)
+                clf_key = clf if isinstance(clf, (int, str)) else id(clf)
+                if clf_key not in loaded_classifiers:
+                    loaded_classifiers[clf_key] = self.get_model(clf)
+                clf, clf_model_idx_in_db, clf_model_folder = loaded_classifiers[clf_key]
                 logging.debug(f'For {category}, got specialized model (DB: {clf_model_idx_in_db}, Folder: {clf_model_folder})')
                 assert clf_model_folder.question_category is not None, 'expected specific model to have speciality'
             self.model_by_question_category[category] = (clf, clf_model_folder)
@@ -105,15 +115,23 @@ class VqaModelPredictor(object):
 
         return model, model_id, model_folder
 
-    def predict(self, df_data: pd.DataFrame, percentile=99.8) -> pd.DataFrame:
-        # predict
+    def predict(self, df_data: pd.DataFrame, percentile=99.8, max_batch_size: int = 512) -> pd.DataFrame:
+        """
+        Predicts the answers for the given data
+        :param df_data: the data to predict, with a question category for each row
+        :param percentile: the percentile a probability must reach for its word to be predicted
+        :param max_batch_size: the maximal number of rows pushed through a model at once (bounds the memory used)
+        """
         general_prediction_vector = self.model_folder.prediction_vector
-        predictions = {}
+        # Grouping categories by the model that predicts them, so each model runs once
+        args_by_model_id = {}
+        categories_by_model_id = defaultdict(list)
         for category, args in self.model_by_question_category.items():
             if args is None or not all(args):
                 logger.info(f'Category "{category}" had no specialized classifier. using general model...')
                 vqa_model = self.model
                 prediction_vector = general_prediction_vector
+                image_provider = self.model_folder.get_image_provider()
             else:
                 (specific_vqa_model, specific_model_folder) = args
                 specific_model_predictions_vector = specific_model_folder.prediction_vector
@@ -128,32 +146,50 @@ class VqaModelPredictor(object):
 
                 vqa_model = specific_vqa_model
                 prediction_vector = specific_model_predictions_vector
+                image_provider = specific_model_folder.get_image_provider()
 
-            logger.debug(f'Classifying: "{category}"')
-            relevant_idxs = df_data.question_category == category
-            df_relevant = df_data[relevant_idxs]
-            if len(df_relevant) > 0:
+            model_id = id(vqa_model)
+            args_by_model_id.setdefault(model_id, (vqa_model, prediction_vector, image_provider))
+            categories_by_model_id[model_id].append(category)
 
-                df_specific_predictions = self._predict_keras(df_relevant,
-                                                              vqa_model,
-                                                              words_decoder=prediction_vector,
-                                                              percentile=percentile)
-            else:
-                logger.warning(f'Did not get any data for category "{category}"')
+        question_embeddings = None
+        if 'question_embedding' not in df_data.columns:
+            question_embeddings = self.data_access.load_embeddings('question_embedding')
+
+        predictions = {}
+        for model_id, categories in categories_by_model_id.items():
+            vqa_model, prediction_vector, image_provider = args_by_model_id[model_id]
+            logger.debug(f'Classifying: {categories}')
+            relevant_idxs = df_data.question_category.isin(categories)
+            df_relevant = df_data[relevant_idxs]
+            if len(df_relevant) == 0:
+                logger.warning(f'Did not get any data for categories {categories}')
                 continue
 
-            predictions[category] = df_specific_predictions
+            df_model_predictions = self._predict_keras(df_relevant,
+                                                       vqa_model,
+                                                       words_decoder=prediction_vector,
+                                                       percentile=percentile,
+                                                       image_provider=image_provider,
+                                                       max_batch_size=max_batch_size,
+                                                       question_embeddings=question_embeddings)
+
+            # Scattering the results back to their categories
+            relevant_categories = df_relevant.question_category.values
+            for category in categories:
+                df_specific_predictions = df_model_predictions[relevant_categories == category]
+                if len(df_specific_predictions) == 0:
+                    logger.warning(f'Did not get any data for category "{category}"')
+                    continue
+                predictions[category] = df_specific_predictions
 
         df_predictions = pd.concat(predictions.values())
 
         ## Converting answers to human style (de tokenizing)
         if self.model_folder.prediction_data_name == 'answers':
-            df_conversions = data_acces_api.load_processed_data(columns=['answer', 'processed_answer'])
-            df_conversions = df_conversions[df_conversions.processed_answer.str.len() > 0]
-            # removing duplicates
-            df_conversions = df_conversions.set_index('processed_answer')
-            df_conversions = df_conversions[~df_conversions.index.duplicated(keep='first')]
-            df_predictions['prediction'] = df_predictions.prediction.apply(lambda p: df_conversions.loc[p].answer)
+            conversions = self.model_folder.get_answer_conversions(data_acces_api)
+            converted = df_predictions.prediction.map(conversions)
+            df_predictions['prediction'] = converted.where(converted.notnull(), df_predictions.prediction)
 
         # Those are the mandatory columns
         sort_columns = ['image_name', 'question', 'answer', 'prediction', 'probabilities']
@@ -163,56 +199,37 @@ class VqaModelPredictor(object):
                    reverse=False)
 
         ret = df_predictions[ordered_columns].sort_index()
+        logger.debug(f'Image cache: {get_image_cache().stats}')
+        logger.debug(f'Image decoding seconds by stage: {get_image_decoder().stats}')
         return ret
 
     @classmethod
-    def _predict_keras(cls, df_data: pd.DataFrame, model, words_decoder, percentile: float) -> pd.DataFrame:
-        features = get_features(df_data)
+    def _predict_keras(cls, df_data: pd.DataFrame, model, words_decoder, percentile: float,
+                       image_provider=None, max_batch_size: int = None,
+                       question_embeddings: np.ndarray = None) -> pd.DataFrame:
+        max_batch_size = max_batch_size or len(df_data)
+        batches_predictions = []
         with VerboseTimer("Raw model prediction"):
-            p = model.predict(features)
+            for start in range(0, len(df_data), max_batch_size):
+                features = get_features(df_data.iloc[start:start + max_batch_size], image_provider=image_provider,
+                                        question_embeddings=question_embeddings)
+                batches_predictions.append(model.predict(features))
+        p = np.concatenate(batches_predictions)
 
         assert len(words_decoder) == len(p[0]), f'Expected decoder ({len(words_decoder)}) to be in the same length of probabilities ({len(p[0])})'
         allow_multi_predictions = all(len(txt.split()) <= 1 for txt in words_decoder.values)
 
-        # noinspection PyTypeChecker
-        percentiles = [np.percentile(curr_pred, percentile) for curr_pred in p]
-        enumrated_p = [[(i, v) for i, v in enumerate(curr_p)] for curr_p in p]
-        pass_vals = [([(i, curr_pred) for i, curr_pred in curr_pred_arr if curr_pred >= curr_percentile])
-                     for curr_pred_arr, curr_percentile in zip(enumrated_p, percentiles)]
-        # [(i,len(curr_pass_arr)) for i, curr_pass_arr in  pass_vals]
-        # vector-to-value. First - the results, second - the propabilities
-        predictions = [[i for i, curr_p in curr_pass_arr] for curr_pass_arr in pass_vals]
-        probabilities = [[curr_p for i, curr_p in curr_pass_arr] for curr_pass_arr in pass_vals]
+        with VerboseTimer("Decoding predictions"):
+            predictions, probabilities = probabilities_to_words(p, words_decoder.values, percentile,
+                                                                allow_multi_predictions=allow_multi_predictions)
         # dictionary for creating a data frame
         cols_to_transfer = ['image_name', 'question', 'answer', 'path']
         df_dict = {col_name: df_data[col_name] for col_name in cols_to_transfer}
         df_data_light = pd.DataFrame(df_dict).reset_index()
 
-        results = []
-        pbar = tqdm.tqdm(enumerate(zip(predictions, probabilities)), total=len(predictions))
-        for i, (curr_prediction, curr_probabilities) in pbar:
-            pbar.set_description(f'Prediction: {str(curr_prediction)[:20]}; probabilities: {str(curr_probabilities)[:20]}')
-            prediction_df = pd.DataFrame({'word_idx': curr_prediction,
-                                          'prediction': list(words_decoder.iloc[curr_prediction].str.strip().values),
-                                          'probabilities': curr_probabilities}
-                                         ).sort_values(by='probabilities', ascending=False).reset_index(drop=True)
-
-
-            if not allow_multi_predictions:
-                prediction_df = prediction_df.head(1)
-
-            curr_prediction_str = ' '.join([str(w) for w in list(prediction_df.prediction.values)])
-            probabilities_str = ', '.join(['({:.3f})'.format(p) for p in list(prediction_df.probabilities.values)])
-
-            light_pred_df = pd.DataFrame({
-                'prediction': [curr_prediction_str],
-                'probabilities': [probabilities_str]
-            })
-            results.append(light_pred_df)
-
         df_aggregated = pd.DataFrame({
-            'prediction': list(itertools.chain.from_iterable([curr_df.prediction.values for curr_df in results])),
-            'probabilities': [curr_df.probabilities.values for curr_df in results]
+            'prediction': predictions,
+            'probabilities': [np.array([probabilities_str], dtype=object) for probabilities_str in probabilities]
         })
         ret = df_data_light.merge(df_aggregated, how='outer', left_index=True, right_index=True)
         ret = ret.set_index('index')
@@ -224,17 +241,16 @@ class DefaultVqaModelPredictor(VqaModelPredictor):
 
     def __init__(self, model: Union[str, int, ModelFolder, keras_model, None], data_access=None, specialized_classifiers=None):
         """"""
-        super().__init__(model, specialized_classifiers=specialized_classifiers)
+        super().__init__(model, specialized_classifiers=specialized_classifiers, data_access=data_access)
 
-        self.data_access = data_access or data_acces_api
         df_test, df_validation = self.get_data(self.data_access)
         self.df_validation = df_validation
         self.df_test = df_test
 
     @staticmethod
     def get_data(data_access):
-        df_test = data_access.load_processed_data(group='test')
-        df_validation = data_access.load_processed_data(group='validation')
+        df_test = data_access.load_processed_data(group='test', attach_embeddings=False)
+        df_validation = data_access.load_processed_data(group='validation', attach_embeddings=False)
         return df_test, df_validation
 
     @staticmethod
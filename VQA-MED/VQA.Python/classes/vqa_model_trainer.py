@@ -11,7 +11,11 @@ from data_access.model_folder import ModelFolder
 
 from keras import callbacks as K_callbacks, Model  # , backend as keras_backend,
 from common.constatns import vqa_models_folder  # train_data, validation_data,
+from common.augmentation import ImageAugmenter
+from common.exceptions import InvalidArgumentException
 from common.utils import VerboseTimer
+from common.image_cache import get_image_cache
+from common.image_loading import get_image_decoder
 from common.model_utils import save_model, EarlyStoppingByAccuracy
 from common.os_utils import File
 
@@ -39,16 +43,20 @@ class VqaModelTrainer(object):
 
     def __init__(self, model_folder: ModelFolder, augmentations: int, batch_size: int,
                  data_access: DataAccess, epochs: int = 1, question_category: str = None,
-                 use_class_weight: bool = False) -> None:
+                 use_class_weight: bool = False, in_memory_augmentations: bool = False) -> None:
         super().__init__()
 
         self._epochs = epochs
         self.augmentations = augmentations
+        self.in_memory_augmentations = in_memory_augmentations
 
         self.batch_size = batch_size
         self.data_access = data_access
 
         self.model_folder = model_folder
+        if in_memory_augmentations and model_folder.use_bottleneck_features:
+            raise InvalidArgumentException(argument_name='in_memory_augmentations', argument=in_memory_augmentations,
+                                           message='Cannot augment images of a model that uses bottleneck features')
         self._model = model_folder.load_model()
         self.model_location = str(model_folder.model_path)
         self.question_category = question_category
@@ -92,14 +100,19 @@ class VqaModelTrainer(object):
         data_access_val = SpecificDataAccess.factory(self.data_access, group='validation')
 
         prediction_vector = self.model_folder.prediction_vector
+        image_provider = self.model_folder.get_image_provider(self.data_access)
+        augmenter = ImageAugmenter() if self.in_memory_augmentations else None
 
         dg = DataGenerator(data_access_train, prediction_vector=prediction_vector,
                            batch_size=self.batch_size,
                            augmentations=self.augmentations,
+                           image_provider=image_provider,
+                           augmenter=augmenter,
                            )
 
-        data_val = data_access_val.load_processed_data()
-        features_val, labels_val = DataGenerator._generate_data(data_val, prediction_vector)
+        data_val = data_access_val.load_processed_data(attach_embeddings=False)
+        features_val, labels_val = DataGenerator._generate_data(data_val, prediction_vector, image_provider,
+                                                                question_embeddings=dg.question_embeddings)
         validation_input = (features_val, labels_val)
 
         model = self.model
@@ -133,6 +146,8 @@ class VqaModelTrainer(object):
         except Exception as ex:
             logger.exception('Got an error training model')
             raise
+        logger.debug(f'Image cache: {get_image_cache().stats}')
+        logger.debug(f'Image decoding seconds by stage: {get_image_decoder().stats}')
         return history
 
     def get_diagnosis_class_weight(self, diagnosis_class_weight=50):
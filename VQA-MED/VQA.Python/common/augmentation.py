@@ -0,0 +1,102 @@
+import zlib
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ImageAugmenter(object):
+    """
+    Applies random rotation, shift and zoom to batches of decoded images.
+    The transformation of an image is fully determined by its path and its augmentation index,
+    so an augmentation can be replayed without keeping it on disk.
+    Augmentation index 0 is always the original image.
+    """
+
+    def __init__(self,
+                 rotation_range: float = 25,  # Units: degrees
+                 width_shift_range: float = 0.15,
+                 height_shift_range: float = 0.15,
+                 zoom_range: float = 0.15,
+                 seed: int = 0):
+        """
+        The ranges match the ones used by generate_image_augmentations
+        :param rotation_range: the maximal rotation in degrees (in either direction)
+        :param width_shift_range: the maximal horizontal shift, as a fraction of the width
+        :param height_shift_range: the maximal vertical shift, as a fraction of the height
+        :param zoom_range: zoom is sampled from [1 - zoom_range, 1 + zoom_range]
+        :param seed: a global seed, for getting a different (but still reproducible) set of augmentations
+        """
+        super().__init__()
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.zoom_range = zoom_range
+        self.seed = seed
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rotation_range={self.rotation_range}, ' \
+            f'width_shift_range={self.width_shift_range}, height_shift_range={self.height_shift_range}, ' \
+            f'zoom_range={self.zoom_range}, seed={self.seed})'
+
+    def _get_uniforms(self, image_paths: iter, augmentation_indexes: iter, count: int) -> np.ndarray:
+        """
+        :return: a (len(image_paths), count) matrix of uniform samples in [0, 1), seeded by (image, augmentation index)
+        """
+        seeds = [zlib.crc32(f'{self.seed}|{path}|{int(idx)}'.encode('utf-8'))
+                 for path, idx in zip(image_paths, augmentation_indexes)]
+        return np.array([np.random.RandomState(s).random_sample(count) for s in seeds]).reshape(-1, count)
+
+    def get_transformations(self, image_paths: iter, augmentation_indexes: iter, image_shape: tuple) -> np.ndarray:
+        """
+        Gets the affine transformation of each (image, augmentation index)
+        :param image_paths: the paths of the images (used for seeding only)
+        :param augmentation_indexes: the augmentation index of each image
+        :param image_shape: the (height, width) of the images
+        :return: a (n, 2, 3) array of affine matrices, as expected by cv2.warpAffine
+        """
+        image_paths = [str(p) for p in image_paths]
+        augmentation_indexes = np.asarray(list(augmentation_indexes), dtype=np.int64)
+        height, width = image_shape[:2]
+
+        uniforms = self._get_uniforms(image_paths, augmentation_indexes, count=4)
+        angles = np.deg2rad((2 * uniforms[:, 0] - 1) * self.rotation_range)
+        shift_x = (2 * uniforms[:, 1] - 1) * self.width_shift_range * width
+        shift_y = (2 * uniforms[:, 2] - 1) * self.height_shift_range * height
+        zooms = 1 + (2 * uniforms[:, 3] - 1) * self.zoom_range
+
+        # Rotation and zoom about the image center, followed by the shift
+        center_x, center_y = (width - 1) / 2, (height - 1) / 2
+        cos, sin = zooms * np.cos(angles), zooms * np.sin(angles)
+        matrices = np.empty((len(image_paths), 2, 3))
+        matrices[:, 0, 0] = cos
+        matrices[:, 0, 1] = sin
+        matrices[:, 0, 2] = (1 - cos) * center_x - sin * center_y + shift_x
+        matrices[:, 1, 0] = -sin
+        matrices[:, 1, 1] = cos
+        matrices[:, 1, 2] = sin * center_x + (1 - cos) * center_y + shift_y
+
+        originals = augmentation_indexes == 0
+        matrices[originals] = [[1, 0, 0], [0, 1, 0]]
+        return matrices
+
+    def augment(self, images: np.ndarray, image_paths: iter, augmentation_indexes: iter) -> np.ndarray:
+        """
+        Augments a batch of images
+        :param images: a (n, height, width, channels) array of decoded images
+        :param image_paths: the path of each image
+        :param augmentation_indexes: the augmentation index of each image. 0 leaves the image as is
+        :return: a new array holding the augmented images
+        """
+        augmentation_indexes = np.asarray(list(augmentation_indexes), dtype=np.int64)
+        matrices = self.get_transformations(image_paths, augmentation_indexes, images.shape[1:3])
+        height, width = images.shape[1:3]
+
+        augmented = np.array(images, copy=True)
+        for i in np.flatnonzero(augmentation_indexes != 0):
+            augmented[i] = cv2.warpAffine(images[i], matrices[i], (width, height),
+                                          flags=cv2.INTER_LINEAR,
+                                          borderMode=cv2.BORDER_REPLICATE)  # Same as fill_mode='nearest'
+        return augmented
@@ -27,4 +27,7 @@ questions_classifiers = \
   'Abnormality_yes_no': ''
 }
 
+# The model used for predicting the organ of abnormality questions, when no organ question was asked for the image
+abnormality_organ_model_folder = str(base_data_folder / 'models' / '20190329_0440_18')
+
 
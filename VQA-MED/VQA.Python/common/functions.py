@@ -1,15 +1,15 @@
 import os
 import inspect
 import textwrap
-from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
 
 import pandas as pd
 import numpy as np
-import cv2
-import tqdm
 
+from common.exceptions import NoDataException
 from common.settings import image_size
+from common.image_cache import get_image_cache
+from common.image_loading import get_image_decoder, read_image
 
 import logging
 
@@ -58,11 +58,14 @@ def get_highlighted_function_code(foo, remove_comments=False):
 
 
 def get_image(image_file_name):
-    im = cv2.resize(cv2.imread(image_file_name), image_size)
+    """
+    Gets the resized image. Images are cached, so the returned array is read only
+    """
+    return get_image_cache().get_or_load(str(image_file_name), _read_image)
+
 
-    # convert the image to RGBA
-    #     im = im.transpose((2, 0, 1))
-    return im
+def _read_image(image_file_name):
+    return read_image(image_file_name, image_size)
 
 
 def generate_image_augmentations(image_path,
@@ -119,25 +122,49 @@ def normalize_data_structure(df: pd.DataFrame, group: str, image_folder: str) ->
     return df_c
 
 
-def get_features(df: pd.DataFrame):
-    series_reshaped = df.question_embedding.apply(lambda embedding: embedding.reshape((embedding.shape[0], 1)))
-    shape_sample = series_reshaped.values[0].shape
-    set_shape = (len(series_reshaped.values), shape_sample[0],1)
+def get_images(image_paths: iter) -> np.ndarray:
+    """
+    Loads the images in the given paths, each distinct path is read only once
+    :param image_paths: the paths of the images to load
+    :return: the images, stacked in the order of image_paths
+    """
+    return get_image_decoder().get_images(image_paths)
 
-    question_features = np.reshape(list(series_reshaped.values), set_shape)
 
-    pool = ThreadPool(processes=7)
-    unique_image_paths = df.path.drop_duplicates()
-    # logger.debug('Getting image features')
-    worker_generator = pool.imap(lambda im_path: np.array(get_image(im_path)), unique_image_paths)
-    # images = list(tqdm.tqdm(worker_generator , total=len(unique_image_paths)))
-    images = list(worker_generator)
+def get_question_features(df: pd.DataFrame, question_embeddings: np.ndarray = None) -> np.ndarray:
+    """
+    Gets the question input of the model
+    :param df: the data frame, with either a 'question_embedding' column or a 'question_embedding_idx' column
+    :param question_embeddings: the embeddings matrix that 'question_embedding_idx' points to
+                                (see DataAccess.load_embeddings)
+    :return: a (rows, embedding length, 1) array
+    """
+    if 'question_embedding' in df.columns:
+        embeddings = np.stack(df.question_embedding.values)
+    elif 'question_embedding_idx' in df.columns and question_embeddings is not None:
+        embeddings = np.asarray(question_embeddings[df.question_embedding_idx.values])
+    else:
+        raise NoDataException('Got no question embeddings. '
+                              'For processed data with stored embeddings, pass DataAccess.load_embeddings()')
+    return embeddings[..., np.newaxis]
 
-    # images = pool.map(lambda im_path: np.array(get_image(im_path)), unique_image_paths)
-    image_by_path = {im_path:img for im_path, img in zip(unique_image_paths, images)}
 
-    # image_by_path = {im_path:np.array(get_image(im_path)) for im_path in df.path.drop_duplicates()}
-    image_features = np.asarray([image_by_path[im_path] for im_path in df['path']])
+def get_features(df: pd.DataFrame, image_provider=None, question_embeddings: np.ndarray = None):
+    """
+    Gets the model inputs for a data frame
+    :param df: the data frame to get the features for
+    :param image_provider: an object exposing 'get_image_features(paths)'.
+                           If None, images are decoded from the 'path' column
+    :param question_embeddings: the embeddings matrix, for data frames that hold an index to it
+                                rather than the embeddings themselves (see get_question_features)
+    :return: a list of the questions features and the image features
+    """
+    question_features = get_question_features(df, question_embeddings)
+
+    if image_provider is None:
+        image_features = get_images(df['path'])
+    else:
+        image_features = image_provider.get_image_features(df['path'])
 
     # image_features = np.asarray([np.array(get_image(im_path)) for im_path in df['path']])
     features = [question_features, image_features]
@@ -177,6 +204,47 @@ def hot_vector_to_words(hot_vector, classes_df):
     return classes_df.iloc[max_loc]
 
 
+def probabilities_to_words(probabilities: np.ndarray, classes: iter, percentile: float,
+                           allow_multi_predictions: bool = True) -> (list, list):
+    """
+    Decodes a matrix of predicted probabilities (a row per sample, a column per class) to words.
+    For each row, the classes with probability of at least the row's percentile are taken, ordered by probability.
+    :param probabilities: the predicted probabilities
+    :param classes: the class (word / answer) of each column
+    :param percentile: the percentile a probability must reach for its class to be predicted
+    :param allow_multi_predictions: if False, only the most probable class is taken
+    :return: for each row: the predicted words (space delimited), and their probabilities as a formatted string
+    """
+    probabilities = np.asarray(probabilities)
+    words = np.asarray([str(w).strip() for w in classes], dtype=object)
+    if len(probabilities) == 0:
+        return [], []
+
+    if allow_multi_predictions:
+        thresholds = np.percentile(probabilities, percentile, axis=1, keepdims=True)
+        passed_counts = (probabilities >= thresholds).sum(axis=1)
+        k = int(passed_counts.max())
+        # The classes that passed the threshold are the top ones
+        top_idxs = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    else:
+        # The most probable class is always above the percentile
+        passed_counts = np.ones(len(probabilities), dtype=int)
+        top_idxs = probabilities.argmax(axis=1)[:, np.newaxis]
+
+    rows = np.arange(len(probabilities))[:, np.newaxis]
+    top_probabilities = probabilities[rows, top_idxs]
+    # Descending by probability, ties by class index
+    order = np.lexsort((top_idxs, -top_probabilities), axis=1)
+    top_idxs = top_idxs[rows, order]
+    top_probabilities = top_probabilities[rows, order]
+
+    top_words = words[top_idxs]
+    predictions = [' '.join(row_words[:count]) for row_words, count in zip(top_words, passed_counts)]
+    probabilities_strs = [', '.join(['({:.3f})'.format(p) for p in row_probabilities[:count]])
+                          for row_probabilities, count in zip(top_probabilities, passed_counts)]
+    return predictions, probabilities_strs
+
+
 def main():
     pass
     # print_function_code(get_nlp, remove_comments=True)
@@ -0,0 +1,186 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache(object):
+    """
+    A byte budgeted LRU cache of decoded (and resized) images.
+    Images are keyed by their path and modification time, so an image that was changed on disk is loaded again.
+    Optionally, images that are evicted from memory are spilled to a memory mapped .npy file on disk.
+    """
+    SPILL_FILE_NAME = 'image_cache_spill.npy'
+
+    def __init__(self, max_bytes: int, spill_folder: str = None, spill_max_bytes: int = 0):
+        """
+        :param max_bytes: the maximal number of bytes the in memory images can take
+        :param spill_folder: a folder for the on disk tier. If None, evicted images are discarded
+        :param spill_max_bytes: the maximal size of the on disk tier
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.spill_folder = Path(str(spill_folder)) if spill_folder else None
+        self.spill_max_bytes = spill_max_bytes
+
+        self._items = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.RLock()
+
+        self._spill = None
+        self._spill_slot_by_key = OrderedDict()
+        self._free_spill_slots = []
+
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(max_bytes={self.max_bytes}, spill_folder={self.spill_folder}, ' \
+            f'spill_max_bytes={self.spill_max_bytes})'
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def current_bytes(self):
+        return self._current_bytes
+
+    @property
+    def stats(self) -> dict:
+        return {'hits': self.hits,
+                'spill_hits': self.spill_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'items': len(self._items),
+                'bytes': self._current_bytes,
+                'spilled_items': len(self._spill_slot_by_key)}
+
+    @staticmethod
+    def get_key(image_path: str) -> tuple:
+        path = str(image_path)
+        return path, os.path.getmtime(path)
+
+    def get(self, image_path: str):
+        """
+        :return: The cached image of image_path, or None if it was not cached
+        """
+        key = self.get_key(image_path)
+        with self._lock:
+            image = self._items.get(key)
+            if image is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return image
+
+            image = self._get_from_spill(key)
+            if image is not None:
+                self.spill_hits += 1
+                self._put(key, image)
+                return image
+
+            self.misses += 1
+            return None
+
+    def put(self, image_path: str, image: np.ndarray) -> None:
+        key = self.get_key(image_path)
+        with self._lock:
+            self._put(key, image)
+
+    def get_or_load(self, image_path: str, load_image: callable) -> np.ndarray:
+        """
+        Gets the image from cache, or loads it using load_image(image_path) on a miss
+        """
+        image = self.get(image_path)
+        if image is None:
+            image = load_image(image_path)
+            self.put(image_path, image)
+        return image
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._current_bytes = 0
+            if self._spill is not None:
+                self._free_spill_slots = list(range(len(self._spill)))
+            self._spill_slot_by_key.clear()
+
+    def _put(self, key, image: np.ndarray) -> None:
+        if image.nbytes > self.max_bytes:
+            return
+
+        image = np.ascontiguousarray(image)
+        # The same array is handed to all callers
+        image.flags.writeable = False
+
+        existing = self._items.pop(key, None)
+        if existing is not None:
+            self._current_bytes -= existing.nbytes
+
+        self._items[key] = image
+        self._current_bytes += image.nbytes
+
+        while self._current_bytes > self.max_bytes:
+            evicted_key, evicted_image = self._items.popitem(last=False)
+            self._current_bytes -= evicted_image.nbytes
+            self.evictions += 1
+            self._spill_image(evicted_key, evicted_image)
+
+    def _get_spill(self, image: np.ndarray):
+        if self._spill is None and self.spill_folder is not None:
+            slots = int(self.spill_max_bytes // image.nbytes)
+            if slots > 0:
+                self.spill_folder.mkdir(parents=True, exist_ok=True)
+                spill_location = str(self.spill_folder / f'{os.getpid()}_{self.SPILL_FILE_NAME}')
+                logger.debug(f'Creating an image cache spill file with {slots} slots at {spill_location}')
+                self._spill = np.lib.format.open_memmap(spill_location, mode='w+', dtype=image.dtype,
+                                                        shape=(slots,) + image.shape)
+                self._free_spill_slots = list(range(slots))
+        return self._spill
+
+    def _spill_image(self, key, image: np.ndarray) -> None:
+        spill = self._get_spill(image)
+        if spill is None or spill.shape[1:] != image.shape or spill.dtype != image.dtype:
+            return
+
+        slot = self._spill_slot_by_key.pop(key, None)
+        if slot is None:
+            if self._free_spill_slots:
+                slot = self._free_spill_slots.pop()
+            else:
+                # Reusing the slot of the least recently spilled image
+                _, slot = self._spill_slot_by_key.popitem(last=False)
+
+        spill[slot] = image
+        self._spill_slot_by_key[key] = slot
+
+    def _get_from_spill(self, key):
+        slot = self._spill_slot_by_key.pop(key, None)
+        if slot is None:
+            return None
+        # The image is promoted back to memory, and its slot can be reused, so we copy it out of the file
+        image = np.array(self._spill[slot])
+        self._free_spill_slots.append(slot)
+        return image
+
+
+_image_cache: ImageCache = None
+
+
+def get_image_cache() -> ImageCache:
+    """
+    Gets the process wide image cache, so all consumers of images (training, validation, prediction) share it
+    """
+    global _image_cache
+    if _image_cache is None:
+        from common.settings import image_cache_max_bytes, image_cache_spill_folder, image_cache_spill_max_bytes
+        _image_cache = ImageCache(max_bytes=image_cache_max_bytes,
+                                  spill_folder=image_cache_spill_folder,
+                                  spill_max_bytes=image_cache_spill_max_bytes)
+    return _image_cache
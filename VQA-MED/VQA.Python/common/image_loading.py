@@ -0,0 +1,214 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+
+from common.exceptions import InvalidArgumentException
+from common.image_cache import get_image_cache
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('read', 'decode', 'resize', 'stack')
+
+
+def read_image(image_path: str, image_size: tuple) -> np.ndarray:
+    """
+    Reads, decodes and resizes a single image
+    """
+    image, _ = _read_image_timed(image_path, image_size)
+    return image
+
+
+def _read_image_timed(image_path: str, image_size: tuple) -> (np.ndarray, dict):
+    """
+    Reads, decodes and resizes a single image.
+    Module level, so it can be sent to a process pool.
+    :return: the image, and the time each stage took
+    """
+    start = time.perf_counter()
+    with open(str(image_path), 'rb') as f:
+        buffer = np.frombuffer(f.read(), dtype=np.uint8)
+    read_done = time.perf_counter()
+
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is None:
+        raise InvalidArgumentException(argument_name='image_path', argument=image_path,
+                                       message='Failed to decode image')
+    decode_done = time.perf_counter()
+
+    image = cv2.resize(image, image_size)
+    resize_done = time.perf_counter()
+
+    timings = {'read': read_done - start, 'decode': decode_done - read_done, 'resize': resize_done - decode_done}
+    return image, timings
+
+
+class ImageDecoder(object):
+    """
+    A long lived pool of image decoding workers.
+    The pool is created lazily (and once per process, so it survives forking by keras' workers)
+    and keeps a bounded number of images in flight.
+    """
+
+    def __init__(self, workers: int = 7, use_processes: bool = False, max_queue_depth: int = 64,
+                 image_size: tuple = None):
+        """
+        :param workers: the number of decoding workers
+        :param use_processes: use processes instead of threads for decoding
+        :param max_queue_depth: the maximal number of images submitted to the workers at once
+        :param image_size: the size to resize images to. Defaults to common.settings.image_size
+        """
+        super().__init__()
+        if workers < 1:
+            raise InvalidArgumentException(argument_name='workers', argument=workers,
+                                           message='At least a single worker is required')
+        if max_queue_depth < 1:
+            raise InvalidArgumentException(argument_name='max_queue_depth', argument=max_queue_depth,
+                                           message='Queue depth must be positive')
+        from common.settings import image_size as default_image_size
+        self.workers = workers
+        self.use_processes = use_processes
+        self.max_queue_depth = max_queue_depth
+        self.image_size = tuple(image_size if image_size is not None else default_image_size)
+        # The process wide image cache is keyed by path only, so it can only hold images of the default size
+        self.uses_shared_cache = self.image_size == tuple(default_image_size)
+
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+        self._timings = OrderedDict((stage, 0.0) for stage in STAGES)
+        self.image_count = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(workers={self.workers}, use_processes={self.use_processes}, ' \
+            f'max_queue_depth={self.max_queue_depth}, image_size={self.image_size})'
+
+    @property
+    def executor(self):
+        with self._lock:
+            pid = os.getpid()
+            if self._executor is None or self._executor_pid != pid:
+                # A forked process does not get the workers of its parent, so it needs a pool of its own
+                executor_type = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+                logger.debug(f'Creating image decoding {executor_type.__name__} with {self.workers} workers')
+                self._executor = executor_type(max_workers=self.workers)
+                self._executor_pid = pid
+            return self._executor
+
+    @property
+    def stats(self) -> dict:
+        """The total seconds spent at each stage, and the number of decoded images"""
+        with self._lock:
+            ret = OrderedDict(self._timings)
+            ret['images'] = self.image_count
+        return ret
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for stage in STAGES:
+                self._timings[stage] = 0.0
+            self.image_count = 0
+
+    def _add_timings(self, timings: dict, image_count: int = 0) -> None:
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._timings[stage] += seconds
+            self.image_count += image_count
+
+    def get_images(self, image_paths: iter) -> np.ndarray:
+        """
+        Loads the images in the given paths, each distinct path is read only once.
+        Images of the default size are shared with other consumers through the process wide image cache
+        :param image_paths: the paths of the images to load
+        :return: the images, stacked in the order of image_paths
+        """
+        image_paths = [str(p) for p in image_paths]
+        image_cache = get_image_cache() if self.uses_shared_cache else None
+
+        image_by_path = OrderedDict()
+        missing_paths = []
+        for path in image_paths:
+            if path in image_by_path:
+                continue
+            image = image_cache.get(path) if image_cache is not None else None
+            image_by_path[path] = image
+            if image is None:
+                missing_paths.append(path)
+
+        for path, image in self._decode(missing_paths):
+            if image_cache is not None:
+                image_cache.put(path, image)
+            image_by_path[path] = image
+
+        start = time.perf_counter()
+        images = np.stack([image_by_path[path] for path in image_paths]) if image_paths else np.empty((0,))
+        self._add_timings({'stack': time.perf_counter() - start})
+        return images
+
+    def _decode(self, image_paths: list) -> iter:
+        """Yields (path, image) for the given paths, keeping at most max_queue_depth images in flight"""
+        if not image_paths:
+            return
+
+        executor = self.executor
+        paths = iter(image_paths)
+        path_by_future = {}
+
+        def submit_next():
+            path = next(paths, None)
+            if path is not None:
+                path_by_future[executor.submit(_read_image_timed, path, self.image_size)] = path
+
+        for _ in range(self.max_queue_depth):
+            submit_next()
+
+        while path_by_future:
+            done, _ = wait(path_by_future, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = path_by_future.pop(future)
+                image, timings = future.result()
+                self._add_timings(timings, image_count=1)
+                submit_next()
+                yield path, image
+
+    def shutdown(self, wait_for_workers: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=wait_for_workers)
+            self._executor = None
+            self._executor_pid = None
+
+
+_image_decoder: ImageDecoder = None
+_image_decoder_lock = threading.Lock()
+
+
+def get_image_decoder() -> ImageDecoder:
+    """
+    Gets the process wide image decoder, so all consumers of images (training, validation, prediction) share its workers
+    """
+    global _image_decoder
+    with _image_decoder_lock:
+        if _image_decoder is None:
+            from common.settings import image_decoding_workers, image_decoding_use_processes, \
+                image_decoding_max_queue_depth
+            _image_decoder = ImageDecoder(workers=image_decoding_workers,
+                                          use_processes=image_decoding_use_processes,
+                                          max_queue_depth=image_decoding_max_queue_depth)
+            atexit.register(_image_decoder.shutdown)
+    return _image_decoder
+
+
+def shutdown_image_decoder() -> None:
+    global _image_decoder
+    with _image_decoder_lock:
+        if _image_decoder is not None:
+            _image_decoder.shutdown()
+            _image_decoder = None
@@ -21,6 +21,21 @@ DEFAULT_IMAGE_WEIGHTS = 'imagenet'
 image_size_by_base_models = {'imagenet': (224, 224)}
 image_size = image_size_by_base_models[DEFAULT_IMAGE_WEIGHTS]
 
+# Decoded images are cached (see common.image_cache). A 224x224 image takes ~150KB
+image_cache_max_bytes = 2 * 1024 ** 3
+# Set a folder for keeping images that are evicted from memory in a memory mapped file
+image_cache_spill_folder = None
+image_cache_spill_max_bytes = 8 * 1024 ** 3
+# Images are decoded by a long lived pool of workers (see common.image_loading)
+image_decoding_workers = 7
+image_decoding_use_processes = False
+image_decoding_max_queue_depth = 64
+
+# Evaluation-----------------------------------------------------------------------------
+# Set a sqlite file (e.g. str(data_path / 'wordnet_similarity.db')) for sharing word similarities across runs
+# (see evaluate.wordnet_similarity). If None, they are kept in memory only
+word_similarity_db_location = None
+
 # NLP & Embedding-----------------------------------------------------------------------------
 vectors = ['en_core_web_lg', 'en_core_web_md', 'en_core_web_sm']  # 'en_vectors_web_lg'
 
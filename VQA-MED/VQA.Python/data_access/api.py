@@ -1,8 +1,10 @@
 import logging
 import os
+import time
 import shutil
 from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
@@ -22,11 +24,19 @@ class DataAccess(object):
     RAW_DATA_KEY = 'data'
 
     PROCESSED_DATA_FILE_NAME = 'model_input.parquet'
+    EMBEDDINGS_FOLDER_NAME = 'embeddings'
+    EMBEDDING_COLUMNS = ('question_embedding', 'answer_embedding')
+    EMBEDDING_INDEX_SUFFIX = '_idx'
+    # Computing the processed data stamp stats all of its files, so it is recomputed at most this often
+    PROCESSED_DATA_STAMP_MAX_AGE_SECONDS = 60
 
     def __init__(self, folder):
         """"""
         super().__init__()
         self.folder = Path(str(folder))
+        self._embeddings = {}
+        self._processed_data_stamp = None
+        self._processed_data_stamp_time = None
 
         assert self.folder.exists()
 
@@ -41,6 +51,29 @@ class DataAccess(object):
     def processed_data_location(self):
         return self.folder / self.PROCESSED_DATA_FILE_NAME
 
+    @property
+    def processed_data_stamp(self) -> str:
+        """
+        Identifies the current version of the processed data (the latest modification time and the total size of
+        its files), so artifacts derived from it can tell when it was regenerated.
+        Data saved through this instance is noticed at once. Data saved by others is noticed once the stamp is older
+        than PROCESSED_DATA_STAMP_MAX_AGE_SECONDS
+        """
+        now = time.monotonic()
+        if self._processed_data_stamp_time is None \
+                or now - self._processed_data_stamp_time > self.PROCESSED_DATA_STAMP_MAX_AGE_SECONDS:
+            self._processed_data_stamp = self._get_processed_data_stamp()
+            self._processed_data_stamp_time = now
+        return self._processed_data_stamp
+
+    def _get_processed_data_stamp(self) -> str:
+        location = self.processed_data_location
+        if not location.exists():
+            return None
+        files = [location] if location.is_file() else [p for p in location.rglob('*') if p.is_file()]
+        stats = [p.stat() for p in files]
+        return f'{max((st.st_mtime for st in stats), default=0)}:{sum(st.st_size for st in stats)}'
+
     @property
     def fn_meta(self):
         return self.folder / 'meta_data.h5'
@@ -49,6 +82,21 @@ class DataAccess(object):
     def augmentation_location(self):
         return self.folder / 'augmentations.parquet'
 
+    @property
+    def bottleneck_features_location(self):
+        return self.folder / 'bottleneck_features'
+
+    @property
+    def embeddings_location(self):
+        return self.folder / self.EMBEDDINGS_FOLDER_NAME
+
+    def get_embeddings_location(self, embedding_column: str) -> Path:
+        return self.embeddings_location / f'{embedding_column}.npy'
+
+    @property
+    def image_shards_location(self):
+        return self.folder / 'image_shards'
+
     def save_raw_input(self, df: pd.DataFrame) -> str:
         """
         For saving the normalized raw data
@@ -78,29 +126,118 @@ class DataAccess(object):
                 image_name_question = store[self.RAW_DATA_KEY]
             return image_name_question
 
-    def save_processed_data(self, df: pd.DataFrame) -> str:
+    def save_processed_data(self, df: pd.DataFrame, embeddings_dtype=np.float32) -> str:
+        """
+        Saves the processed data.
+        Embedding columns are stored as a single matrix per column (a .npy file, at embeddings_location),
+        and the data frame keeps the row of each embedding in an '<column>_idx' column.
+        If the data frame already has an '<column>_idx' column (see pre_process_raw_data),
+        rows with the same index are expected to have the same embedding, which is stored once
+        :param df: the processed data
+        :param embeddings_dtype: the type to store embeddings as (e.g. np.float32 or np.float16)
+        """
         full_path = str(self.processed_data_location)
         logger.debug(f"Saving the processed data to:\n{full_path}")
         with VerboseTimer("Saving processed data"):
+            df = self._save_embeddings(df, embeddings_dtype)
             self._save_parquet(df, full_path, 'group')
+        self._processed_data_stamp_time = None
         return full_path
 
-    def load_processed_data(self, group: str = None, columns: list = None) -> pd.DataFrame:
+    def _save_embeddings(self, df: pd.DataFrame, embeddings_dtype) -> pd.DataFrame:
+        embedding_columns = [col for col in self.EMBEDDING_COLUMNS if col in df.columns]
+        if not embedding_columns:
+            return df
+
+        df = df.copy()
+        self.embeddings_location.mkdir(parents=True, exist_ok=True)
+        for col in embedding_columns:
+            index_col = col + self.EMBEDDING_INDEX_SUFFIX
+            if index_col in df.columns:
+                # Rows sharing an index share an embedding, so each distinct embedding is stored once
+                codes, _ = pd.factorize(df[index_col])
+                first_rows = np.unique(codes, return_index=True)[1]
+            else:
+                codes = first_rows = np.arange(len(df))
+            with VerboseTimer(f"Saving {col} ({len(first_rows)} distinct of {len(df)})"):
+                embeddings = np.stack(df[col].values[first_rows]).astype(embeddings_dtype)
+                np.save(str(self.get_embeddings_location(col)), embeddings)
+            df[index_col] = codes
+            del df[col]
+        self._embeddings = {}
+        return df
+
+    def load_embeddings(self, embedding_column: str = 'question_embedding') -> np.ndarray:
+        """
+        Gets the (memory mapped) embeddings matrix of an embedding column
+        :return: the matrix, or None if the processed data keeps its embeddings in the data frame
+        """
+        if embedding_column not in self._embeddings:
+            location = self.get_embeddings_location(embedding_column)
+            self._embeddings[embedding_column] = np.load(str(location), mmap_mode='r') if location.exists() else None
+        return self._embeddings[embedding_column]
+
+    def attach_embeddings(self, df: pd.DataFrame, embedding_columns: iter = None) -> pd.DataFrame:
+        """
+        Adds the embedding columns (as an array per row) to a data frame loaded from the processed data
+        :return: a copy of the data frame, with the embedding columns
+        """
+        embedding_columns = embedding_columns or self.EMBEDDING_COLUMNS
+        df = df.copy()
+        for col in embedding_columns:
+            index_col = col + self.EMBEDDING_INDEX_SUFFIX
+            embeddings = self.load_embeddings(col)
+            if col in df.columns or index_col not in df.columns or embeddings is None:
+                continue
+            df[col] = list(np.asarray(embeddings[df[index_col].values]))
+        return df
+
+    def save_image_shards(self, augmentations: int = 0, images_per_shard: int = 4096) -> str:
+        """
+        Packs the resized images of the processed data into memory mappable shards
+        :param augmentations: the number of augmentations to pack as well. If None - all available augmentations
+        :param images_per_shard: the number of images in a single shard file
+        """
+        from data_access.image_shards import create_image_shards
+        store = create_image_shards(self, augmentations=augmentations, images_per_shard=images_per_shard)
+        return str(store.folder)
+
+    def load_processed_data(self, group: str = None, columns: list = None,
+                            attach_embeddings: bool = True) -> pd.DataFrame:
+        """
+        :param group: the group to load (e.g. 'train'). If None, all groups are loaded
+        :param columns: the columns to load. If None, all columns are loaded
+        :param attach_embeddings: whether to add the embedding columns (as an array per row) when all columns are
+                                  loaded. Consumers that gather rows from load_embeddings by the '_idx' columns
+                                  can skip it
+        """
 
         if group is not None:
             filters = [('group', '==', str(group)), ]
         else:
             filters = None
 
-        df_data = self._load_processed_data(filters=filters, columns=columns)
+        df_data = self._load_processed_data(filters=filters, columns=columns, attach_embeddings=attach_embeddings)
         return df_data
 
-    def _load_processed_data(self, filters: list = None, columns: list = None) -> pd.DataFrame:
+    def _load_processed_data(self, filters: list = None, columns: list = None,
+                             attach_embeddings: bool = True) -> pd.DataFrame:
         full_path = str(self.processed_data_location)
         logger.debug(f'loading processed data from:\n{full_path}')
+        # Embeddings that are stored in matrices are loaded through their index column
+        requested_columns = columns if columns is not None else (self.EMBEDDING_COLUMNS if attach_embeddings else [])
+        embedding_columns = [col for col in requested_columns if col in self.EMBEDDING_COLUMNS
+                             and self.get_embeddings_location(col).exists()]
+        if embedding_columns and columns is not None:
+            index_columns = [col + self.EMBEDDING_INDEX_SUFFIX for col in embedding_columns]
+            columns = [col for col in columns if col not in embedding_columns] + index_columns
+
         affective_columns = tuple(columns or {}) if columns is not None else None
         affective_filters = tuple(filters or {}) if filters is not None else None
-        df_data = self._load_parquet(full_path, affective_columns, filters=affective_filters)
+        df_data = self._load_parquet(full_path, affective_columns, filters=affective_filters,
+                                     stamp=self.processed_data_stamp)
+        if embedding_columns:
+            df_data = self.attach_embeddings(df_data, embedding_columns)
         return df_data
 
     def save_augmentation_data(self, df_augmentations):
@@ -145,7 +282,11 @@ class DataAccess(object):
 
     @staticmethod
     @lru_cache(maxsize=5)
-    def _load_parquet(path, columns=None, filters=None, convert_to_pandas=True):
+    def _load_parquet(path, columns=None, filters=None, convert_to_pandas=True, stamp=None):
+        """
+        :param stamp: the version of the data at path. It is only part of the cache key, so regenerated data is read
+                      again rather than served from cache
+        """
         logger.debug(f'loading parquet from:\n{path}')
 
         data_set = pq.ParquetDataset(path, filters=filters)
@@ -212,13 +353,14 @@ class SpecificDataAccess(DataAccess):
         self.group = group
         self.question_category = question_category
 
-    def load_processed_data(self, group: str = None, columns: list = None) -> pd.DataFrame:
+    def load_processed_data(self, group: str = None, columns: list = None,
+                            attach_embeddings: bool = True) -> pd.DataFrame:
         if group is not None and self.group is not None:
             msg = f'For {self.__class__.__name__}, group cannot be differ from instance group. {group} != {self.group}'
             raise InvalidArgumentException(group, msg)
 
         affective_group = group or self.group
-        df_data = super().load_processed_data(affective_group, columns)
+        df_data = super().load_processed_data(affective_group, columns, attach_embeddings=attach_embeddings)
 
         if self.question_category:
             df_data = df_data[df_data.question_category == self.question_category]
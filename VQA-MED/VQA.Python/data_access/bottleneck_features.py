@@ -0,0 +1,199 @@
+import os
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from common.exceptions import NoDataException
+from common.os_utils import File
+from common.utils import VerboseTimer
+
+logger = logging.getLogger(__name__)
+
+
+class BottleneckFeatureStore(object):
+    """
+    Holds the activations of the frozen image model (VGG19 + average pooling) for every image.
+    Features are kept in a memory mapped matrix, and are keyed by the image content,
+    so identical images share a single row.
+    """
+
+    FEATURES_FILE_NAME = 'features.npy'
+    INDEX_FILE_NAME = 'index.json'
+
+    def __init__(self, folder):
+        """"""
+        super().__init__()
+        self.folder = Path(str(folder))
+        self._features = None
+        self._index = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(folder={str(self.folder)})'
+
+    @property
+    def features_location(self):
+        return self.folder / self.FEATURES_FILE_NAME
+
+    @property
+    def index_location(self):
+        return self.folder / self.INDEX_FILE_NAME
+
+    @property
+    def exists(self):
+        return self.features_location.exists() and self.index_location.exists()
+
+    @property
+    def features(self) -> np.ndarray:
+        if self._features is None:
+            if not self.exists:
+                raise NoDataException(f'No bottleneck features were found at "{self.folder}"')
+            self._features = np.load(str(self.features_location), mmap_mode='r')
+        return self._features
+
+    @property
+    def index(self) -> dict:
+        """
+        The index of the store:
+            'row_by_hash': The row in the features matrix of each content hash
+            'hash_by_path': For each image path - its content hash and its modification time when hashed
+        """
+        if self._index is None:
+            if self.index_location.exists():
+                self._index = File.load_json(self.index_location)
+            else:
+                self._index = {'row_by_hash': {}, 'hash_by_path': {}}
+        return self._index
+
+    @staticmethod
+    def get_content_hash(image_path: str) -> str:
+        with open(str(image_path), 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def get_image_features(self, image_paths: iter) -> np.ndarray:
+        """
+        Gets the features of the given images.
+        Raises NoDataException for an image that has no features, or whose file changed since they were computed
+        """
+        # Each distinct path is checked once
+        row_by_path = {}
+        rows = []
+        for path in image_paths:
+            path = str(path)
+            row = row_by_path.get(path)
+            if row is None:
+                row = row_by_path[path] = self._get_row(path)
+            rows.append(row)
+        return self.features[rows]
+
+    def _get_row(self, image_path: str) -> int:
+        known = self.index['hash_by_path'].get(image_path)
+        if known is None:
+            raise NoDataException(f'Image "{image_path}" has no bottleneck features. '
+                                  f'Was {self.__class__.__name__}.build called for it?')
+        content_hash, mtime = known
+        try:
+            is_current = os.path.getmtime(image_path) == mtime
+        except OSError:
+            is_current = False
+        if not is_current:
+            raise NoDataException(f'Image "{image_path}" changed since its bottleneck features were computed. '
+                                  f'Call {self.__class__.__name__}.build for it again')
+        return self.index['row_by_hash'][content_hash]
+
+    def build(self, image_paths: iter, image_model=None, batch_size: int = 64) -> int:
+        """
+        Runs every image that has no features yet through the frozen image model and persist its activations
+        :param image_paths: the paths to compute features for
+        :param image_model: a keras model from image to its features. Defaults to the frozen image model of the VQA model
+        :param batch_size: number of images to push through the image model at once
+        :return: the number of newly computed feature rows
+        """
+        from common.functions import get_images
+
+        hash_by_path = self.index['hash_by_path']
+        row_by_hash = self.index['row_by_hash']
+
+        unique_paths = [str(p) for p in pd.Series(list(image_paths)).drop_duplicates()]
+        with VerboseTimer(f'Hashing {len(unique_paths)} images'):
+            for path in tqdm(unique_paths):
+                mtime = os.path.getmtime(path)
+                known = hash_by_path.get(path)
+                if known is None or known[1] != mtime:
+                    hash_by_path[path] = [self.get_content_hash(path), mtime]
+
+        # One path for each content we did not compute yet
+        path_by_new_hash = {}
+        for path in unique_paths:
+            content_hash = hash_by_path[path][0]
+            if content_hash not in row_by_hash:
+                path_by_new_hash.setdefault(content_hash, path)
+
+        logger.info(f'Got {len(path_by_new_hash)} new images out of {len(unique_paths)} images')
+        if len(path_by_new_hash) == 0:
+            File.dump_json(self.index, str(self.index_location))
+            return 0
+
+        if image_model is None:
+            from classes.vqa_model_builder import VqaModelBuilder
+            image_model = VqaModelBuilder.get_image_features_model()
+
+        new_hashes = list(path_by_new_hash.keys())
+        features_dim = image_model.output_shape[-1]
+        existing_count = len(row_by_hash)
+        total_count = existing_count + len(new_hashes)
+
+        File.validate_dir_exists(self.folder)
+        temp_location = str(self.features_location) + '.tmp'
+        features = np.lib.format.open_memmap(temp_location, mode='w+', dtype=np.float32,
+                                             shape=(total_count, features_dim))
+        if existing_count:
+            features[:existing_count] = self.features
+
+        with VerboseTimer(f'Computing bottleneck features for {len(new_hashes)} images'):
+            for start in tqdm(range(0, len(new_hashes), batch_size)):
+                batch_hashes = new_hashes[start:start + batch_size]
+                images = get_images(path_by_new_hash[h] for h in batch_hashes)
+                row_start = existing_count + start
+                features[row_start:row_start + len(batch_hashes)] = image_model.predict(images)
+
+        features.flush()
+        del features
+        self._features = None  # Release the old mapping before replacing the file
+        os.replace(temp_location, str(self.features_location))
+
+        for i, content_hash in enumerate(new_hashes, start=existing_count):
+            row_by_hash[content_hash] = i
+        File.dump_json(self.index, str(self.index_location))
+
+        return len(new_hashes)
+
+
+def create_bottleneck_features(data_access, augmentations: int = None, batch_size: int = 64) -> BottleneckFeatureStore:
+    """
+    Computes the bottleneck features for all images in the processed data and its augmentations
+    :param data_access: the data access to get the images from and to store features to
+    :param augmentations: the number of augmentations to compute features for. If None - all available augmentations
+    :param batch_size: number of images to push through the image model at once
+    """
+    paths = list(data_access.load_processed_data(columns=['path']).path)
+    if data_access.augmentation_location.exists():
+        df_augmentations = data_access.load_augmentation_data(columns=['path'], augmentations=augmentations)
+        paths.extend(df_augmentations.path)
+
+    store = BottleneckFeatureStore(data_access.bottleneck_features_location)
+    new_count = store.build(paths, batch_size=batch_size)
+    logger.info(f'Computed {new_count} new bottleneck features at {store.folder}')
+    return store
+
+
+def main():
+    from common.settings import data_access
+    create_bottleneck_features(data_access)
+
+
+if __name__ == '__main__':
+    main()
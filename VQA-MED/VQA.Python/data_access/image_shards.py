@@ -0,0 +1,190 @@
+import os
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from common.exceptions import NoDataException
+from common.os_utils import File
+from common.utils import VerboseTimer
+
+logger = logging.getLogger(__name__)
+
+
+class ImageShardStore(object):
+    """
+    Holds the decoded and resized images of the data set packed into a few large uint8 .npy shards,
+    so reading a batch does not have to open and decode thousands of small JPEGs.
+    Shards are memory mapped, and indexed by the image path.
+    """
+
+    INDEX_FILE_NAME = 'index.json'
+    SHARD_FILE_NAME_FORMAT = 'shard_{0:04d}.npy'
+
+    def __init__(self, folder):
+        """"""
+        super().__init__()
+        self.folder = Path(str(folder))
+        self._shards = {}
+        self._index = None
+        self._changed_paths = set()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(folder={str(self.folder)})'
+
+    @property
+    def index_location(self):
+        return self.folder / self.INDEX_FILE_NAME
+
+    @property
+    def exists(self):
+        return self.index_location.exists()
+
+    @property
+    def index(self) -> dict:
+        """
+        The index of the store:
+            'image_shape': The shape of a single image
+            'shards': The file names of the shards
+            'location_by_path': For each image path - its shard number, its row within the shard,
+                                and the modification time and size of the image file when it was packed
+        """
+        if self._index is None:
+            if not self.exists:
+                raise NoDataException(f'No image shards were found at "{self.folder}"')
+            self._index = File.load_json(self.index_location)
+        return self._index
+
+    def get_shard(self, shard_number: int) -> np.ndarray:
+        shard = self._shards.get(shard_number)
+        if shard is None:
+            shard_location = self.folder / self.index['shards'][shard_number]
+            shard = np.load(str(shard_location), mmap_mode='r')
+            self._shards[shard_number] = shard
+        return shard
+
+    def get_image_features(self, image_paths: iter) -> np.ndarray:
+        """
+        Gets the images of the given paths, stacked in order (copied out of the shards).
+        Images that were not packed, or whose file changed since they were packed, are decoded from their files.
+        """
+        image_paths = [str(p) for p in image_paths]
+        images = np.empty([len(image_paths)] + self.index['image_shape'], dtype=np.uint8)
+
+        location_by_distinct_path = {p: self._get_location(p) for p in set(image_paths)}
+        locations = np.array([location_by_distinct_path[p] for p in image_paths], dtype=np.int64).reshape(-1, 2)
+        shard_numbers, rows = locations[:, 0], locations[:, 1]
+        for shard_number in np.unique(shard_numbers[shard_numbers >= 0]):
+            idxs = np.flatnonzero(shard_numbers == shard_number)
+            shard_rows = rows[idxs]
+            shard = self.get_shard(shard_number)
+            if len(shard_rows) and np.all(np.diff(shard_rows) == 1):
+                # A consecutive run of rows is read with a single slice, rather than gathered row by row
+                images[idxs] = shard[shard_rows[0]:shard_rows[-1] + 1]
+            else:
+                images[idxs] = shard[shard_rows]
+
+        missing = np.flatnonzero(shard_numbers < 0)
+        if len(missing):
+            from common.functions import get_images
+            logger.debug(f'{len(missing)} images were not packed in shards (or changed). Decoding them from files')
+            images[missing] = get_images(image_paths[i] for i in missing)
+
+        return images
+
+    @staticmethod
+    def _get_file_stamp(image_path: str) -> list:
+        stat = os.stat(image_path)
+        return [stat.st_mtime, stat.st_size]
+
+    def _get_location(self, image_path: str) -> tuple:
+        """
+        :return: the (shard number, row) of a packed image, or (-1, -1) if it was not packed or its file changed
+        """
+        location = self.index['location_by_path'].get(image_path)
+        if location is None:
+            return -1, -1
+        shard_number, row, *stamp = location
+        try:
+            is_current = stamp == self._get_file_stamp(image_path)
+        except OSError:
+            is_current = False
+        if not is_current:
+            if image_path not in self._changed_paths:
+                self._changed_paths.add(image_path)
+                logger.warning(f'"{image_path}" changed since it was packed. Decoding it from its file')
+            return -1, -1
+        return shard_number, row
+
+    def build(self, image_paths: iter, images_per_shard: int = 4096, batch_size: int = 256) -> int:
+        """
+        Packs the given images into shards, replacing any existing shards
+        :param image_paths: the paths of the images to pack
+        :param images_per_shard: the number of images in a single shard file
+        :param batch_size: the number of images to decode at once
+        :return: the number of packed images
+        """
+        from common.functions import get_images
+
+        unique_paths = [str(p) for p in pd.Series(list(image_paths)).drop_duplicates()]
+        if len(unique_paths) == 0:
+            raise NoDataException('Got no images to pack')
+
+        File.validate_dir_exists(self.folder)
+        for old_shard in self.folder.glob(self.SHARD_FILE_NAME_FORMAT.replace('{0:04d}', '*')):
+            old_shard.unlink()
+        self._shards = {}
+        self._index = None
+
+        image_shape = list(get_images(unique_paths[:1]).shape[1:])
+        shard_names = []
+        location_by_path = {}
+        with VerboseTimer(f'Packing {len(unique_paths)} images into shards'):
+            for shard_number, shard_start in enumerate(range(0, len(unique_paths), images_per_shard)):
+                shard_paths = unique_paths[shard_start:shard_start + images_per_shard]
+                shard_name = self.SHARD_FILE_NAME_FORMAT.format(shard_number)
+                shard = np.lib.format.open_memmap(str(self.folder / shard_name), mode='w+', dtype=np.uint8,
+                                                  shape=tuple([len(shard_paths)] + image_shape))
+                for start in tqdm(range(0, len(shard_paths), batch_size)):
+                    batch_paths = shard_paths[start:start + batch_size]
+                    # Stamped before decoding, so a file that changes while it is packed is considered changed
+                    location_by_path.update({p: [shard_number, start + i] + self._get_file_stamp(p)
+                                             for i, p in enumerate(batch_paths)})
+                    shard[start:start + len(batch_paths)] = get_images(batch_paths)
+                shard.flush()
+                del shard
+
+                shard_names.append(shard_name)
+
+        index = {'image_shape': image_shape, 'shards': shard_names, 'location_by_path': location_by_path}
+        File.dump_json(index, str(self.index_location))
+        return len(unique_paths)
+
+
+def create_image_shards(data_access, augmentations: int = 0, images_per_shard: int = 4096) -> ImageShardStore:
+    """
+    Packs all the images of the processed data (train, validation and test) and optionally of its augmentations
+    :param data_access: the data access to get the images from and to store the shards to
+    :param augmentations: the number of augmentations to pack. If None - all available augmentations
+    :param images_per_shard: the number of images in a single shard file
+    """
+    paths = list(data_access.load_processed_data(columns=['path']).path)
+    if augmentations != 0 and data_access.augmentation_location.exists():
+        df_augmentations = data_access.load_augmentation_data(columns=['path'], augmentations=augmentations)
+        paths.extend(df_augmentations.path)
+
+    store = ImageShardStore(data_access.image_shards_location)
+    image_count = store.build(paths, images_per_shard=images_per_shard)
+    logger.info(f'Packed {image_count} images at {store.folder}')
+    return store
+
+
+def main():
+    from common.settings import data_access
+    create_image_shards(data_access)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import math
 import logging
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 import shutil
 from pathlib import Path
@@ -9,7 +10,7 @@ from keras.callbacks import History
 from keras.models import load_model as keras_load_model
 from keras.utils import plot_model
 from common.os_utils import File
-from common.settings import data_access
+from common.settings import data_access as common_data_access
 from common.utils import VerboseTimer
 from data_access.api import DataAccess
 from evaluate.statistical import f1_score, recall_score, precision_score
@@ -22,6 +23,9 @@ class ModelFolderStructure(object):
 
     ADDITIONAL_INFO_FILE_NAME = 'additional_info.json'
     META_DATA_FILE_NAME = 'meta_data.h5'
+    ANSWER_CONVERSIONS_FILE_NAME = 'answer_conversions.h5'
+    ANSWER_CONVERSIONS_KEY = 'answers'
+    ANSWER_CONVERSIONS_STAMP_KEY = 'processed_data_stamp'
     MODEL_FILE_NAME = 'vqa_model.h5'
     HISTORY_FILE_NAME = 'model_history.pkl'
     MODEL_SUMMARY_FILE_NAME = 'model_summary.txt'
@@ -36,6 +40,10 @@ class ModelFolderStructure(object):
     def meta_data_path(self):
         return self.folder / self.META_DATA_FILE_NAME
 
+    @property
+    def answer_conversions_path(self):
+        return self.folder / self.ANSWER_CONVERSIONS_FILE_NAME
+
     @property
     def model_path(self):
         return self.folder / self.MODEL_FILE_NAME
@@ -81,6 +89,9 @@ class ModelFolder(ModelFolderStructure):
         self.additional_info = File.load_json(str(self.additional_info_path))
         self.prediction_data_name = self.additional_info['prediction_data']
         self.question_category = self.additional_info.get('question_category')
+        self.use_bottleneck_features = self.additional_info.get('use_bottleneck_features', False)
+        self._answer_conversions = None
+        self._answer_conversions_stamp = None
 
         assert self.folder.exists()
 
@@ -142,6 +153,64 @@ class ModelFolder(ModelFolderStructure):
         ret = DataAccess.get_prediction_data(meta, prediction_data_name, self.question_category)
         return ret
 
+    def get_image_provider(self, data_access: DataAccess = None):
+        """
+        Gets the source for the image inputs of the model
+        :return: a BottleneckFeatureStore for head only models.
+                 For models that take the raw images - an ImageShardStore if images were packed, None otherwise
+        """
+        data_access = data_access or common_data_access
+        if self.use_bottleneck_features:
+            from data_access.bottleneck_features import BottleneckFeatureStore
+            return BottleneckFeatureStore(data_access.bottleneck_features_location)
+
+        from data_access.image_shards import ImageShardStore
+        shard_store = ImageShardStore(data_access.image_shards_location)
+        return shard_store if shard_store.exists else None
+
+    def get_answer_conversions(self, data_access: DataAccess = None) -> pd.Series:
+        """
+        Gets the mapping from a processed answer to the human style answer (the first answer it was processed from).
+        The mapping is built from the processed data, and persisted in the model folder along with the stamp of the
+        processed data it was built from. When the processed data is regenerated, the mapping is built again.
+        """
+        data_access = data_access or common_data_access
+        stamp = data_access.processed_data_stamp
+        if self._answer_conversions is not None and self._answer_conversions_stamp == stamp:
+            return self._answer_conversions
+
+        conversions_location = str(self.answer_conversions_path)
+        conversions = None
+        if self.answer_conversions_path.exists():
+            try:
+                with pd.HDFStore(conversions_location, mode='r') as store:
+                    saved_stamp = store[self.ANSWER_CONVERSIONS_STAMP_KEY].iloc[0] \
+                        if self.ANSWER_CONVERSIONS_STAMP_KEY in store else None
+                    if saved_stamp == stamp:
+                        conversions = store[self.ANSWER_CONVERSIONS_KEY]
+                    else:
+                        logger.info('The processed data changed since answer conversions were saved. Rebuilding them')
+            except Exception as ex:
+                logger.warning(f'Failed to read answer conversions:\n{ex}')
+
+        if conversions is None:
+            with VerboseTimer("Building answer conversions"):
+                df_conversions = data_access.load_processed_data(columns=['answer', 'processed_answer'])
+                df_conversions = df_conversions[df_conversions.processed_answer.str.len() > 0]
+                # removing duplicates
+                df_conversions = df_conversions.drop_duplicates(subset='processed_answer', keep='first')
+                conversions = pd.Series(df_conversions.answer.values, index=df_conversions.processed_answer.values)
+            try:
+                with pd.HDFStore(conversions_location, mode='w') as store:
+                    store[self.ANSWER_CONVERSIONS_KEY] = conversions
+                    store[self.ANSWER_CONVERSIONS_STAMP_KEY] = pd.Series([stamp], dtype=object)
+            except Exception as ex:
+                logger.warning(f'Failed to save answer conversions:\n{ex}')
+
+        self._answer_conversions = conversions
+        self._answer_conversions_stamp = stamp
+        return conversions
+
     @property
     def history(self):
         return File.load_pickle(self.history_path, read_mode='rb')
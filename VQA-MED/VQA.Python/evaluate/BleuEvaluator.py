@@ -4,6 +4,7 @@ from nltk.translate.bleu_score import SmoothingFunction
 from nltk.corpus import stopwords
 from nltk.stem.snowball import SnowballStemmer
 from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
+from evaluate.bleu_engine import get_bleu_engine
 import string
 
 class BleuEvaluator(VqaMedEvaluatorBase):
@@ -34,6 +35,18 @@ class BleuEvaluator(VqaMedEvaluatorBase):
         return bleu
 
     def _compute_bleu(self, predictions, ground_truth):
+        candidate_pairs = self._readresult(predictions)
+        gt_pairs = self._readresult(ground_truth)
+
+        # Scores all pairs at once, same as _compute_bleu_per_pair
+        engine = get_bleu_engine(remove_stopwords=BleuEvaluator.remove_stopwords,
+                                 stemming=BleuEvaluator.stemming,
+                                 case_sensitive=BleuEvaluator.case_sensitive)
+        scores = engine.score_pairs([gt_pairs[image_key] for image_key in candidate_pairs],
+                                    list(candidate_pairs.values()))
+        return sum(scores.tolist()) / len(gt_pairs)
+
+    def _compute_bleu_per_pair(self, predictions, ground_truth):
         '''
     Compute and return the secondary score
     Parameter 'predictions' : predictions object generated by the load_predictions method
@@ -1,3 +1,4 @@
+import itertools
 import nltk
 from argparse import ArgumentError
 from collections import namedtuple
@@ -49,25 +50,23 @@ class VqaMedEvaluatorBase(object):
     @classmethod
     def get_all_evaluation(cls, predictions: Iterable[str], ground_truth: Iterable[str]):
         # cls.update_nltk()
-        from evaluate.BleuEvaluator import BleuEvaluator
-        from evaluate.WbssEvaluator import WbssEvaluator
-        from evaluate.StrictAccuracyEvaluator import StrictAccuracyEvaluator
+        from evaluate.streaming_evaluator import StreamingEvaluator
 
-        sub_classes = [StrictAccuracyEvaluator, BleuEvaluator, WbssEvaluator]
-        instances = [sub_cls(predictions, ground_truth) for sub_cls in sub_classes]
-
-        evaluations = {ins.get_name(): ins.evaluate() for ins in instances}
-
-        return evaluations
+        # All metrics are computed in a single pass over the rows
+        evaluator = StreamingEvaluator()
+        evaluator.update(predictions, ground_truth)
+        return evaluator.result()
 
     @staticmethod
     def consolidate_input(predictions: iter, ground_truth: iter) -> (List[Prediction], List[Prediction]):
-        all_types = {type(p) for p in set(predictions).union(set(ground_truth))}
-        assert len(all_types) == 1, \
-            'Expected all predictions & ground truth to have same type'
-
         assert len(predictions) == len(ground_truth), \
             'expected predictions and ground truth to be of same length'
+        if len(predictions) == 0:
+            return [], []
+
+        all_types = {type(p) for p in itertools.chain(predictions, ground_truth)}
+        assert len(all_types) == 1, \
+            'Expected all predictions & ground truth to have same type'
 
         t = all_types.pop()
         if t == str:
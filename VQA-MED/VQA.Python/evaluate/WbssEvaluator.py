@@ -1,16 +1,12 @@
 from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
-from nltk.corpus import wordnet as wn
+from evaluate.wordnet_similarity import wup_measure
+from evaluate.wbss_engine import get_wbss_engine
 from scipy import spatial
 
 
 class WbssEvaluator(VqaMedEvaluatorBase):
     """"""
 
-    def __init__(self, predictions, ground_truth):
-        super().__init__(predictions, ground_truth)
-        # Used for WUPS
-        self.word_pair_dict = {}
-
     def get_name(self):
         return 'wbss'
 
@@ -18,6 +14,14 @@ class WbssEvaluator(VqaMedEvaluatorBase):
         return self._compute_wbss(self.predictions, self.ground_truth)
 
     def _compute_wbss(self, predictions, ground_truth):
+        for tuple1, tuple2 in zip(ground_truth, predictions):
+            assert (tuple1.q_id == tuple2.q_id)
+            assert (tuple1.image_id == tuple2.image_id)
+
+        # Scores all pairs at once, same as _compute_wbss_per_pair
+        return get_wbss_engine().score([t.answer for t in ground_truth], [t.answer for t in predictions])
+
+    def _compute_wbss_per_pair(self, predictions, ground_truth):
         """
     Compute and return the primary score
     Parameter 'predictions' : predictions object generated by the load_predictions method
@@ -83,50 +87,15 @@ class WbssEvaluator(VqaMedEvaluatorBase):
         score = self._wup_measure(word1, word2)
         return score
 
-    def _wup_measure(self, a, b, similarity_threshold=0.925, debug=False):
+    def _wup_measure(self, a, b, similarity_threshold=0.925):
         """
         Returns Wu-Palmer similarity score.
         More specifically, it computes:
             max_{x \in interp(a)} max_{y \in interp(b)} wup(x,y)
             where interp is a 'interpretation field'
+        Similarities are cached process wide (and optionally on disk), see evaluate.wordnet_similarity
         """
-        if debug: print('Original', a, b)
-        # if word_pair_dict.has_key(a+','+b):
-        if a + ',' + b in self.word_pair_dict.keys():
-            return self.word_pair_dict[a + ',' + b]
-
-        def get_semantic_field(a):
-            return wn.synsets(a, pos=wn.NOUN)
-
-        if a == b: return 1.0
-
-        interp_a = get_semantic_field(a)
-        interp_b = get_semantic_field(b)
-        if debug: print(interp_a)
-
-        if interp_a == [] or interp_b == []:
-            return 0.0
-
-        if debug: print('Stem', a, b)
-        global_max = 0.0
-        for x in interp_a:
-            for y in interp_b:
-                local_score = x.wup_similarity(y)
-                if debug: print('Local', local_score)
-                if local_score > global_max:
-                    global_max = local_score
-        if debug: print('Global', global_max)
-
-        # we need to use the semantic fields and therefore we downweight
-        # unless the score is high which indicates both are synonyms
-        if global_max < similarity_threshold:
-            interp_weight = 0.1
-        else:
-            interp_weight = 1.0
-
-        final_score = global_max * interp_weight
-        self.word_pair_dict[a + ',' + b] = final_score
-        return final_score
+        return wup_measure(a, b, similarity_threshold=similarity_threshold)
 
     def _calculateCosineSimilarity(self, vector1, vector2):
         return 1 - spatial.distance.cosine(vector1, vector2)
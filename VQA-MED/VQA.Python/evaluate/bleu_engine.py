@@ -0,0 +1,242 @@
+import sys
+import math
+import string
+import logging
+from functools import lru_cache
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+def _with_capacity(array: np.ndarray, size: int) -> np.ndarray:
+    """Gets the array, or a copy of it at least twice as large if it is shorter than size"""
+    if len(array) >= size:
+        return array
+    grown = np.empty(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _CountRows(object):
+    """
+    The rows of a sparse count matrix, which are only ever appended to.
+    Rows are kept in CSR arrays of amortized growing capacity, so appending a row does not copy the previous ones
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.indptr = np.zeros(1, dtype=np.int32)
+        self.indices = np.empty(0, dtype=np.int32)
+        self.data = np.empty(0, dtype=np.int64)
+        self.rows = 0
+        self.nnz = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rows={self.rows}, nnz={self.nnz})'
+
+    def append(self, rows: list) -> None:
+        """Appends rows, each a {column: count} dictionary"""
+        if not rows:
+            return
+        row_count = self.rows + len(rows)
+        nnz = self.nnz + sum(len(counts) for counts in rows)
+        self.indptr = _with_capacity(self.indptr, row_count + 1)
+        self.indices = _with_capacity(self.indices, nnz)
+        self.data = _with_capacity(self.data, nnz)
+
+        self.indptr[self.rows + 1:row_count + 1] = self.nnz + np.cumsum([len(counts) for counts in rows])
+        self.indices[self.nnz:nnz] = np.fromiter((column for counts in rows for column in counts),
+                                                 dtype=np.int32, count=nnz - self.nnz)
+        self.data[self.nnz:nnz] = np.fromiter((count for counts in rows for count in counts.values()),
+                                              dtype=np.int64, count=nnz - self.nnz)
+        self.rows, self.nnz = row_count, nnz
+
+    def to_csr(self, columns: int) -> sparse.csr_matrix:
+        """A (rows, columns) matrix over the arrays (not a copy of them)"""
+        return sparse.csr_matrix((self.data[:self.nnz], self.indices[:self.nnz], self.indptr[:self.rows + 1]),
+                                 shape=(self.rows, max(1, columns)))
+
+
+class BleuEngine(object):
+    """
+    Computes sentence BLEU (as BleuEvaluator does, i.e. NLTK's sentence_bleu with 4-gram uniform weights and no
+    smoothing) for many (reference, candidate) pairs at once.
+    Each distinct sentence is normalized (lower cased, tokenized, stop words removed and stemmed) once,
+    and kept as a sparse n-gram count vector per n-gram order, so the clipped n-gram matches of many pairs are
+    computed with a single sparse minimum.
+    """
+
+    def __init__(self, remove_stopwords: bool = True, stemming: bool = True, case_sensitive: bool = False,
+                 max_order: int = 4, tokenize: callable = None, max_chunk_size: int = 100000):
+        """
+        :param remove_stopwords: remove english stop words (as BleuEvaluator.remove_stopwords)
+        :param stemming: apply snowball stemming (as BleuEvaluator.stemming)
+        :param case_sensitive: keep the case of the sentences (as BleuEvaluator.case_sensitive)
+        :param max_order: the maximal n-gram order. Weights are uniform
+        :param tokenize: splits a sentence to words. Defaults to nltk.tokenize.word_tokenize
+        :param max_chunk_size: the maximal number of pairs scored together
+        """
+        super().__init__()
+        self.remove_stopwords = remove_stopwords
+        self.stemming = stemming
+        self.case_sensitive = case_sensitive
+        self.max_order = max_order
+        self.max_chunk_size = max_chunk_size
+        self._tokenize = tokenize
+
+        self._stops = None
+        self._stemmer = None
+        self._translator = str.maketrans('', '', string.punctuation)
+
+        self._id_by_sentence = {}
+        self._lengths = []
+        self._ngram_ids = [{} for _ in range(max_order)]
+        self._pending_ngrams = [[] for _ in range(max_order)]
+        self._count_rows = [_CountRows() for _ in range(max_order)]
+        self._count_matrices = [None] * max_order
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(remove_stopwords={self.remove_stopwords}, stemming={self.stemming}, ' \
+            f'case_sensitive={self.case_sensitive}, max_order={self.max_order})'
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def normalize(self, sentence: str) -> list:
+        """Gets the words of a sentence, the way BleuEvaluator compares them"""
+        if not self.case_sensitive:
+            sentence = sentence.lower()
+
+        tokenize = self._tokenize
+        if tokenize is None:
+            import nltk
+            tokenize = self._tokenize = nltk.tokenize.word_tokenize
+        words = tokenize(sentence.translate(self._translator))
+
+        if self.remove_stopwords:
+            if self._stops is None:
+                from nltk.corpus import stopwords
+                self._stops = set(stopwords.words("english"))
+            words = [word for word in words if word.lower() not in self._stops]
+
+        if self.stemming:
+            if self._stemmer is None:
+                from nltk.stem.snowball import SnowballStemmer
+                self._stemmer = SnowballStemmer("english")
+            words = [self._stemmer.stem(word) for word in words]
+        return words
+
+    def get_sentence_ids(self, sentences: iter) -> np.ndarray:
+        """
+        Gets the id of each sentence, normalizing sentences that were not seen before
+        :return: an int64 array of ids
+        """
+        id_by_sentence = self._id_by_sentence
+        ids = []
+        added = False
+        for sentence in sentences:
+            sentence_id = id_by_sentence.get(sentence)
+            if sentence_id is None:
+                sentence_id = id_by_sentence[sentence] = self._add_sentence(sentence)
+                added = True
+            ids.append(sentence_id)
+        if added:
+            self._count_matrices = [None] * self.max_order
+        return np.array(ids, dtype=np.int64)
+
+    def _add_sentence(self, sentence: str) -> int:
+        words = self.normalize(sentence)
+        for n in range(1, self.max_order + 1):
+            ngram_ids = self._ngram_ids[n - 1]
+            counts = {}
+            for i in range(len(words) - n + 1):
+                ngram = tuple(words[i:i + n])
+                ngram_id = ngram_ids.get(ngram)
+                if ngram_id is None:
+                    ngram_id = ngram_ids[ngram] = len(ngram_ids)
+                counts[ngram_id] = counts.get(ngram_id, 0) + 1
+            self._pending_ngrams[n - 1].append(counts)
+        self._lengths.append(len(words))
+        return len(self._lengths) - 1
+
+    def _get_count_matrix(self, n: int) -> sparse.csr_matrix:
+        """The (sentences, n-grams) count matrix of n-grams of order n"""
+        matrix = self._count_matrices[n - 1]
+        if matrix is None:
+            # Only the rows of sentences added since the last call are built
+            count_rows = self._count_rows[n - 1]
+            count_rows.append(self._pending_ngrams[n - 1])
+            self._pending_ngrams[n - 1] = []
+            matrix = self._count_matrices[n - 1] = count_rows.to_csr(len(self._ngram_ids[n - 1]))
+        return matrix
+
+    def score_pairs(self, references: iter, candidates: iter) -> np.ndarray:
+        """
+        Gets the BLEU score of each (reference, candidate) pair.
+        As in BleuEvaluator, a pair where both sentences have no words scores 1
+        :return: a float64 array with a score per pair
+        """
+        reference_ids = self.get_sentence_ids(references)
+        candidate_ids = self.get_sentence_ids(candidates)
+        assert len(reference_ids) == len(candidate_ids), 'Expected references and candidates to be of same length'
+        return self.score_id_pairs(reference_ids, candidate_ids)
+
+    def score_id_pairs(self, reference_ids: np.ndarray, candidate_ids: np.ndarray) -> np.ndarray:
+        """Same as score_pairs, for sentences ids (see get_sentence_ids)"""
+        scores = np.empty(len(reference_ids))
+        for start in range(0, len(reference_ids), self.max_chunk_size):
+            end = start + self.max_chunk_size
+            scores[start:end] = self._score_chunk(reference_ids[start:end], candidate_ids[start:end])
+        return scores
+
+    def score(self, references: iter, candidates: iter) -> float:
+        """The mean BLEU score"""
+        scores = self.score_pairs(references, candidates)
+        # Summing in order, like the per pair evaluation does
+        return sum(scores.tolist()) / len(scores)
+
+    def _score_chunk(self, reference_ids: np.ndarray, candidate_ids: np.ndarray) -> list:
+        lengths = np.asarray(self._lengths, dtype=np.int64)
+        reference_lengths = lengths[reference_ids]
+        candidate_lengths = lengths[candidate_ids]
+
+        numerators = []
+        denominators = []
+        for n in range(1, self.max_order + 1):
+            counts = self._get_count_matrix(n)
+            clipped = counts[candidate_ids].minimum(counts[reference_ids])
+            numerators.append(np.asarray(clipped.sum(axis=1)).ravel().tolist())
+            denominators.append(np.maximum(1, candidate_lengths - n + 1).tolist())
+
+        weight = 1 / self.max_order
+        scores = []
+        for i, (reference_length, candidate_length) in enumerate(zip(reference_lengths.tolist(),
+                                                                      candidate_lengths.tolist())):
+            if reference_length == 0 and candidate_length == 0:
+                scores.append(1.0)
+                continue
+            # The same computations (and order of computations) as nltk.translate.bleu_score.corpus_bleu
+            if numerators[0][i] == 0:
+                scores.append(0.0)
+                continue
+
+            if candidate_length > reference_length:
+                brevity_penalty = 1
+            else:
+                brevity_penalty = math.exp(1 - reference_length / candidate_length)
+
+            # No smoothing (SmoothingFunction.method0): a precision of 0 contributes log(sys.float_info.min)
+            precisions = [numerator / denominator if numerator != 0 else sys.float_info.min
+                          for numerator, denominator in zip((nums[i] for nums in numerators),
+                                                            (dens[i] for dens in denominators))]
+            log_precisions = (weight * math.log(p) for p in precisions if p > 0)
+            scores.append(brevity_penalty * math.exp(math.fsum(log_precisions)))
+        return scores
+
+
+@lru_cache(maxsize=None)
+def get_bleu_engine(remove_stopwords: bool = True, stemming: bool = True, case_sensitive: bool = False) -> BleuEngine:
+    """Gets a process wide BLEU engine, so normalized sentences are shared by all evaluations"""
+    return BleuEngine(remove_stopwords=remove_stopwords, stemming=stemming, case_sensitive=case_sensitive)
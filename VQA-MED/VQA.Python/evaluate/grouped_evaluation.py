@@ -0,0 +1,47 @@
+import logging
+
+import pandas as pd
+
+from common.exceptions import InvalidArgumentException
+from common.utils import VerboseTimer
+from evaluate.streaming_evaluator import StreamingEvaluator, sum_in_order
+
+logger = logging.getLogger(__name__)
+
+TOTAL_GROUP = 'Total'
+
+
+def _mean(scores: list) -> float:
+    return sum_in_order(scores) / len(scores)
+
+
+def evaluate_by_group(df: pd.DataFrame, group_column: str, prediction_column: str = 'prediction',
+                      truth_column: str = 'answer', total_name: str = TOTAL_GROUP,
+                      evaluator: StreamingEvaluator = None) -> (dict, pd.DataFrame):
+    """
+    Evaluates predictions per group (e.g. per question category) and in total, scoring every row once.
+    :param df: the data frame with the predictions and the ground truth
+    :param group_column: the column to group rows by
+    :param prediction_column: the column of the predicted answers
+    :param truth_column: the column of the ground truth answers
+    :param total_name: the name of the evaluation over all rows
+    :param evaluator: the evaluator that scores the rows. Defaults to a StreamingEvaluator of all metrics
+    :return: the evaluations ({group: {metric: score}}, with the total last) and the per row scores (indexed like df)
+    """
+    for col in [group_column, prediction_column, truth_column]:
+        if col not in df.columns:
+            raise InvalidArgumentException(argument_name='df', argument=list(df.columns),
+                                           message=f'Expected the data frame to have a "{col}" column')
+
+    evaluator = evaluator or StreamingEvaluator()
+    with VerboseTimer(f'Scoring {len(df)} predictions'):
+        df_scores = evaluator.score(df[prediction_column].values, df[truth_column].values)
+    df_scores.index = df.index
+
+    evaluations = {}
+    metrics = list(df_scores.columns)
+    if len(df) > 0:
+        for group, df_group in df_scores.groupby(df[group_column].values):
+            evaluations[group] = {metric: _mean(df_group[metric].values.tolist()) for metric in metrics}
+        evaluations[total_name] = {metric: _mean(df_scores[metric].values.tolist()) for metric in metrics}
+    return evaluations, df_scores
@@ -0,0 +1,165 @@
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from common.exceptions import InvalidArgumentException
+
+logger = logging.getLogger(__name__)
+
+
+def sum_in_order(scores: iter, start: float = 0.0) -> float:
+    """
+    Sums scores one by one, in order (unlike np.sum's pairwise summation),
+    so totals are identical to those of the per pair evaluators
+    """
+    total = start
+    for score in scores:
+        total += score
+    return total
+
+
+class StreamingEvaluator(object):
+    """
+    Evaluates predictions batch by batch:
+    each batch is scored by all metrics (strict accuracy, BLEU and WBSS) and only the running totals of the scores
+    are kept, rather than the rows.
+    The BLEU / WBSS engines (the process wide ones, unless given) keep every distinct sentence they scored
+    (its n-gram counts / words, and the word pair similarities it needed), so distinct sentences are normalized once,
+    and memory grows with the number of distinct answers.
+    The result is the same as VqaMedEvaluatorBase.get_all_evaluation over all rows.
+    """
+    METRICS = ('strict_accuracy', 'bleu', 'wbss')
+
+    def __init__(self, metrics: iter = METRICS, bleu_engine=None, wbss_engine=None):
+        """
+        :param metrics: the metrics to compute (a subset of StreamingEvaluator.METRICS)
+        :param bleu_engine: the BleuEngine to score BLEU with. Defaults to the process wide one
+        :param wbss_engine: the WbssEngine to score WBSS with. Defaults to the process wide one
+        """
+        super().__init__()
+        unknown = [m for m in metrics if m not in self.METRICS]
+        if unknown:
+            raise InvalidArgumentException(argument_name='metrics', argument=unknown,
+                                           message=f'Unknown metrics: {unknown}. Expected any of {self.METRICS}')
+        self.metrics = tuple(metrics)
+        self._totals = {metric: 0.0 for metric in self.metrics}
+        self.count = 0
+
+        self.bleu_engine = bleu_engine
+        self.wbss_engine = wbss_engine
+        self._strict_accuracy_evaluator = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(metrics={self.metrics})'
+
+    @staticmethod
+    def _get_answers(items: iter) -> list:
+        # Accepts both answers and Prediction tuples
+        return [item.answer if isinstance(item, tuple) else item for item in items]
+
+    def score(self, batch_predictions: iter, batch_truth: iter) -> pd.DataFrame:
+        """
+        Scores a batch without updating the totals
+        :return: a data frame with a column per metric, and a row per (prediction, ground truth) pair
+        """
+        from evaluate.bleu_engine import get_bleu_engine
+        from evaluate.wbss_engine import get_wbss_engine
+        from evaluate.BleuEvaluator import BleuEvaluator
+        from evaluate.StrictAccuracyEvaluator import StrictAccuracyEvaluator
+
+        predictions = self._get_answers(batch_predictions)
+        ground_truth = self._get_answers(batch_truth)
+        assert len(predictions) == len(ground_truth), 'expected predictions and ground truth to be of same length'
+
+        scores = {}
+        if 'strict_accuracy' in self.metrics:
+            if self._strict_accuracy_evaluator is None:
+                self._strict_accuracy_evaluator = StrictAccuracyEvaluator(predictions=[], ground_truth=[])
+            matches = self._strict_accuracy_evaluator.score_pairs(ground_truth=ground_truth, predictions=predictions)
+            scores['strict_accuracy'] = matches.values.astype(float)
+        if 'bleu' in self.metrics:
+            if self.bleu_engine is None:
+                self.bleu_engine = get_bleu_engine(remove_stopwords=BleuEvaluator.remove_stopwords,
+                                                   stemming=BleuEvaluator.stemming,
+                                                   case_sensitive=BleuEvaluator.case_sensitive)
+            scores['bleu'] = self.bleu_engine.score_pairs(ground_truth, predictions)
+        if 'wbss' in self.metrics:
+            if self.wbss_engine is None:
+                self.wbss_engine = get_wbss_engine()
+            scores['wbss'] = self.wbss_engine.score_pairs(ground_truth, predictions)
+        return pd.DataFrame(scores, columns=list(self.metrics))
+
+    def update(self, batch_predictions: iter, batch_truth: iter) -> pd.DataFrame:
+        """
+        Scores a batch, and adds it to the totals
+        :param batch_predictions: the predicted answers (or Prediction tuples)
+        :param batch_truth: the ground truth answers (or Prediction tuples)
+        :return: the per row scores (see score)
+        """
+        df_scores = self.score(batch_predictions, batch_truth)
+        for metric in self.metrics:
+            self._totals[metric] = sum_in_order(df_scores[metric].values.tolist(), start=self._totals[metric])
+        self.count += len(df_scores)
+        return df_scores
+
+    def result(self) -> dict:
+        """The mean of each metric over all rows so far"""
+        if self.count == 0:
+            return {metric: np.nan for metric in self.metrics}
+        return {metric: self._totals[metric] / self.count for metric in self.metrics}
+
+    def reset(self) -> None:
+        self._totals = {metric: 0.0 for metric in self.metrics}
+        self.count = 0
+
+
+def iterate_hdf(path: str, key: str, columns: list, chunk_size: int = 10000):
+    """
+    Yields a data frame stored in an HDF file in chunks.
+    Tables (stored with format='table') are read chunk by chunk, fixed stores can only be read at once
+    """
+    with pd.HDFStore(str(path), mode='r') as store:
+        storer = store.get_storer(key)
+        if storer.is_table:
+            for df_chunk in store.select(key, columns=columns, chunksize=chunk_size):
+                yield df_chunk
+        else:
+            logger.warning(f'"{key}" is not stored as a table, so it is read at once')
+            df = store[key][columns]
+            for start in range(0, len(df), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+
+
+def evaluate_hdf(path: str, key: str = 'validation', prediction_column: str = 'prediction',
+                 truth_column: str = 'answer', chunk_size: int = 10000, metrics: iter = StreamingEvaluator.METRICS) \
+        -> dict:
+    """
+    Evaluates predictions stored in an HDF file, streaming its rows.
+    The evaluation has its own BLEU / WBSS engines, so the sentences of the file are not kept once it is evaluated
+    """
+    from evaluate.bleu_engine import BleuEngine
+    from evaluate.wbss_engine import WbssEngine
+    from evaluate.BleuEvaluator import BleuEvaluator
+
+    bleu_engine = BleuEngine(remove_stopwords=BleuEvaluator.remove_stopwords, stemming=BleuEvaluator.stemming,
+                             case_sensitive=BleuEvaluator.case_sensitive)
+    evaluator = StreamingEvaluator(metrics=metrics, bleu_engine=bleu_engine, wbss_engine=WbssEngine())
+    for df_chunk in iterate_hdf(path, key, columns=[prediction_column, truth_column], chunk_size=chunk_size):
+        evaluator.update(df_chunk[prediction_column].values, df_chunk[truth_column].values)
+    return evaluator.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluates a predictions HDF file')
+    parser.add_argument('path', help='the predictions hdf')
+    parser.add_argument('-k', dest='key', help='the key of the predictions in the hdf', default='validation')
+    parser.add_argument('-c', dest='chunk_size', help='the number of rows to evaluate at once', type=int,
+                        default=10000)
+    args = parser.parse_args()
+    print(evaluate_hdf(args.path, key=args.key, chunk_size=args.chunk_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import re
+import logging
+from types import MappingProxyType
+
+import pandas as pd
+
+from common.exceptions import InvalidArgumentException
+
+logger = logging.getLogger(__name__)
+
+CONTRACTIONS = MappingProxyType({"aint": "ain't", "arent": "aren't", "cant": "can't", "couldve": "could've",
+                                 "couldnt": "couldn't", "couldn'tve": "couldn't've", "couldnt've": "couldn't've",
+                                 "didnt": "didn't", "doesnt": "doesn't", "dont": "don't", "hadnt": "hadn't",
+                                 "hadnt've": "hadn't've", "hadn'tve": "hadn't've", "hasnt": "hasn't",
+                                 "havent": "haven't", "hed": "he'd", "hed've": "he'd've", "he'dve": "he'd've",
+                                 "hes": "he's", "howd": "how'd", "howll": "how'll", "hows": "how's", "Id've": "I'd've",
+                                 "I'dve": "I'd've", "Im": "I'm", "Ive": "I've", "isnt": "isn't", "itd": "it'd",
+                                 "itd've": "it'd've", "it'dve": "it'd've", "itll": "it'll", "let's": "let's",
+                                 "maam": "ma'am", "mightnt": "mightn't", "mightnt've": "mightn't've",
+                                 "mightn'tve": "mightn't've", "mightve": "might've", "mustnt": "mustn't",
+                                 "mustve": "must've", "neednt": "needn't", "notve": "not've", "oclock": "o'clock",
+                                 "oughtnt": "oughtn't", "ow's'at": "'ow's'at", "'ows'at": "'ow's'at",
+                                 "'ow'sat": "'ow's'at", "shant": "shan't", "shed've": "she'd've", "she'dve": "she'd've",
+                                 "she's": "she's", "shouldve": "should've", "shouldnt": "shouldn't",
+                                 "shouldnt've": "shouldn't've", "shouldn'tve": "shouldn't've",
+                                 "somebody'd": "somebodyd", "somebodyd've": "somebody'd've",
+                                 "somebody'dve": "somebody'd've", "somebodyll": "somebody'll",
+                                 "somebodys": "somebody's", "someoned": "someone'd", "someoned've": "someone'd've",
+                                 "someone'dve": "someone'd've", "someonell": "someone'll", "someones": "someone's",
+                                 "somethingd": "something'd", "somethingd've": "something'd've",
+                                 "something'dve": "something'd've", "somethingll": "something'll", "thats": "that's",
+                                 "thered": "there'd", "thered've": "there'd've", "there'dve": "there'd've",
+                                 "therere": "there're", "theres": "there's", "theyd": "they'd", "theyd've": "they'd've",
+                                 "they'dve": "they'd've", "theyll": "they'll", "theyre": "they're", "theyve": "they've",
+                                 "twas": "'twas", "wasnt": "wasn't", "wed've": "we'd've", "we'dve": "we'd've",
+                                 "weve": "we've", "werent": "weren't", "whatll": "what'll", "whatre": "what're",
+                                 "whats": "what's", "whatve": "what've", "whens": "when's", "whered": "where'd",
+                                 "wheres": "where's", "whereve": "where've", "whod": "who'd", "whod've": "who'd've",
+                                 "who'dve": "who'd've", "wholl": "who'll", "whos": "who's", "whove": "who've",
+                                 "whyll": "why'll", "whyre": "why're", "whys": "why's", "wont": "won't",
+                                 "wouldve": "would've", "wouldnt": "wouldn't", "wouldnt've": "wouldn't've",
+                                 "wouldn'tve": "wouldn't've", "yall": "y'all", "yall'll": "y'all'll",
+                                 "y'allll": "y'all'll", "yall'd've": "y'all'd've", "y'alld've": "y'all'd've",
+                                 "y'all'dve": "y'all'd've", "youd": "you'd", "youd've": "you'd've",
+                                 "you'dve": "you'd've", "youll": "you'll", "youre": "you're", "youve": "you've"})
+MANUAL_MAP = MappingProxyType({'none': '0', 'zero': '0', 'one': '1', 'two': '2', 'three': '3', 'four': '4',
+                               'five': '5', 'six': '6', 'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10'})
+ARTICLES = frozenset(['a', 'an', 'the'])
+PUNCTUATION = (';', r"/", '[', ']', '"', '{', '}',
+               '(', ')', '=', '+', '\\', '_', '-',
+               '>', '<', '@', '`', ',', '?', '!')
+
+PERIOD_STRIP = re.compile(r"(?!<=\d)(\.)(?!\d)")
+COMMA_STRIP = re.compile(r"(\d)(,)(\d)")
+# The maximal number of periods that are stripped (the original evaluation passed re.UNICODE as the count)
+PERIOD_STRIP_COUNT = re.UNICODE
+
+
+class TextNormalizer(object):
+    """
+    Normalizes answers for strict accuracy, with the exact output of the original VQA evaluation rules:
+    punctuation is removed (or replaced by a space), numbers are converted to digits, articles are removed and
+    contractions are fixed.
+    Punctuation is handled by translation tables, and normalized strings are memoized.
+    """
+    _CLEAN_SPACES_TABLE = str.maketrans({'\n': ' ', '\t': ' '})
+    _SPACE_TABLE = str.maketrans({p: ' ' for p in PUNCTUATION})
+    _REMOVE_TABLE = str.maketrans({p: None for p in PUNCTUATION})
+    # A punctuation mark next to a space is removed, rather than replaced by a space
+    _SPACED_PUNCTUATION = re.compile('[{0}](?= )|(?<= )[{0}]'.format(re.escape(''.join(PUNCTUATION))))
+
+    def __init__(self, max_memo_size: int = 1000000):
+        """
+        :param max_memo_size: the maximal number of memoized strings (and, separately, words).
+                              When exceeded, the memo is cleared
+        """
+        super().__init__()
+        self.max_memo_size = max_memo_size
+        self._memo = {}
+        self._words = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(max_memo_size={self.max_memo_size})'
+
+    def __len__(self):
+        return len(self._memo)
+
+    def clean_prediction_spaces(self, prediction: str) -> str:
+        return prediction.translate(self._CLEAN_SPACES_TABLE).strip()
+
+    def normalize(self, text: str) -> str:
+        normalized = self._memo.get(text)
+        if normalized is None:
+            normalized = self.process_digit_article(self.process_punctuation(text))
+            if len(self._memo) >= self.max_memo_size:
+                self._memo.clear()
+            self._memo[text] = normalized
+        return normalized
+
+    def normalize_prediction(self, prediction: str) -> str:
+        return self.normalize(self.clean_prediction_spaces(prediction))
+
+    def process_punctuation(self, text: str) -> str:
+        if COMMA_STRIP.search(text) is not None:
+            table = self._REMOVE_TABLE
+        else:
+            spaced = set(self._SPACED_PUNCTUATION.findall(text))
+            if spaced:
+                table = dict(self._SPACE_TABLE)
+                table.update({ord(p): None for p in spaced})
+            else:
+                table = self._SPACE_TABLE
+        out_text = text.translate(table)
+        return PERIOD_STRIP.sub('', out_text, PERIOD_STRIP_COUNT)
+
+    def process_digit_article(self, text: str) -> str:
+        words = self._words
+        out_words = []
+        for word in text.lower().split():
+            out_word = words.get(word)
+            if out_word is None:
+                out_word = self._get_word(word)
+                if len(words) >= self.max_memo_size:
+                    words.clear()
+                words[word] = out_word
+            if out_word:
+                out_words.append(out_word)
+        return ' '.join(out_words)
+
+    @staticmethod
+    def _get_word(word: str) -> str:
+        """The normalized word, or an empty string for an article"""
+        word = MANUAL_MAP.get(word, word)
+        if word in ARTICLES:
+            return ''
+        return CONTRACTIONS.get(word, word)
+
+    def normalize_series(self, texts: pd.Series, is_prediction: bool = False) -> pd.Series:
+        """
+        Normalizes a column. Spaces are cleaned by vectorized string methods, and each distinct string is normalized once
+        :param texts: the texts to normalize
+        :param is_prediction: if True, newlines and tabs are replaced and the texts are stripped first
+        :return: the normalized texts, indexed like texts
+        """
+        texts = pd.Series(texts, dtype=object)
+        # Missing values are coded as -1 by factorize. They can not be normalized (and must not match anything)
+        missing = texts.isnull()
+        if missing.any():
+            raise InvalidArgumentException(argument_name='texts', argument=list(texts.index[missing][:5]),
+                                           message=f'Got {int(missing.sum())} missing values to normalize')
+        if is_prediction:
+            texts = texts.str.translate(self._CLEAN_SPACES_TABLE).str.strip()
+        codes, uniques = pd.factorize(texts)
+        normalized = pd.Series([self.normalize(text) for text in uniques], dtype=object)
+        return pd.Series(normalized.values[codes], index=texts.index, dtype=object)
+
+
+_text_normalizer = None
+
+
+def get_text_normalizer() -> TextNormalizer:
+    """Gets the process wide text normalizer, so the memo is shared by all evaluations"""
+    global _text_normalizer
+    if _text_normalizer is None:
+        _text_normalizer = TextNormalizer()
+    return _text_normalizer
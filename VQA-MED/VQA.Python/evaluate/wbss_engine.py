@@ -0,0 +1,220 @@
+import time
+import logging
+import argparse
+
+import numpy as np
+
+from evaluate.wordnet_similarity import wup_measure
+
+logger = logging.getLogger(__name__)
+
+
+class WbssEngine(object):
+    """
+    Computes WBSS for many (ground truth, prediction) pairs at once.
+    Words are indexed in a vocabulary, and the WUP similarity of 2 words is computed only when a scored pair needs it
+    (i.e. both words appear in its ground truth or prediction). Computed similarities are kept sorted by their word pair,
+    so scoring a chunk of pairs is a vectorized lookup followed by max reductions and a cosine similarity,
+    exactly as WbssEvaluator._calculateWBSS does per pair.
+    """
+
+    def __init__(self, word_similarity: callable = None, max_chunk_size: int = 4096):
+        """
+        :param word_similarity: a symmetric similarity of 2 words. Defaults to wordnet_similarity.wup_measure
+        :param max_chunk_size: the maximal number of pairs reduced together
+        """
+        super().__init__()
+        self.word_similarity = word_similarity or wup_measure
+        self.max_chunk_size = max_chunk_size
+
+        self._words = []
+        self._index_by_word = {}
+        self._pair_keys = np.empty(0, dtype=np.int64)
+        self._pair_similarities = np.empty(0)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(word_similarity={self.word_similarity}, ' \
+            f'max_chunk_size={self.max_chunk_size})'
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._words)
+
+    @property
+    def pair_count(self) -> int:
+        """The number of word pairs whose similarity was computed"""
+        return len(self._pair_keys)
+
+    def add_sentences(self, sentences: iter) -> None:
+        """Adds the words of the sentences to the vocabulary (their similarities are computed when needed)"""
+        new_words = {w for s in sentences if isinstance(s, str) for w in s.split()} - self._index_by_word.keys()
+        if not new_words:
+            return
+
+        old_size = len(self._words)
+        for word in sorted(new_words):
+            self._index_by_word[word] = len(self._words)
+            self._words.append(word)
+        logger.debug(f'WBSS vocabulary: {old_size} -> {len(self._words)} words')
+
+    @staticmethod
+    def _get_pair_keys(indexes1: np.ndarray, indexes2: np.ndarray) -> np.ndarray:
+        # Similarity is symmetric, so (i, j) and (j, i) share a key
+        indexes1 = np.asarray(indexes1, dtype=np.int64)
+        indexes2 = np.asarray(indexes2, dtype=np.int64)
+        return (np.maximum(indexes1, indexes2) << 32) | np.minimum(indexes1, indexes2)
+
+    def get_similarities(self, indexes1: np.ndarray, indexes2: np.ndarray) -> np.ndarray:
+        """
+        Gets the similarities of the words at indexes1 to the words at indexes2 (element wise),
+        computing the ones that were not computed yet
+        """
+        keys = self._get_pair_keys(indexes1, indexes2)
+        positions = np.searchsorted(self._pair_keys, keys)
+        is_known = positions < len(self._pair_keys)
+        is_known[is_known] = self._pair_keys[positions[is_known]] == keys[is_known]
+        if not is_known.all():
+            self._add_pairs(np.unique(keys[~is_known]))
+            positions = np.searchsorted(self._pair_keys, keys)
+        return self._pair_similarities[positions]
+
+    def _add_pairs(self, keys: np.ndarray) -> None:
+        words = self._words
+        similarities = np.empty(len(keys))
+        for i, (high, low) in enumerate(zip((keys >> 32).tolist(), (keys & 0xFFFFFFFF).tolist())):
+            similarities[i] = 1.0 if high == low else self.word_similarity(words[high], words[low])
+
+        keys = np.concatenate([self._pair_keys, keys])
+        order = np.argsort(keys, kind='mergesort')
+        self._pair_keys = keys[order]
+        self._pair_similarities = np.concatenate([self._pair_similarities, similarities])[order]
+
+    def score_pairs(self, ground_truth: iter, predictions: iter) -> np.ndarray:
+        """
+        Gets the WBSS score of each (ground truth, prediction) pair, with the rules of WbssEvaluator._compute_wbss:
+        identical answers score 1 and empty predictions score 0
+        :return: a float64 array with a score per pair
+        """
+        ground_truth = list(ground_truth)
+        predictions = list(predictions)
+        assert len(ground_truth) == len(predictions), 'Expected ground truth and predictions to be of same length'
+
+        scores = np.zeros(len(ground_truth))
+        to_calculate = []
+        for i, (ans1, ans2) in enumerate(zip(ground_truth, predictions)):
+            if ans1 == ans2:
+                scores[i] = 1.0
+            elif ans2 is None or ans1 is None or ans2.strip() == "":
+                scores[i] = 0.0
+            else:
+                to_calculate.append(i)
+
+        if to_calculate:
+            self.add_sentences(ground_truth[i] for i in to_calculate)
+            self.add_sentences(predictions[i] for i in to_calculate)
+            for start in range(0, len(to_calculate), self.max_chunk_size):
+                idxs = to_calculate[start:start + self.max_chunk_size]
+                scores[idxs] = self._calculate_wbss([ground_truth[i] for i in idxs], [predictions[i] for i in idxs])
+        return scores
+
+    def score(self, ground_truth: iter, predictions: iter) -> float:
+        """The mean WBSS score"""
+        scores = self.score_pairs(ground_truth, predictions)
+        # Summing in order, like the per pair evaluation does
+        return sum(scores.tolist()) / float(len(scores))
+
+    def _to_padded_indexes(self, index_lists: list) -> (np.ndarray, np.ndarray):
+        length = max(1, max(len(idxs) for idxs in index_lists))
+        indexes = np.zeros((len(index_lists), length), dtype=np.int64)
+        mask = np.zeros((len(index_lists), length), dtype=bool)
+        for i, idxs in enumerate(index_lists):
+            indexes[i, :len(idxs)] = idxs
+            mask[i, :len(idxs)] = True
+        return indexes, mask
+
+    def _calculate_wbss(self, sentences1: list, sentences2: list) -> np.ndarray:
+        index_by_word = self._index_by_word
+        words1 = [[index_by_word[w] for w in s.split()] for s in sentences1]
+        words2 = [[index_by_word[w] for w in s.split()] for s in sentences2]
+        # The dictionary of a pair is its distinct words
+        dictionaries = [sorted(set(w1) | set(w2)) for w1, w2 in zip(words1, words2)]
+
+        dictionary, dictionary_mask = self._to_padded_indexes(dictionaries)
+        vectors = []
+        for words in (words1, words2):
+            indexes, mask = self._to_padded_indexes(words)
+            # For each dictionary word, the similarity to its most similar word in the sentence.
+            # Padding is left out of the lookup, so no similarity is computed for it
+            dictionary_words, sentence_words = np.broadcast_arrays(dictionary[:, :, np.newaxis],
+                                                                   indexes[:, np.newaxis, :])
+            is_valid = dictionary_mask[:, :, np.newaxis] & mask[:, np.newaxis, :]
+            similarities = np.zeros(is_valid.shape)
+            similarities[is_valid] = self.get_similarities(dictionary_words[is_valid], sentence_words[is_valid])
+            vectors.append(similarities.max(axis=2) * dictionary_mask)
+
+        vector1, vector2 = vectors
+        uv = (vector1 * vector2).sum(axis=1)
+        uu = (vector1 * vector1).sum(axis=1)
+        vv = (vector2 * vector2).sum(axis=1)
+        # Same as 1 - scipy.spatial.distance.cosine (including NaN for an all zeros vector)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = np.clip(1.0 - uv / np.sqrt(uu * vv), 0.0, 2.0)
+        return 1 - distances
+
+
+_wbss_engine = None
+
+
+def get_wbss_engine() -> WbssEngine:
+    """Gets the process wide WBSS engine, so its vocabulary is shared by all evaluations"""
+    global _wbss_engine
+    if _wbss_engine is None:
+        _wbss_engine = WbssEngine()
+    return _wbss_engine
+
+
+def benchmark(ground_truth: iter, predictions: iter, engine: WbssEngine = None) -> dict:
+    """
+    Compares the per pair WbssEvaluator to the engine.
+    The engine runs first, so word similarities are computed by it (the per pair evaluation gets them from cache)
+    :return: the run time and score of each
+    """
+    from evaluate.WbssEvaluator import WbssEvaluator
+    ground_truth = list(ground_truth)
+    predictions = list(predictions)
+    engine = engine or WbssEngine()
+
+    start = time.perf_counter()
+    engine_score = engine.score(ground_truth, predictions)
+    engine_seconds = time.perf_counter() - start
+
+    evaluator = WbssEvaluator(predictions=predictions, ground_truth=ground_truth)
+    start = time.perf_counter()
+    per_pair_score = evaluator._compute_wbss_per_pair(evaluator.predictions, evaluator.ground_truth)
+    per_pair_seconds = time.perf_counter() - start
+
+    return {'pairs': len(ground_truth),
+            'engine_seconds': engine_seconds,
+            'per_pair_seconds': per_pair_seconds,
+            'engine_score': engine_score,
+            'per_pair_score': per_pair_score}
+
+
+def main():
+    import pandas as pd
+    parser = argparse.ArgumentParser(description='Benchmarks the WBSS engine against the per pair WBSS evaluator')
+    parser.add_argument('-p', dest='predictions_path', help='a predictions hdf (with prediction and answer columns)',
+                        default='C:\\Users\\Public\\Documents\\Data\\2019\\submissions\\'
+                                '20190421_1436_41_answers_predictions\\predictions.hdf')
+    parser.add_argument('-k', dest='key', help='the key of the predictions in the hdf', default='validation')
+    args = parser.parse_args()
+
+    with pd.HDFStore(args.predictions_path) as store:
+        df_predictions = store[args.key]
+
+    results = benchmark(ground_truth=df_predictions.answer.values, predictions=df_predictions.prediction.values)
+    print(results)
+
+
+if __name__ == '__main__':
+    main()
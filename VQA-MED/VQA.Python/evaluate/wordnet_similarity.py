@@ -0,0 +1,213 @@
+import atexit
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+class WordSimilarityCache(object):
+    """
+    A symmetric, size bounded LRU cache of word pair similarities.
+    Optionally, similarities are also persisted to a sqlite file, so they are shared across runs.
+    """
+
+    def __init__(self, max_pairs: int, db_location: str = None, flush_every: int = 10000):
+        """
+        :param max_pairs: the maximal number of pairs kept in memory
+        :param db_location: a sqlite file for the persistent tier. If None, similarities are kept in memory only
+        :param flush_every: the number of new similarities to collect before writing them to the persistent tier
+        """
+        super().__init__()
+        self.max_pairs = max_pairs
+        self.db_location = Path(str(db_location)) if db_location else None
+        self.flush_every = flush_every
+
+        self._items = OrderedDict()
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._connection = None
+
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(max_pairs={self.max_pairs}, db_location={self.db_location}, ' \
+            f'flush_every={self.flush_every})'
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def stats(self) -> dict:
+        return {'hits': self.hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'items': len(self._items)}
+
+    @staticmethod
+    def get_key(word1: str, word2: str) -> tuple:
+        # Similarity is symmetric, so (a, b) and (b, a) share an entry
+        return (word1, word2) if word1 <= word2 else (word2, word1)
+
+    def get(self, word1: str, word2: str):
+        """
+        :return: The cached similarity of the words, or None if it was not cached
+        """
+        key = self.get_key(word1, word2)
+        with self._lock:
+            similarity = self._items.get(key)
+            if similarity is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return similarity
+
+            similarity = self._get_from_db(key)
+            if similarity is not None:
+                self.db_hits += 1
+                self._put(key, similarity)
+                return similarity
+
+            self.misses += 1
+            return None
+
+    def put(self, word1: str, word2: str, similarity: float) -> None:
+        key = self.get_key(word1, word2)
+        with self._lock:
+            self._put(key, similarity)
+            if self.db_location is not None:
+                self._pending[key] = similarity
+                if len(self._pending) >= self.flush_every:
+                    self.flush()
+
+    def get_or_compute(self, word1: str, word2: str, compute_similarity: callable) -> float:
+        """
+        Gets the similarity from cache, or computes it using compute_similarity(word1, word2) on a miss
+        """
+        similarity = self.get(word1, word2)
+        if similarity is None:
+            similarity = compute_similarity(word1, word2)
+            self.put(word1, word2, similarity)
+        return similarity
+
+    def flush(self) -> None:
+        """Writes the new similarities to the persistent tier"""
+        with self._lock:
+            if not self._pending:
+                return
+            connection = self._get_connection()
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO similarity VALUES (?, ?, ?)',
+                                       [(a, b, s) for (a, b), s in self._pending.items()])
+            self._pending.clear()
+
+    def clear(self) -> None:
+        """Clears the in memory tier (the persistent tier is kept)"""
+        with self._lock:
+            self._items.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self.flush()
+            except Exception as ex:
+                logger.warning(f'Failed to persist word similarities: {ex}')
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _put(self, key: tuple, similarity: float) -> None:
+        self._items[key] = similarity
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_pairs:
+            self._items.popitem(last=False)
+
+    def _get_connection(self):
+        if self._connection is None:
+            self.db_location.parent.mkdir(parents=True, exist_ok=True)
+            # Several processes (e.g. distance matrix workers) may share the file
+            self._connection = sqlite3.connect(str(self.db_location), check_same_thread=False, timeout=60)
+            with self._connection:
+                self._connection.execute('CREATE TABLE IF NOT EXISTS similarity '
+                                         '(word1 TEXT, word2 TEXT, score REAL, PRIMARY KEY (word1, word2))')
+        return self._connection
+
+    def _get_from_db(self, key: tuple):
+        if self.db_location is None:
+            return None
+        similarity = self._pending.get(key)
+        if similarity is not None:
+            return similarity
+        if not self.db_location.exists():
+            return None
+        row = self._get_connection().execute('SELECT score FROM similarity WHERE word1 = ? AND word2 = ?',
+                                             key).fetchone()
+        return row[0] if row is not None else None
+
+
+@lru_cache(maxsize=100000)
+def get_synsets(word: str) -> tuple:
+    """Gets the noun synsets of a word, looked up once per process"""
+    from nltk.corpus import wordnet as wn
+    return tuple(wn.synsets(word, pos=wn.NOUN))
+
+
+def _compute_max_wup_similarity(a: str, b: str) -> float:
+    interp_a = get_synsets(a)
+    interp_b = get_synsets(b)
+    if not interp_a or not interp_b:
+        return 0.0
+
+    global_max = 0.0
+    for x in interp_a:
+        for y in interp_b:
+            local_score = x.wup_similarity(y)
+            if local_score is not None and local_score > global_max:
+                global_max = local_score
+    return global_max
+
+
+def max_wup_similarity(a: str, b: str) -> float:
+    """
+    Returns max_{x in interp(a)} max_{y in interp(b)} wup(x, y), where interp is the words noun synsets
+    """
+    if a == b:
+        return 1.0
+    return get_similarity_cache().get_or_compute(a, b, _compute_max_wup_similarity)
+
+
+def wup_measure(a: str, b: str, similarity_threshold: float = 0.925) -> float:
+    """
+    Returns the Wu-Palmer similarity score of 2 words.
+    We use the semantic fields and therefore we downweight, unless the score is high which indicates both are synonyms
+    """
+    if a == b:
+        return 1.0
+    global_max = max_wup_similarity(a, b)
+    interp_weight = 0.1 if global_max < similarity_threshold else 1.0
+    return global_max * interp_weight
+
+
+_similarity_cache = None
+
+
+def get_similarity_cache() -> WordSimilarityCache:
+    """
+    Gets the process wide similarity cache, so all evaluations (and clustering) share it.
+    Similarities are persisted only if common.settings.word_similarity_db_location is set
+    """
+    global _similarity_cache
+    if _similarity_cache is None:
+        from common.settings import word_similarity_db_location
+        _similarity_cache = WordSimilarityCache(max_pairs=2000000, db_location=word_similarity_db_location)
+        atexit.register(_similarity_cache.close)
+    return _similarity_cache
+
+
+def set_similarity_cache(cache: WordSimilarityCache) -> None:
+    """Replaces the process wide similarity cache (e.g. for keeping similarities in memory only)"""
+    global _similarity_cache
+    _similarity_cache = cache
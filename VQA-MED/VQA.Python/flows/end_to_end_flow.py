@@ -20,7 +20,7 @@ logger = logging.getLogger(__name__)
 
 def _post_training_prediction(model_folder):
     from classes.vqa_model_predictor import DefaultVqaModelPredictor
-    from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
+    from evaluate.grouped_evaluation import evaluate_by_group
 
     model_dal = DAL.get_model(lambda dal: Path(dal.model_location).parent == model_folder.folder)
     model_id = model_dal.id
@@ -52,9 +52,11 @@ def _post_training_prediction(model_folder):
         df_output['image_id'] = df_output.path.apply(lambda p: p.rsplit(os.sep)[-1].rsplit('.', 1)[0])
         df_output['prediction'] = curr_predictions
 
-        columns_to_remove = ['path', 'answer_embedding', 'question_embedding', 'group', 'diagnosis', 'processed_answer']
+        columns_to_remove = ['path', 'answer_embedding', 'question_embedding', 'group', 'diagnosis', 'processed_answer',
+                             'answer_embedding_idx', 'question_embedding_idx']
         for col in columns_to_remove:
-            del df_output[col]
+            if col in df_output.columns:
+                del df_output[col]
 
         sort_columns = sorted(df_output.columns, key=lambda c: c not in ['question', 'prediction', 'answer'])
         df_output = df_output[sort_columns]
@@ -75,21 +77,8 @@ def _post_training_prediction(model_folder):
     res = get_str(df_output_test) if df_output_test is not None else 'NO DATA IN TEST'
     res_val = get_str(df_output_validation)
 
-    # Get evaluation per category:
-    evaluations = {}
-    pbar = tqdm(df_output_validation.groupby('question_category'))
-
-    for question_category, df in pbar:
-        pbar.set_description(f'evaluating {len(df)} for {question_category} items')
-        curr_predictions = df.prediction.values
-        curr_ground_truth = df.answer.values
-        curr_evaluations = VqaMedEvaluatorBase.get_all_evaluation(predictions=curr_predictions,
-                                                                  ground_truth=curr_ground_truth)
-        evaluations[question_category] = curr_evaluations
-
-    total_evaluations = VqaMedEvaluatorBase.get_all_evaluation(predictions=df_output_validation.prediction.values,
-                                                               ground_truth=df_output_validation.answer.values)
-    evaluations['Total'] = total_evaluations
+    # Get evaluation per category (and in total), scoring each row once:
+    evaluations, df_validation_scores = evaluate_by_group(df_output_validation, group_column='question_category')
 
     df_evaluations = pd.DataFrame(evaluations).T  # .sort_values(by=('bleu'))
     df_evaluations['sort'] = df_evaluations.index == 'Total'
@@ -146,6 +135,8 @@ def _post_training_prediction(model_folder):
     with pd.HDFStore(str(submission_folder / 'predictions.hdf')) as store:
         for name, df_predictions in predictions.items():
             store[name] = df_predictions
+        # Per row scores, for error analysis
+        store['validation_scores'] = df_output_validation.join(df_validation_scores)
 
     logger.debug(f'For model {model_id}, Got results of\n{evaluations}')
     evaluations_types = {'wbss': 1, 'bleu': 2, 'strict_accuracy': 3}
@@ -259,7 +250,9 @@ def _train_model(activation, prediction_vector_name, epochs, loss_function, lstm
                  augmentations=20,
                  notes_suffix='',
                  folder_suffix='',
-                 use_class_weight=False):
+                 use_class_weight=False,
+                 use_bottleneck_features=False,
+                 in_memory_augmentations=False):
     # Doing all of this here in order to not import tensor flow for other functions
     from classes.vqa_model_trainer import VqaModelTrainer
     from classes.vqa_model_builder import VqaModelBuilder
@@ -275,9 +268,11 @@ def _train_model(activation, prediction_vector_name, epochs, loss_function, lstm
                          optimizer=optimizer,
                          lstm_units=lstm_units,
                          prediction_vector_name=prediction_vector_name,
-                         question_category=question_category)
+                         question_category=question_category,
+                         use_bottleneck_features=use_bottleneck_features)
     model = mb.get_vqa_model()
-    model_folder = VqaModelBuilder.save_model(model, prediction_vector_name, question_category, folder_suffix)
+    model_folder = VqaModelBuilder.save_model(model, prediction_vector_name, question_category, folder_suffix,
+                                              use_bottleneck_features=use_bottleneck_features)
     # Train ------------------------------------------------------------------------
 
     keras_backend.clear_session()
@@ -288,7 +283,8 @@ def _train_model(activation, prediction_vector_name, epochs, loss_function, lstm
                          data_access=data_access,
                          epochs=epochs,
                          question_category=question_category,
-                         use_class_weight=use_class_weight)
+                         use_class_weight=use_class_weight,
+                         in_memory_augmentations=in_memory_augmentations)
     history = mt.train()
     # Train ------------------------------------------------------------------------
     with VerboseTimer("Saving trained Model"):
@@ -302,6 +298,8 @@ def _train_model(activation, prediction_vector_name, epochs, loss_function, lstm
             f'epochs: {epochs}\n' \
             f'class weights: {use_class_weight}\n' \
             f'Inputs Attention: {use_text_inputs_attention}\n' \
+            f'Bottleneck features: {use_bottleneck_features}\n' \
+            f'In memory augmentations: {in_memory_augmentations}\n' \
             f'{notes_suffix}'
 
         trained_suffix = f'{folder_suffix}_trained'
@@ -0,0 +1,286 @@
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+import numpy as np
+import pandas as pd
+
+from common.exceptions import InvalidArgumentException
+from common.utils import VerboseTimer
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ['image_name', 'question', 'prediction', 'probabilities']
+
+
+class PredictionService(object):
+    """
+    Keeps the VQA models, the NLP engine and the question classifiers loaded,
+    and answers requests in micro batches.
+    All the heavy lifting (loading and predicting) is done on a single worker thread,
+    so the keras models are only used from the thread that loaded them.
+    """
+
+    def __init__(self, model=None, specialized_classifiers: dict = None,
+                 max_batch_size: int = 32, max_wait_ms: float = 5, latency_window: int = 10000):
+        """
+        :param model: the main model to predict with (see VqaModelPredictor.get_model)
+        :param specialized_classifiers: a specialized model per question category
+        :param max_batch_size: the maximal number of requests predicted together
+        :param max_wait_ms: how long to wait for more requests to join a batch
+        :param latency_window: the number of latest requests to compute latency percentiles over
+        """
+        super().__init__()
+        self.model = model
+        self.specialized_classifiers = specialized_classifiers
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._requests = queue.Queue()
+        self._latencies = deque(maxlen=latency_window)
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        self._batch_count = 0
+
+        self._predictor = None
+        self._worker = None
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._load_error = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(model={self.model}, specialized_classifiers={self.specialized_classifiers}, ' \
+            f'max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms})'
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            latencies = np.array(self._latencies) * 1000
+            request_count, batch_count = self._request_count, self._batch_count
+        has_latencies = len(latencies) > 0
+        return {'requests': request_count,
+                'batches': batch_count,
+                'mean_batch_size': request_count / batch_count if batch_count else 0,
+                'p50_ms': float(np.percentile(latencies, 50)) if has_latencies else None,
+                'p99_ms': float(np.percentile(latencies, 99)) if has_latencies else None}
+
+    def start(self) -> None:
+        """Starts the worker, and blocks until all models are loaded"""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name='prediction_worker', daemon=True)
+        self._worker.start()
+        self._ready.wait()
+        if self._load_error is not None:
+            raise self._load_error
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def submit(self, question: str, image_path: str) -> Future:
+        """Queues a single request. The future's result is a dictionary of the prediction"""
+        if not question or not image_path:
+            raise InvalidArgumentException(argument_name='question / image_path',
+                                           message='Both a question and an image path are required')
+        future = Future()
+        self._requests.put((question, str(image_path), future, time.perf_counter()))
+        return future
+
+    def predict(self, requests: list, timeout: float = None) -> list:
+        """
+        :param requests: a list of dictionaries with 'question' and 'image_path'
+        :return: a prediction dictionary (or an 'error' dictionary) for each request
+        """
+        futures = []
+        for request in requests:
+            try:
+                if not isinstance(request, dict):
+                    raise InvalidArgumentException(argument_name='request', argument=request,
+                                                   message='Expected a request to be a dictionary')
+                future = self.submit(request.get('question'), request.get('image_path'))
+            except InvalidArgumentException as ex:
+                # A bad request gets its error, without failing the rest of the batch
+                future = Future()
+                future.set_exception(ex)
+            futures.append(future)
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=timeout))
+            except Exception as ex:
+                results.append({'error': str(ex)})
+        return results
+
+    def _load(self) -> None:
+        from classes.vqa_model_predictor import VqaModelPredictor
+        from pre_processing.prepare_data import warm_up
+
+        with VerboseTimer("Loading prediction service"):
+            self._predictor = VqaModelPredictor(self.model, specialized_classifiers=self.specialized_classifiers)
+            warm_up()
+
+    def _run(self) -> None:
+        try:
+            self._load()
+        except Exception as ex:
+            logger.exception('Failed to load prediction service')
+            self._load_error = ex
+            return
+        finally:
+            self._ready.set()
+
+        while not self._stopped.is_set():
+            try:
+                batch = [self._requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: list) -> None:
+        try:
+            results = self._predict_batch([(question, image_path) for question, image_path, _, _ in batch])
+        except Exception as ex:
+            if len(batch) > 1:
+                # Isolating the failing request(s)
+                for item in batch:
+                    self._process_batch([item])
+                return
+            logger.warning(f'Failed to predict:\n{ex}')
+            results = [ex]
+
+        done = time.perf_counter()
+        with self._stats_lock:
+            self._batch_count += 1
+            self._request_count += len(batch)
+            self._latencies.extend(done - submitted for _, _, _, submitted in batch)
+
+        for (_, _, future, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _predict_batch(self, items: list) -> list:
+        from pre_processing.prepare_data import preprocess_batch
+
+        df = pd.DataFrame({'question': [question for question, _ in items],
+                           'path': [image_path for _, image_path in items]})
+        pre_processed = preprocess_batch(df)
+        df_predictions = self._predictor.predict(pre_processed)
+
+        results = []
+        for _, row in df_predictions.sort_index().iterrows():
+            probabilities = row.probabilities
+            if isinstance(probabilities, np.ndarray):
+                probabilities = ', '.join(str(p) for p in probabilities)
+            result = {col: row[col] for col in RESULT_COLUMNS if col != 'probabilities'}
+            result['probabilities'] = probabilities
+            results.append(result)
+        return results
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _get_request_handler(service: PredictionService):
+    class PredictionRequestHandler(BaseHTTPRequestHandler):
+        """
+        GET /stats - the service statistics (including p50 / p99 latency)
+        POST /predict - {"question": ..., "image_path": ...} or {"requests": [{"question": ..., "image_path": ...}]}
+        """
+
+        def _send_json(self, obj, status=200):
+            body = json.dumps(obj).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self._send_json(service.stats)
+            else:
+                self._send_json({'error': f'Unknown path: {self.path}'}, status=404)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/predict':
+                self._send_json({'error': f'Unknown path: {self.path}'}, status=404)
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length).decode('utf-8'))
+            except Exception as ex:
+                self._send_json({'error': f'Failed to parse request: {ex}'}, status=400)
+                return
+
+            if not isinstance(request, dict):
+                self._send_json({'error': 'Expected the request to be a JSON object'}, status=400)
+                return
+            is_batch = 'requests' in request
+            if is_batch and not isinstance(request['requests'], list):
+                self._send_json({'error': 'Expected "requests" to be a list'}, status=400)
+                return
+
+            results = service.predict(request['requests'] if is_batch else [request])
+            self._send_json({'results': results} if is_batch else results[0])
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return PredictionRequestHandler
+
+
+def serve(service: PredictionService, host: str = '127.0.0.1', port: int = 8765) -> None:
+    service.start()
+    server = _ThreadingHTTPServer((host, port), _get_request_handler(service))
+    logger.info(f'Serving predictions at http://{host}:{port}/predict')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='A resident VQA prediction server')
+    parser.add_argument('-m', dest='model_id', help='the main model to predict with', type=int, default=None)
+    parser.add_argument('--host', dest='host', help='the host to listen on', default='127.0.0.1')
+    parser.add_argument('-p', '--port', dest='port', help='the port to listen on', type=int, default=8765)
+    parser.add_argument('-b', '--batch', dest='max_batch_size', help='maximal micro batch size', type=int, default=32)
+    parser.add_argument('-c', '--cpu', dest='cpu', help='forces usage of CPU', default=False, action='store_true')
+    args = parser.parse_args()
+
+    if args.cpu:
+        from parsers.temp_cs_glue import set_cpu
+        set_cpu()
+
+    service = PredictionService(model=args.model_id, max_batch_size=args.max_batch_size)
+    serve(service, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
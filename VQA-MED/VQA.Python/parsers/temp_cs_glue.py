@@ -4,10 +4,10 @@ from pathlib import Path
 
 from common.supress_print import supress_print
 import json
-from classes.vqa_model_predictor import DefaultVqaModelPredictor
+from classes.vqa_model_predictor import VqaModelPredictor
 
 default_model_id = 5
-model: DefaultVqaModelPredictor = None
+model: VqaModelPredictor = None
 
 def error_to_json(func):
     def wrapper(*args, **kw):
@@ -47,7 +47,8 @@ def set_model(model_id=default_model_id, cpu=True):
         set_cpu()
 
     try:
-        mp = DefaultVqaModelPredictor(model_id)
+        # No need for the test / validation sets that DefaultVqaModelPredictor loads
+        mp = VqaModelPredictor(model_id)
         model = mp
         success = True
     except:
@@ -60,25 +61,11 @@ def set_model(model_id=default_model_id, cpu=True):
 @error_to_json
 # @supress_print
 def predict(question, image_path):
-    import pandas as pd
-    from pre_processing.prepare_data import pre_process_raw_data
+    from pre_processing.prepare_data import preprocess_single
     if model is None:
         set_model()
 
-
-    #,get_highlited_function_code, get_image, get_size
-
-
-    data = {
-            'image_name': [Path(image_path).name],
-            'question':   [question],
-            'path':       [image_path],
-    }
-    df = pd.DataFrame(data)
-    pre_processed = pre_process_raw_data(df)
-    # df['question']
-    # df['path']
-    # df['image_name']
+    pre_processed = preprocess_single(question, image_path)
     ps = model.predict(pre_processed)
 
     cols_to_ommit = ['answer']
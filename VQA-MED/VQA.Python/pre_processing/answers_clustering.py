@@ -3,7 +3,6 @@ from typing import Type, Union
 import pandas as pd
 from sklearn.cluster import DBSCAN
 from sklearn.preprocessing import StandardScaler
-from tqdm import tqdm
 import numpy as np
 from collections import Counter
 from scipy.spatial.distance import pdist, squareform
@@ -17,6 +16,8 @@ from common.settings import data_access as data_access_api
 from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
 from evaluate.WbssEvaluator import WbssEvaluator
 from evaluate.BleuEvaluator import BleuEvaluator
+from pre_processing.distance_matrix import DistanceMatrixBuilder
+from pre_processing.approximate_clustering import cluster_approximately
 
 logger = logging.getLogger(__name__)
 
@@ -25,23 +26,47 @@ class SentenceClusterMaker(object):
     """"""
     evaluator_ctor: Type[VqaMedEvaluatorBase]
 
-    def __init__(self, sentences, min_count_for_cluster=5, cluster_eps=0.3, df_distances_pca_n_components=500):
-        """"""
+    def __init__(self, sentences, min_count_for_cluster=5, cluster_eps=0.3, df_distances_pca_n_components=500,
+                 workers=None, checkpoint_folder=None, approximate=False):
+        """
+        :param workers: the number of processes computing the distances matrix (see DistanceMatrixBuilder)
+        :param checkpoint_folder: a folder for checkpointing the distances matrix, so an interrupted run resumes
+        :param approximate: cluster on a sparse graph of candidate neighbors instead of a dense distances matrix
+                            (see approximate_clustering.cluster_approximately). cluster_eps is then the maximal
+                            distance (1 - score) of neighbors
+        """
         super().__init__()
         self.sentences = sentences
         self.min_count_for_cluster = min_count_for_cluster
         self.cluster_eps = cluster_eps
         self.df_distances_pca_n_components = df_distances_pca_n_components
+        self.workers = workers
+        self.checkpoint_folder = checkpoint_folder
+        self.approximate = approximate
+        self.distances_graph = None
         self.evaluator_ctor = BleuEvaluator  # WbssEvaluator
 
     def __repr__(self):
         return super().__repr__()
 
     def cluster(self, df_distances: Union[pd.DataFrame, str, Path] = None, plot=False):
-
+        """
+        :return: the clusters and the dense distances matrix.
+                 In approximate mode there is no dense matrix, so it is None
+                 (and the sparse distances graph is kept in self.distances_graph)
+        """
         save_root = Path('D:\\Users\\avitu\\Downloads\\')
+        if self.approximate:
+            # No dense distances matrix (nor its plot) in this mode
+            clusters, self.distances_graph = cluster_approximately(self.sentences, self.evaluator_ctor,
+                                                                   cluster_eps=self.cluster_eps,
+                                                                   min_count_for_cluster=self.min_count_for_cluster)
+            self._dump_clusters(clusters, save_root)
+            return clusters, None
+
         if df_distances is None:
-            df_distances = self._get_distances_matrix(self.sentences, self.evaluator_ctor)
+            df_distances = self._get_distances_matrix(self.sentences, self.evaluator_ctor,
+                                                      workers=self.workers, checkpoint_folder=self.checkpoint_folder)
 
             # p = str(save_root / 'distances.h5')
             # logger.info(f'Writing distances to:\n{p}')
@@ -53,11 +78,14 @@ class SentenceClusterMaker(object):
         logger.debug('Getting clusters')
         clusters = self.get_clusters(df_distances, plot)
 
+        self._dump_clusters(clusters, save_root)
+        return clusters, df_distances
+
+    @staticmethod
+    def _dump_clusters(clusters, save_root: Path) -> None:
         p2 = str(save_root / 'classes.pkl')
         File.dump_pickle(clusters, p2)
 
-        return clusters, df_distances
-
     @staticmethod
     def get_df_instances(df_distances: Union[pd.DataFrame, str, Path]):
         if isinstance(df_distances, (str, Path)):
@@ -288,37 +316,25 @@ class SentenceClusterMaker(object):
         return n_clusters_
 
     @staticmethod
-    def _get_distances_matrix(sentences: [str], evaluator_ctor: Type[VqaMedEvaluatorBase]) -> pd.DataFrame:
+    def _get_distances_matrix(sentences: [str], evaluator_ctor: Type[VqaMedEvaluatorBase],
+                              workers: int = None, checkpoint_folder: str = None) -> pd.DataFrame:
+        builder = DistanceMatrixBuilder(evaluator_ctor, workers=workers, checkpoint_folder=checkpoint_folder)
+        distances = builder.build(sentences)
         sentence_idxs = list(range(len(sentences)))
-        df_distances = pd.DataFrame(index=sentence_idxs, columns=sentence_idxs, dtype=float)
-        pbar_row = tqdm(sentence_idxs)
-        for row_idx in pbar_row:
-            answer = sentences[row_idx]
-            # pbar_col = tqdm(sentence_idxs)
-            for col_idx in sentence_idxs:
-                current_score = df_distances.loc[row_idx, col_idx]
-                if not np.isnan(current_score):
-                    continue
-
-                ground_truth_reference = sentences[col_idx]
-                evaluator = evaluator_ctor(predictions=[answer], ground_truth=[ground_truth_reference])
-                score = evaluator.evaluate()
-                df_distances.loc[row_idx, col_idx] = score
-                df_distances.loc[col_idx, row_idx] = score
-
-        return df_distances
+        return pd.DataFrame(distances, index=sentence_idxs, columns=sentence_idxs)
 
 
-def clustering_main():
+def clustering_main(question_category='Abnormality', approximate=False):
     meta = data_access_api.load_meta()
 
     df_answers = meta['answers']
-    df_answers = df_answers[df_answers.question_category == 'Abnormality']
+    if question_category is not None:
+        df_answers = df_answers[df_answers.question_category == question_category]
     sentences = df_answers.processed_answer.values
 
     # sentences = sentences[:50]
-    cluster_maker = SentenceClusterMaker(sentences)
-    clusters, distances = cluster_maker.cluster(plot=True)
+    cluster_maker = SentenceClusterMaker(sentences, approximate=approximate)
+    clusters, distances = cluster_maker.cluster(plot=not approximate)
 
     str()
 
@@ -0,0 +1,105 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+from common.utils import VerboseTimer
+from pre_processing.distance_matrix import score_pairs
+
+logger = logging.getLogger(__name__)
+
+
+def get_sentence_vectors(sentences: list, embedder=None) -> np.ndarray:
+    """
+    Gets a cheap vector per sentence: the mean of its token vectors (as embedded by TextEmbedder)
+    :param sentences: the sentences
+    :param embedder: a TextEmbedder. Defaults to the process wide one
+    :return: a (sentences, embedding_dim) float32 array
+    """
+    if embedder is None:
+        from pre_processing.text_embedding import get_text_embedder
+        embedder = get_text_embedder()
+
+    embeddings = embedder.embed(sentences).reshape(len(sentences), embedder.input_length, embedder.embedding_dim)
+    tokens_count = np.maximum(1, (np.abs(embeddings).sum(axis=2) > 0).sum(axis=1))
+    return embeddings.sum(axis=1) / tokens_count[:, np.newaxis]
+
+
+def get_candidate_pairs(vectors: np.ndarray, max_neighbors: int, vector_radius: float) -> (np.ndarray, np.ndarray):
+    """
+    Gets the pairs of sentences that are close enough to be compared, using a nearest neighbors index
+    :param vectors: a vector per sentence
+    :param max_neighbors: the maximal number of neighbors to consider per sentence
+    :param vector_radius: the maximal cosine distance of the vectors of a candidate pair
+    :return: the rows and the columns of the candidate pairs (row < column)
+    """
+    n_neighbors = min(max_neighbors + 1, len(vectors))
+    index = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine').fit(vectors)
+    distances, neighbors = index.kneighbors(vectors)
+
+    rows = np.repeat(np.arange(len(vectors)), n_neighbors)
+    cols = neighbors.ravel()
+    close = (distances.ravel() <= vector_radius) & (rows != cols)
+    rows, cols = rows[close], cols[close]
+
+    pairs = np.unique(np.stack([np.minimum(rows, cols), np.maximum(rows, cols)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def cluster_approximately(sentences: iter, evaluator_ctor, cluster_eps: float, min_count_for_cluster: int,
+                          max_neighbors: int = 30, vector_radius: float = 0.3,
+                          sentence_vectors: callable = None) -> (np.ndarray, sparse.csr_matrix):
+    """
+    Clusters sentences without a dense distances matrix:
+    1. Identical sentences are merged (and weighted by their count)
+    2. Candidate neighbors are found by the cosine distance of cheap sentence vectors
+    3. Only candidate pairs are scored by the evaluator, and their distance is 1 - score
+    4. DBSCAN runs on the resulting sparse distance graph
+    :param sentences: the sentences to cluster
+    :param evaluator_ctor: the evaluator that scores sentence pairs (e.g. BleuEvaluator)
+    :param cluster_eps: the maximal distance (1 - score) of neighbors in a cluster
+    :param min_count_for_cluster: the minimal number of sentences in a cluster
+    :param max_neighbors: the maximal number of candidate neighbors per distinct sentence
+    :param vector_radius: the maximal cosine distance of the vectors of candidate neighbors
+    :param sentence_vectors: gets a vector per sentence. Defaults to get_sentence_vectors
+    :return: the cluster of each sentence (-1 for noise), and the sparse distances of the distinct sentences
+    """
+    sentences = [str(s) for s in sentences]
+    sentence_codes, distinct = pd.factorize(pd.Series(sentences, dtype=object))
+    distinct = list(distinct)
+    counts = np.bincount(sentence_codes, minlength=len(distinct))
+    n = len(distinct)
+
+    rows = cols = np.zeros(0, dtype=np.int64)
+    scores = []
+    if n > 1:
+        with VerboseTimer(f'Getting candidate neighbors for {n} distinct sentences'):
+            vectors = (sentence_vectors or get_sentence_vectors)(distinct)
+            rows, cols = get_candidate_pairs(vectors, max_neighbors=max_neighbors, vector_radius=vector_radius)
+
+        with VerboseTimer(f'Scoring {len(rows)} candidate pairs'):
+            # As in the distances matrix: the row's sentence is the candidate, and the column's sentence is the reference
+            scores = score_pairs(evaluator_ctor,
+                                 references=[distinct[j] for j in cols],
+                                 candidates=[distinct[i] for i in rows])
+        logger.debug(f'Scored {len(rows)} of {n * (n - 1) // 2} pairs')
+
+    distances = 1 - np.asarray(scores, dtype=float)
+    close = ~np.isnan(distances) & (distances <= cluster_eps)
+    rows, cols, distances = rows[close], cols[close], distances[close]
+    # Explicitly stored zeros are kept, so identical scores still count as neighbors
+    graph = sparse.csr_matrix((np.concatenate([distances, distances]),
+                               (np.concatenate([rows, cols]), np.concatenate([cols, rows]))), shape=(n, n))
+
+    db = DBSCAN(eps=cluster_eps, min_samples=min_count_for_cluster, metric='precomputed')
+    db.fit(graph, sample_weight=counts)
+    distinct_clusters = db.labels_
+
+    clusters = distinct_clusters[sentence_codes]
+    n_clusters = len(set(distinct_clusters)) - (1 if -1 in distinct_clusters else 0)
+    logger.info(f'Estimated number of clusters: {n_clusters}')
+    logger.info(f'Estimated number of noise points: {int((clusters == -1).sum())}')
+    return clusters, graph
@@ -1,27 +1,124 @@
 import re
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 
+logger = logging.getLogger(__name__)
 
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
-    from pre_processing.known_find_and_replace_items import find_and_replace_collection
 
-    find_and_replace_data = find_and_replace_collection
+class TextCleaner(object):
+    """
+    Cleans texts by a collection of find and replace rules, compiled once.
+    The rules are applied one after another (a rule may act on the output of a previous one), so a single
+    combined alternation of all rules is only used for skipping texts that no rule matches.
+    Cleaned texts are cached, so cleaning cost scales with the number of distinct texts.
+    """
 
-    def replace_func(val: str) -> str:
-        if isinstance(val, str):
-            new_val = ' '.join(val.split()).strip().lower()
-            for tpl in find_and_replace_data:
-                pattern = re.compile(tpl.orig, re.IGNORECASE)
-                new_val = pattern.sub(repl=tpl.sub, string=new_val)
-        elif np.isnan(val):
-            new_val = ''
-        else:
-            new_val = val
+    def __init__(self, find_and_replace_data: iter, flags: int = re.IGNORECASE, max_cache_size: int = 1000000):
+        """
+        :param find_and_replace_data: the (orig, sub) rules, applied in order
+        :param flags: the regex flags of the rules
+        :param max_cache_size: the maximal number of cached texts. When exceeded, the cache is cleared
+        """
+        super().__init__()
+        find_and_replace_data = list(find_and_replace_data)
+        self.rules = [(re.compile(tpl.orig, flags), tpl.sub) for tpl in find_and_replace_data]
+        self.max_cache_size = max_cache_size
+        self._any_rule = self._compile_any_rule([tpl.orig for tpl in find_and_replace_data], flags)
+        self._cache = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rules={len(self.rules)}, max_cache_size={self.max_cache_size})'
+
+    def __len__(self):
+        return len(self._cache)
+
+    @staticmethod
+    def _compile_any_rule(patterns: list, flags: int):
+        # Back references are numbered by their position, so they would not survive the combination
+        if not patterns or any(re.search(r'\\\d|\(\?P=', p) for p in patterns):
+            return None
+        try:
+            return re.compile('|'.join(f'(?:{p})' for p in patterns), flags)
+        except re.error:
+            logger.warning('Failed to combine the find and replace rules. Every text will be checked by all rules')
+            return None
 
-        new_val.strip().lower()
+    def clean(self, val):
+        if not isinstance(val, str):
+            return '' if np.isnan(val) else val
+
+        new_val = self._cache.get(val)
+        if new_val is None:
+            new_val = self._clean_text(val)
+            if len(self._cache) >= self.max_cache_size:
+                self._cache.clear()
+            self._cache[val] = new_val
+        return new_val
+
+    def _clean_text(self, val: str) -> str:
+        new_val = ' '.join(val.split()).lower()
+        if self._any_rule is not None and self._any_rule.search(new_val) is None:
+            return new_val
+        for pattern, sub in self.rules:
+            new_val = pattern.sub(sub, new_val)
         return new_val
 
-    df['processed_question'] = df['question'].apply(replace_func)
-    df['processed_answer'] = df['answer'].apply(replace_func)
+    def clean_values(self, values: iter) -> list:
+        return [self.clean(val) for val in values]
+
+    def clean_series(self, values: iter, workers: int = 1, chunk_size: int = 10000) -> pd.Series:
+        """
+        Cleans a column, cleaning each distinct value once
+        :param values: the values to clean
+        :param workers: the number of processes for cleaning the distinct values. 1 cleans in process
+        :param chunk_size: the number of distinct values sent to a process at once
+        :return: the cleaned values (indexed like values, if it is a series)
+        """
+        values = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+        codes, uniques = pd.factorize(values)
+        uniques = list(uniques)
+
+        if workers > 1 and len(uniques) > chunk_size:
+            chunks = [uniques[start:start + chunk_size] for start in range(0, len(uniques), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                cleaned_chunks = list(executor.map(self.clean_values, chunks))
+            cleaned = [val for chunk in cleaned_chunks for val in chunk]
+            new_items = [(val, new_val) for val, new_val in zip(uniques, cleaned) if isinstance(val, str)]
+            if len(self._cache) + len(new_items) > self.max_cache_size:
+                self._cache.clear()
+            if len(new_items) <= self.max_cache_size:
+                self._cache.update(new_items)
+        else:
+            cleaned = self.clean_values(uniques)
+
+        # Missing values are coded as -1, and are cleaned to an empty string
+        cleaned = np.array(cleaned + [''], dtype=object)
+        return pd.Series(cleaned[codes], index=values.index, dtype=object)
+
+    def __getstate__(self):
+        # The cache is not sent to worker processes
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+
+_text_cleaner = None
+
+
+def get_text_cleaner() -> TextCleaner:
+    """Gets the process wide cleaner of the known find and replace rules"""
+    global _text_cleaner
+    if _text_cleaner is None:
+        from pre_processing.known_find_and_replace_items import find_and_replace_collection
+        _text_cleaner = TextCleaner(find_and_replace_collection)
+    return _text_cleaner
+
+
+def clean_data(df: pd.DataFrame, workers: int = 1) -> pd.DataFrame:
+    cleaner = get_text_cleaner()
+    df['processed_question'] = cleaner.clean_series(df['question'], workers=workers)
+    df['processed_answer'] = cleaner.clean_series(df['answer'], workers=workers)
     return df
@@ -1,10 +1,8 @@
 import logging
-import re
-from collections import Counter
 import pandas as pd
-import itertools
-from tqdm import tqdm
 from common.settings import validation_data, train_data
+from common.utils import VerboseTimer
+from pre_processing.keyword_tagging import KeywordTagger
 from pre_processing.known_find_and_replace_items import diagnosis
 
 logger = logging.getLogger(__name__)
@@ -53,58 +51,41 @@ def enrich_data(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def _add_columns_by_search(df, new_columns_name, indicator_words, search_columns):
-    df_hit_miss = pd.DataFrame(index=df.index, columns=indicator_words)
-
-    pbar = tqdm(indicator_words)
-    for word in pbar:
-        pbar.set_description(f'Looking for word: {word}')
-        c_pattern = re.compile(r'\b{0}\b'.format(word), re.I)
-        res = None
-        for col in search_columns:
-            # curr_res = df[col].apply(lambda s: has_word(word, s))
-            curr_res = df[col].str.contains(c_pattern)
-
-            if res is None:
-                res = curr_res
-            res = res | curr_res
-
-        df_hit_miss[word] = res
-        if not any(res):
+    tagger = KeywordTagger(indicator_words)
+    with VerboseTimer(f'Looking for {len(tagger.words)} words in {len(df)} rows'):
+        found_words = tagger.tag(df, search_columns)
+
+    all_found = set().union(*found_words) if len(found_words) else set()
+    for word in tagger.words:
+        if word not in all_found:
             logger.warning("\nfound no matching for '{0}'".format(word))
-        # if any(res):
-        #     df_hit_miss[word] = res
-        # else:
-        #     logger.warning("\nfound no matching for '{0}'".format(word))
-    df[new_columns_name] = df_hit_miss.apply(lambda row: ' '.join({col for col in df_hit_miss.columns if row[col]}), axis=1)
+    df[new_columns_name] = found_words.map(tagger.to_string)
 
 def _consolidate_image_devices(df):
-    image_names = df.image_name.drop_duplicates().values
-
-    pbar = tqdm(image_names)
+    """
+    Sets a single imaging device per image: the only device found for it, or its majority device.
+    Images without devices, or with a tie for the majority, get 'unknown'
+    """
     logger.info('consolidating image devices')
-    for image_name in pbar:
-        df_image = df[df.image_name == image_name]
-        image_imaging_device = list(itertools.chain.from_iterable([d.split() for d in df_image.imaging_device.values]))
-        consolidated = {d for d in image_imaging_device if d}
-
-        if len(consolidated) > 1:
-            #try majority
-            cntr = Counter(image_imaging_device)
-            (top1_val, top1_freq), (top2_val, top2_freq) = cntr.most_common(2)
-            if top1_freq > top2_freq:
-                consolidated = {top1_val}
-            else:
-                consolidated = {}
-
-        if len(consolidated) == 0:
-            consolidated = {'unknown'}
-
-        assert len(consolidated) == 1, \
-            f'got {len(consolidated)} non consolidated image devices. for example:\n{consolidated[:5]}'
-        devices_string = consolidated.pop()
-        df.loc[df.image_name == image_name, 'imaging_device'] = devices_string
-        # df[df.image_name == image_name].imaging_device = result
-        pbar.set_description(f'image device:\t{devices_string}'.ljust(25))
+    image_devices = [(image_name, device)
+                     for image_name, devices in zip(df.image_name.values, df.imaging_device.values)
+                     for device in devices.split()]
+    df_devices = pd.DataFrame(image_devices, columns=['image_name', 'imaging_device'])
+
+    if len(df_devices) > 0:
+        df_counts = df_devices.groupby(['image_name', 'imaging_device']).size().reset_index(name='count')
+        df_counts = df_counts.sort_values(['image_name', 'count'], ascending=[True, False])
+        rank = df_counts.groupby('image_name').cumcount()
+        df_top = df_counts[rank == 0].set_index('image_name')
+        second_count = df_counts[rank == 1].set_index('image_name')['count'].reindex(df_top.index).fillna(0)
+        # An image with a single device always has a majority
+        df_consolidated = df_top.loc[df_top['count'] > second_count, ['imaging_device']].reset_index()
+    else:
+        df_consolidated = pd.DataFrame(columns=['image_name', 'imaging_device'])
+
+    df_merged = df[['image_name']].merge(df_consolidated, on='image_name', how='left')
+    df['imaging_device'] = df_merged.imaging_device.fillna('unknown').values
+
     count_unknown = len(df[df.imaging_device == 'unknown'].image_name.drop_duplicates())
     if count_unknown:
         count_total = len(df.image_name.drop_duplicates())
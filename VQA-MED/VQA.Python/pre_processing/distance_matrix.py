@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm import tqdm
+
+from common.utils import VerboseTimer
+
+logger = logging.getLogger(__name__)
+
+
+def score_pairs(evaluator_ctor, references: list, candidates: list) -> np.ndarray:
+    """
+    Scores (reference, candidate) pairs, the same as evaluator_ctor(predictions=[candidate], ground_truth=[reference]).
+    BLEU and WBSS are scored by their engines, all pairs at once
+    """
+    from evaluate.BleuEvaluator import BleuEvaluator
+    from evaluate.WbssEvaluator import WbssEvaluator
+
+    if evaluator_ctor is BleuEvaluator:
+        from evaluate.bleu_engine import get_bleu_engine
+        engine = get_bleu_engine(remove_stopwords=BleuEvaluator.remove_stopwords,
+                                 stemming=BleuEvaluator.stemming,
+                                 case_sensitive=BleuEvaluator.case_sensitive)
+        return engine.score_pairs(references, candidates)
+    elif evaluator_ctor is WbssEvaluator:
+        from evaluate.wbss_engine import get_wbss_engine
+        return get_wbss_engine().score_pairs(references, candidates)
+
+    return np.array([evaluator_ctor(predictions=[candidate], ground_truth=[reference]).evaluate()
+                     for reference, candidate in zip(references, candidates)])
+
+
+def _compute_block(evaluator_ctor, rows: tuple, cols: tuple, row_sentences: list, col_sentences: list) -> np.ndarray:
+    """
+    Computes a block of the matrix. For a block on the diagonal, only its upper triangle is computed
+    :param rows: the (start, end) of the block's rows
+    :param cols: the (start, end) of the block's columns
+    :param row_sentences: the sentences of the block's rows
+    :param col_sentences: the sentences of the block's columns
+    :return: the (rows, cols) float32 block
+    """
+    row_idxs, col_idxs = np.meshgrid(np.arange(*rows), np.arange(*cols), indexing='ij')
+    upper = row_idxs <= col_idxs
+
+    block = np.zeros(upper.shape, dtype=np.float32)
+    block_rows, block_cols = np.nonzero(upper)
+    # As in the per pair matrix: the row's sentence is the candidate, and the column's sentence is the reference
+    block[upper] = score_pairs(evaluator_ctor,
+                               references=[col_sentences[j] for j in block_cols],
+                               candidates=[row_sentences[i] for i in block_rows])
+    return block
+
+
+class DistanceMatrixBuilder(object):
+    """
+    Builds the symmetric (sentences, sentences) matrix of pairwise evaluation scores.
+    Only the upper triangle is computed, in square blocks that are fanned out to a pool of processes.
+    When given a checkpoint folder, every finished block is saved, so an interrupted build resumes where it stopped.
+    """
+
+    def __init__(self, evaluator_ctor, block_size: int = 256, workers: int = None, checkpoint_folder: str = None):
+        """
+        :param evaluator_ctor: the evaluator to score pairs with (e.g. BleuEvaluator)
+        :param block_size: the number of rows (and columns) in a block
+        :param workers: the number of processes. If None, uses all CPUs. 1 (or a single block) computes in process
+        :param checkpoint_folder: a folder for saving finished blocks. If None, blocks are not saved
+        """
+        super().__init__()
+        self.evaluator_ctor = evaluator_ctor
+        self.block_size = block_size
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.checkpoint_folder = Path(str(checkpoint_folder)) if checkpoint_folder else None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(evaluator_ctor={self.evaluator_ctor.__name__}, ' \
+            f'block_size={self.block_size}, workers={self.workers}, checkpoint_folder={self.checkpoint_folder})'
+
+    def get_blocks(self, n: int) -> list:
+        """Gets the ((row start, row end), (column start, column end)) of the blocks in the upper triangle"""
+        bounds = [(start, min(start + self.block_size, n)) for start in range(0, n, self.block_size)]
+        return [(rows, cols) for i, rows in enumerate(bounds) for cols in bounds[i:]]
+
+    def _get_checkpoint_location(self, sentences: list) -> Path:
+        # Checkpoints are only valid for the same sentences, evaluator and blocks
+        fingerprint = hashlib.sha1(json.dumps([self.evaluator_ctor.__name__, self.block_size, list(sentences)])
+                                   .encode('utf-8')).hexdigest()[:16]
+        return self.checkpoint_folder / f'distances_{fingerprint}'
+
+    @staticmethod
+    def _get_block_path(location: Path, rows: tuple, cols: tuple) -> Path:
+        return location / f'block_{rows[0]}_{cols[0]}.npy'
+
+    def build(self, sentences: iter) -> np.ndarray:
+        """
+        :return: the (n, n) float32 matrix, where [i, j] is the score of sentence i as a prediction for sentence j
+        """
+        sentences = [str(s) for s in sentences]
+        n = len(sentences)
+        distances = np.zeros((n, n), dtype=np.float32)
+
+        location = None
+        if self.checkpoint_folder is not None:
+            location = self._get_checkpoint_location(sentences)
+            location.mkdir(parents=True, exist_ok=True)
+
+        pending = []
+        for rows, cols in self.get_blocks(n):
+            block_path = self._get_block_path(location, rows, cols) if location is not None else None
+            block = self._load_block(block_path, rows, cols) if block_path is not None else None
+            if block is not None:
+                self._set_block(distances, rows, cols, block)
+            else:
+                pending.append((rows, cols))
+
+        blocks_count = len(self.get_blocks(n))
+        if len(pending) < blocks_count:
+            logger.info(f'Resuming distances matrix: {blocks_count - len(pending)} of {blocks_count} blocks were done')
+
+        with VerboseTimer(f'Computing {len(pending)} blocks of a {n}x{n} distances matrix'):
+            for rows, cols, block in self._compute_blocks(sentences, pending):
+                if location is not None:
+                    self._save_block(self._get_block_path(location, rows, cols), block)
+                self._set_block(distances, rows, cols, block)
+        return distances
+
+    @staticmethod
+    def _save_block(block_path: Path, block: np.ndarray) -> None:
+        # Written to a temporary file first, so an interrupted write never leaves a truncated block behind
+        temp_path = block_path.with_name(f'{block_path.stem}.{os.getpid()}.tmp.npy')
+        np.save(str(temp_path), block)
+        os.replace(str(temp_path), str(block_path))
+
+    @staticmethod
+    def _load_block(block_path: Path, rows: tuple, cols: tuple):
+        """
+        :return: the saved block, or None if it was not saved (or can not be read, and should be computed again)
+        """
+        if not block_path.exists():
+            return None
+        try:
+            block = np.load(str(block_path))
+        except Exception as ex:
+            logger.warning(f'Failed to load the checkpoint "{block_path}", computing it again: {ex}')
+            return None
+        if block.shape != (rows[1] - rows[0], cols[1] - cols[0]):
+            logger.warning(f'The checkpoint "{block_path}" has an unexpected shape {block.shape}, computing it again')
+            return None
+        return block
+
+    def _compute_blocks(self, sentences: list, blocks: list):
+        def get_args(rows, cols):
+            return self.evaluator_ctor, rows, cols, sentences[slice(*rows)], sentences[slice(*cols)]
+
+        if self.workers <= 1 or len(blocks) <= 1:
+            for rows, cols in tqdm(blocks):
+                yield rows, cols, _compute_block(*get_args(rows, cols))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(_compute_block, *get_args(rows, cols)): (rows, cols) for rows, cols in blocks}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                rows, cols = futures[future]
+                yield rows, cols, future.result()
+
+    @staticmethod
+    def _set_block(distances: np.ndarray, rows: tuple, cols: tuple, block: np.ndarray) -> None:
+        if rows == cols:
+            # Only the upper triangle of a diagonal block was computed
+            block = np.where(np.triu(np.ones(block.shape, dtype=bool)), block, block.T)
+        distances[slice(*rows), slice(*cols)] = block
+        distances[slice(*cols), slice(*rows)] = block.T
@@ -0,0 +1,92 @@
+import re
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_WORD_END = ''
+
+
+def _get_trie_pattern(trie: dict) -> str:
+    """Gets a regex pattern that matches the words of a trie, preferring longer words"""
+    alternatives = [re.escape(char) + _get_trie_pattern(child)
+                    for char, child in sorted(trie.items()) if char != _WORD_END]
+    if not alternatives:
+        return ''
+    pattern = alternatives[0] if len(alternatives) == 1 else '(?:{0})'.format('|'.join(alternatives))
+    if _WORD_END in trie:
+        pattern = '(?:{0})?'.format(pattern)
+    return pattern
+
+
+class KeywordTagger(object):
+    """
+    Finds which words of a vocabulary appear in texts (as whole words, i.e. r'\\bword\\b'), scanning each text once.
+    The vocabulary is compiled into a single trie shaped regex inside a lookahead, so overlapping words
+    (e.g. 'b-cell' and 'cell') are all found. Results are cached per distinct text.
+    """
+
+    def __init__(self, words: iter, flags: int = re.IGNORECASE):
+        """
+        :param words: the vocabulary
+        :param flags: the regex flags. With re.IGNORECASE, words are matched regardless of case
+        """
+        super().__init__()
+        self.words = list(dict.fromkeys(words))
+        self.flags = flags
+        ignore_case = bool(flags & re.IGNORECASE)
+        self._get_key = str.lower if ignore_case else str
+        self._word_by_key = {}
+        for word in self.words:
+            self._word_by_key.setdefault(self._get_key(word), word)
+        self._order = {word: i for i, word in enumerate(self.words)}
+
+        trie = {}
+        for key in self._word_by_key:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[_WORD_END] = {}
+        self.pattern = re.compile(r'(?=\b({0})\b)'.format(_get_trie_pattern(trie)), flags) if trie else None
+
+        # At a given position, only the longest word is matched. Shorter words that are a prefix of it (and end on
+        # a word boundary within it) match there too
+        boundary = re.compile(r'\b', flags)
+        self._prefixes = {key: [other for other in self._word_by_key
+                                if len(other) < len(key) and key.startswith(other)
+                                and boundary.match(key, len(other)) is not None]
+                          for key in self._word_by_key}
+        self._cache = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(words={len(self.words)}, flags={self.flags})'
+
+    def find(self, text: str) -> set:
+        """Gets the vocabulary words found in text"""
+        if not isinstance(text, str) or self.pattern is None:
+            return set()
+
+        found = self._cache.get(text)
+        if found is None:
+            keys = set()
+            for match in self.pattern.finditer(text):
+                key = self._get_key(match.group(1))
+                keys.add(key)
+                keys.update(self._prefixes[key])
+            found = frozenset(self._word_by_key[key] for key in keys)
+            self._cache[text] = found
+        return found
+
+    def tag(self, df: pd.DataFrame, search_columns: iter) -> pd.Series:
+        """
+        Gets, per row, the vocabulary words found in any of the search columns
+        :return: a series of sets of words, indexed like df
+        """
+        found_by_column = [df[col].map(self.find) for col in search_columns]
+        return pd.Series([set().union(*row_found) for row_found in zip(*found_by_column)],
+                         index=df.index, dtype=object)
+
+    def to_string(self, words: iter) -> str:
+        """Joins words, in the order of the vocabulary"""
+        return ' '.join(sorted(words, key=self._order.__getitem__))
@@ -1,19 +1,20 @@
 import math
 import os
+import re
 import logging
-from collections import OrderedDict
 import string
 
 import numpy as np
-from functools import partial
+from functools import lru_cache
 from nltk.corpus import stopwords
-import dask.dataframe as dd
 
 
+from common.exceptions import InvalidArgumentException
 from common.os_utils import File
 from common.utils import VerboseTimer
 from common.settings import input_length, get_nlp, embedding_dim
-from common.constatns import questions_classifiers
+from common.constatns import questions_classifiers, abnormality_organ_model_folder
+from pre_processing.text_embedding import get_text_embedder
 import pandas as pd
 
 logger = logging.getLogger(__name__)
@@ -37,14 +38,6 @@ def pre_process_raw_data(df):
 
         # Getting text features. This is the heavy task...
         df = df.reset_index(drop=True)
-        def process_text(txt):
-            exclude = set(string.punctuation)
-            no_punctuation = ''.join(ch.lower() if ch not in exclude else ' ' for ch in txt)
-            no_single_chars = ' '.join(w for w in no_punctuation.split() if len(w) > 1)
-            no_multi_space = ' '.join(no_single_chars.split())
-            # no_stop_words = ' '.join([w for w in no_multi_space.split() if w not in english_stopwords])
-            return no_multi_space
-
 
         logger.info('Answer: removing stop words and tokenizing')
 
@@ -56,82 +49,147 @@ def pre_process_raw_data(df):
         df.question.fillna('', inplace=True)
 
         with VerboseTimer("Answer Tokenizing"):
-            df['processed_answer'] = df['answer'].apply(process_text)
+            df['processed_answer'] = df['answer'].apply(_process_text)
 
         logger.info('Question: removing stop words and tokenizing')
         with VerboseTimer("Question Tokenizing"):
-            df['processed_question'] = df['question'].apply(process_text)
-
-        ddata = dd.from_pandas(df, npartitions=8)
-
-        def get_string_features(s, *a, **kw):
-            features = get_text_features(s)
-            return features
-
-        paralelized_get_features = partial(_apply_heavy_function, dask_df=ddata, apply_func=get_string_features)
+            df['processed_question'] = df['question'].apply(_process_text)
 
         logger.info('Getting answers embedding')
         with VerboseTimer("Answer Embedding"):
-            df['answer_embedding'] = paralelized_get_features(column='processed_answer')
+            _add_embedding(df, 'processed_answer', 'answer_embedding')
 
         logger.info('Getting questions embedding')
         with VerboseTimer("Question Embedding"):
-            df['question_embedding'] = paralelized_get_features(column='processed_question')
+            _add_embedding(df, 'processed_question', 'question_embedding')
 
     __add_category_prediction(df)
 
-    __add_augmented_categories(df)
+    add_augmented_categories(df)
 
     logger.debug('Done')
     return df
 
 
-def __add_augmented_categories(df):
-    import re
-    from common.functions import get_features
-    from classes.vqa_model_predictor import VqaModelPredictor
-    from data_access.model_folder import ModelFolder
+def _process_text(txt):
+    exclude = set(string.punctuation)
+    no_punctuation = ''.join(ch.lower() if ch not in exclude else ' ' for ch in txt)
+    no_single_chars = ' '.join(w for w in no_punctuation.split() if len(w) > 1)
+    no_multi_space = ' '.join(no_single_chars.split())
+    # no_stop_words = ' '.join([w for w in no_multi_space.split() if w not in english_stopwords])
+    return no_multi_space
+
+
+def _add_embedding(df: pd.DataFrame, text_column: str, embedding_column: str) -> None:
+    """
+    Adds the embedding of a text column:
+    '<embedding_column>_idx' is the row of the text in a table holding each distinct text's embedding once,
+    and '<embedding_column>' holds, for each row, a (shared, read only) view of its row in that table
+    """
+    codes, table = get_text_embedder().embed_unique(df[text_column])
+    table.setflags(write=False)
+    logger.debug(f'{embedding_column}: {len(table)} distinct texts for {len(df)} rows')
+    table_rows = list(table)
+    df[embedding_column + '_idx'] = codes
+    df[embedding_column] = [table_rows[code] for code in codes]
+
+
+def preprocess_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pre processing for online requests: same output as pre_process_raw_data, computed for the given rows only.
+    No image folders are listed, and no processes are spawned.
+    :param df: a data frame with 'question', 'path' and optionally 'image_name', 'answer', 'question_category'
+    :return: the pre processed data frame
+    """
+    with VerboseTimer("Online pre processing"):
+        df = df.reset_index(drop=True).copy()
+        if 'image_name' not in df.columns:
+            df['image_name'] = df.path.apply(lambda path: os.path.split(path)[1])
+        for col in ['answer', 'question_category']:
+            if col not in df.columns:
+                df[col] = '' if col == 'answer' else None
 
-    abnormality_rows = df.question_category == 'Abnormality'
-    yes_no_abnormality_rows = abnormality_rows & \
-                              df.question.apply(lambda s: s.split()[0].lower() in ['does', 'is', 'are'])
-    df.loc[yes_no_abnormality_rows, 'question_category'] = 'Abnormality_yes_no'
-
-    organ_system_folder = ModelFolder(folder="C:\\Users\\Public\\Documents\\Data\\2019\\models\\20190329_0440_18")
-    organ_model = organ_system_folder.load_model()
-    abnormality_rows = df.question_category == 'Abnormality'
-    a = []
-    df_organs = df[df.question_category == 'Organ']
-    for i, row in df[abnormality_rows].iterrows():
-        image_name = row.image_name
-        dd = df_organs[df_organs .image_name == image_name]
-        if len(dd):
-            organ = dd.iloc[0].answer
-            clean_organ = re.sub(r'[^0-9a-zA-Z]+', '_', organ)
-            new_category = f'Abnormality_{clean_organ}'
-            df.loc[i,'question_category'] = new_category
-    abnormality_rows = df.question_category == 'Abnormality'
-
-    df_no_data = df[abnormality_rows]
-    with VerboseTimer("Abnormality category prediction"):
-        df_preds = VqaModelPredictor._predict_keras(df_no_data,organ_model,organ_system_folder.prediction_vector,0.001)
+        df['image_name'] = df['image_name'].apply(lambda q: q if q.lower().endswith('.jpg') else q + '.jpg')
+        df['path'] = df['path'].apply(lambda path: os.path.normpath(path))
+        missing_paths = [path for path in df.path.drop_duplicates() if not os.path.isfile(path)]
+        if missing_paths:
+            raise InvalidArgumentException(argument_name='path', argument=missing_paths,
+                                           message=f'Images were not found: {missing_paths}')
 
-    df.loc[abnormality_rows,'question_category'] = df_preds.prediction.apply(
-        lambda organ:f"Abnormality_{re.sub(r'[^0-9a-zA-Z]+', '_', organ)}")
+        df['answer'] = df.answer.fillna('')
+        df['question'] = df.question.fillna('')
+        df['processed_answer'] = df['answer'].apply(_process_text)
+        df['processed_question'] = df['question'].apply(_process_text)
 
+        _add_embedding(df, 'processed_answer', 'answer_embedding')
+        _add_embedding(df, 'processed_question', 'question_embedding')
 
+    __add_category_prediction(df)
+    add_augmented_categories(df)
+    return df
 
 
+def preprocess_single(question: str, image_path: str) -> pd.DataFrame:
+    """
+    Pre processing of a single online request
+    :return: a pre processed data frame with a single row
+    """
+    df = pd.DataFrame({'question': [question], 'path': [str(image_path)]})
+    return preprocess_batch(df)
 
 
+def get_organ_category(organ: str) -> str:
+    """Gets the augmented category of an abnormality question about an organ"""
+    return f"Abnormality_{re.sub(r'[^0-9a-zA-Z]+', '_', organ)}"
 
 
+def _predict_organs(df: pd.DataFrame) -> pd.Series:
+    """Predicts the organ of abnormality questions (all rows in a single batch) by the organ model"""
+    from classes.vqa_model_predictor import VqaModelPredictor
 
+    organ_model, organ_system_folder = get_organ_model()
+    df_preds = VqaModelPredictor._predict_keras(df, organ_model, organ_system_folder.prediction_vector, 0.001)
+    return df_preds.prediction
+
+
+def add_augmented_categories(df: pd.DataFrame, predict_organs: callable = None) -> None:
+    """
+    Enrichment stage that splits the 'Abnormality' category (in place):
+    1. Yes / no abnormality questions get 'Abnormality_yes_no'
+    2. Other abnormality questions get 'Abnormality_<organ>' by the answer of the first organ question of their image
+    3. The remaining abnormality questions get the organ predicted for them, as a single batch
+    :param df: the pre processed data frame
+    :param predict_organs: predicts the organs of a data frame's rows (indexed like it). Defaults to the organ model
+    """
+    with VerboseTimer("Abnormality categories by image organ"):
+        abnormality_rows = df.question_category == 'Abnormality'
+        yes_no_abnormality_rows = abnormality_rows & \
+                                  df.question.apply(lambda s: s.split()[0].lower() in ['does', 'is', 'are'])
+        df.loc[yes_no_abnormality_rows, 'question_category'] = 'Abnormality_yes_no'
+
+        abnormality_rows = df.question_category == 'Abnormality'
+        df_organs = df.loc[df.question_category == 'Organ', ['image_name', 'answer']] \
+            .drop_duplicates(subset=['image_name']) \
+            .rename(columns={'answer': 'organ'})
+        organs = df.loc[abnormality_rows, ['image_name']].merge(df_organs, on='image_name', how='left').organ
+        organs.index = df.index[abnormality_rows]
+        organs = organs[organs.notnull()]
+        df.loc[organs.index, 'question_category'] = organs.map(get_organ_category)
 
+    abnormality_rows = df.question_category == 'Abnormality'
+    df_no_data = df[abnormality_rows]
+    logger.debug(f'Abnormality categories: {len(organs)} by image organ, {len(df_no_data)} to predict')
+    if len(df_no_data) == 0:
+        return
 
+    predict_organs = predict_organs or _predict_organs
+    with VerboseTimer("Abnormality category prediction"):
+        predicted_organs = predict_organs(df_no_data)
+    df.loc[abnormality_rows, 'question_category'] = predicted_organs.map(get_organ_category)
 
 
 def __add_category_prediction(df):
+    from common.functions import get_question_features
     df_with_category = df[~pd.isnull(df.question_category)]
     category_by_question = {row.processed_question: row.question_category
                             for i, row in df_with_category.iterrows()}
@@ -139,33 +197,61 @@ def __add_category_prediction(df):
     df_no_category = df[pd.isnull(df.question_category)]
 
     if len(df_no_category) > 0:
-        questions_to_predict = OrderedDict({i: row.processed_question for i, row in df_no_category.iterrows()})
-
-        idxs_predict = list(questions_to_predict.keys())
-        x = np.array([np.array(xi) for xi in df.iloc[idxs_predict].question_embedding])
+        # Each distinct question is classified once
+        df_distinct = df_no_category.drop_duplicates(subset=['processed_question'])
+        questions = list(df_distinct.processed_question)
+        x = get_question_features(df_distinct)[..., 0]
         predictions = {}
+        highest_probabilities = {}
         with VerboseTimer("Predicting question category"):
             for category, classifier_location in questions_classifiers.items():
                 if not classifier_location:
                     continue
                 with VerboseTimer(f"Predicting for '{category}'"):
-                    classifier = File.load_pickle(classifier_location)
+                    classifier = get_question_classifier(classifier_location)
                     prediction_result = classifier.predict_proba(x)
-                    curr_predictions = {idx: np.argmax(probs) for idx, probs in zip(idxs_predict, prediction_result)}
-                    probabilities = {idx: probs[prediction] for (idx, prediction), probs in
+                    curr_predictions = {pq: np.argmax(probs) for pq, probs in zip(questions, prediction_result)}
+                    probabilities = {pq: probs[prediction] for (pq, prediction), probs in
                                      zip(curr_predictions.items(), prediction_result)}
 
-                    for idx in idxs_predict:
-                        curr_pred = curr_predictions[idx]
+                    for pq in questions:
+                        curr_pred = curr_predictions[pq]
                         if curr_pred != 1:
                             continue
-                        highest_prob = predictions.get(idx, -1)
-                        curr_prob = probabilities[idx]
-                        if curr_prob > highest_prob:
-                            predictions[idx] = category
-        predictions_by_question = {row.processed_question: predictions[i] for i, row in df.iloc[idxs_predict].iterrows()}
-        df.loc[idxs_predict, 'question_category'] = df.iloc[idxs_predict].processed_question.apply(
-            lambda pq: predictions_by_question[pq])
+                        curr_prob = probabilities[pq]
+                        if curr_prob > highest_probabilities.get(pq, -1):
+                            highest_probabilities[pq] = curr_prob
+                            predictions[pq] = category
+        idxs_predict = df_no_category.index
+        df.loc[idxs_predict, 'question_category'] = df_no_category.processed_question.apply(lambda pq: predictions[pq])
+
+
+@lru_cache(maxsize=None)
+def get_question_classifier(classifier_location: str):
+    """Loads a pickled question classifier, once per process"""
+    return File.load_pickle(classifier_location)
+
+
+@lru_cache(1)
+def get_organ_model():
+    """
+    Loads the model for predicting the organ of abnormality questions, once per process
+    :return: the keras model and its folder
+    """
+    from data_access.model_folder import ModelFolder
+    organ_system_folder = ModelFolder(folder=abnormality_organ_model_folder)
+    organ_model = organ_system_folder.load_model()
+    return organ_model, organ_system_folder
+
+
+def warm_up():
+    """Loads everything pre processing needs (NLP engine, question classifiers, organ model) ahead of time"""
+    with VerboseTimer("Warming up pre processing"):
+        get_text_embedder().nlp
+        for classifier_location in questions_classifiers.values():
+            if classifier_location:
+                get_question_classifier(classifier_location)
+        get_organ_model()
 
 
 def _apply_heavy_function(dask_df, apply_func, column, scheduler='processes'):
@@ -229,7 +315,7 @@ def normalize_data_strucrture(df, group, image_folder):
 def main():
     from common.settings import data_access
     df = data_access.load_processed_data()
-    __add_augmented_categories(df)
+    add_augmented_categories(df)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,152 @@
+import math
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from common.exceptions import InvalidArgumentException
+from common.utils import VerboseTimer
+
+logger = logging.getLogger(__name__)
+
+
+class TextEmbedder(object):
+    """
+    Embeds texts as the (flattened) vectors of their first input_length tokens, like prepare_data.get_text_features,
+    for many texts at once:
+    * Texts are streamed through nlp.pipe in batches
+    * Each distinct text is embedded once, and its embedding is memoized
+    * When the NLP engine has static word vectors, only the tokenizer runs, and vectors are memoized per token.
+      Otherwise (e.g. en_core_web_sm, where vectors are context sensitive) the pipeline runs without parser and NER
+    """
+    DISABLED_PIPES = ('parser', 'ner')
+
+    def __init__(self, nlp=None, input_length: int = None, embedding_dim: int = None, batch_size: int = 1000,
+                 max_memo_size: int = 50000):
+        """
+        :param nlp: the spaCy engine. Defaults to common.settings.get_nlp()
+        :param input_length: the number of tokens to embed. Defaults to common.settings.input_length
+        :param embedding_dim: the length of a token vector. Defaults to common.settings.embedding_dim
+        :param batch_size: the number of texts passed to nlp.pipe at once
+        :param max_memo_size: the maximal number of memoized texts (and, separately, tokens).
+                              When exceeded, the memo is cleared. A text embedding takes input_length * embedding_dim
+                              floats (~18KB by default)
+        """
+        super().__init__()
+        if input_length is None or embedding_dim is None:
+            from common.settings import input_length as default_input_length, embedding_dim as default_embedding_dim
+            input_length = input_length or default_input_length
+            embedding_dim = embedding_dim or default_embedding_dim
+        self._nlp = nlp
+        self.input_length = input_length
+        self.embedding_dim = embedding_dim
+        self.batch_size = batch_size
+        self.max_memo_size = max_memo_size
+
+        self._embedding_by_text = {}
+        self._vector_by_token = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(input_length={self.input_length}, embedding_dim={self.embedding_dim}, ' \
+            f'batch_size={self.batch_size}, max_memo_size={self.max_memo_size})'
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            from common.settings import get_nlp
+            self._nlp = get_nlp()
+        return self._nlp
+
+    @property
+    def has_static_vectors(self) -> bool:
+        return self.nlp.vocab.vectors.size > 0
+
+    @property
+    def embedding_length(self) -> int:
+        return self.input_length * self.embedding_dim
+
+    @staticmethod
+    def _is_empty(txt) -> bool:
+        return txt is None or txt == '' or (isinstance(txt, float) and math.isnan(txt))
+
+    def embed(self, texts: iter) -> np.ndarray:
+        """
+        :param texts: the texts to embed
+        :return: a (len(texts), input_length * embedding_dim) float32 array
+        """
+        texts = list(texts)
+        for txt in texts:
+            if not self._is_empty(txt) and not isinstance(txt, str):
+                raise InvalidArgumentException(argument_name='texts', argument=txt,
+                                               message=f'Got an unexpected type for text features: '
+                                                       f'{type(txt).__name__}')
+
+        new_texts = [txt for txt in pd.unique(np.array([t for t in texts if not self._is_empty(t)], dtype=object))
+                     if txt not in self._embedding_by_text]
+        new_embeddings = {}
+        if new_texts:
+            with VerboseTimer(f'Embedding {len(new_texts)} distinct texts'):
+                new_embeddings = self._embed_new_texts(new_texts)
+
+        embeddings = np.zeros((len(texts), self.embedding_length), dtype=np.float32)
+        for i, txt in enumerate(texts):
+            if not self._is_empty(txt):
+                embedding = new_embeddings.get(txt)
+                embeddings[i] = embedding if embedding is not None else self._embedding_by_text[txt]
+
+        # Memoized only after they were used, so clearing the memo does not lose embeddings of these texts
+        if len(self._embedding_by_text) + len(new_embeddings) > self.max_memo_size:
+            self._embedding_by_text.clear()
+        if len(new_embeddings) <= self.max_memo_size:
+            self._embedding_by_text.update(new_embeddings)
+        return embeddings
+
+    def embed_unique(self, texts: iter) -> (np.ndarray, np.ndarray):
+        """
+        Embeds each distinct text once
+        :param texts: the texts to embed
+        :return: for each text, the row of its embedding (an int64 array),
+                 and the (distinct texts, input_length * embedding_dim) float32 embeddings table
+        """
+        texts = pd.Series(list(texts), dtype=object)
+        texts = texts.where(~texts.apply(self._is_empty), '')
+        codes, uniques = pd.factorize(texts)
+        table = self.embed(uniques)
+        return codes.astype(np.int64), table
+
+    def _embed_new_texts(self, texts: list) -> dict:
+        has_static_vectors = self.has_static_vectors
+        if has_static_vectors:
+            docs = self.nlp.tokenizer.pipe(texts, batch_size=self.batch_size)
+        else:
+            disable = [pipe for pipe in self.DISABLED_PIPES if pipe in self.nlp.pipe_names]
+            docs = self.nlp.pipe(texts, batch_size=self.batch_size, disable=disable)
+
+        vector_by_token = self._vector_by_token
+        embedding_by_text = {}
+        for txt, doc in zip(texts, docs):
+            embedding = np.zeros((self.input_length, self.embedding_dim), dtype=np.float32)
+            for j, token in enumerate(doc[:self.input_length]):
+                if has_static_vectors:
+                    # Static vectors do not depend on context, so they are shared by all occurrences of a token
+                    vector = vector_by_token.get(token.text)
+                    if vector is None:
+                        if len(vector_by_token) >= self.max_memo_size:
+                            vector_by_token.clear()
+                        vector = vector_by_token.setdefault(token.text, token.vector)
+                else:
+                    vector = token.vector
+                embedding[j, :] = vector
+            embedding_by_text[txt] = embedding.reshape(self.embedding_length)
+        return embedding_by_text
+
+    def clear(self) -> None:
+        self._embedding_by_text.clear()
+        self._vector_by_token.clear()
+
+
+@lru_cache(1)
+def get_text_embedder() -> TextEmbedder:
+    """Gets the process wide text embedder, so its memoized embeddings are shared"""
+    return TextEmbedder()
@@ -2,7 +2,17 @@ from data_access.api import DataAccess, SpecificDataAccess
 import os
 from pathlib import Path
 
+import pytest
+
 from data_access.model_folder import ModelFolder
+import evaluate.WbssEvaluator as wbss_evaluator_module
+import evaluate.bleu_engine as bleu_engine_module
+import evaluate.wbss_engine as wbss_engine_module
+from evaluate.bleu_engine import BleuEngine
+from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
+from evaluate.streaming_evaluator import StreamingEvaluator
+from evaluate.wbss_engine import WbssEngine
+from evaluate.wordnet_similarity import WordSimilarityCache, set_similarity_cache
 
 curr_folder, _ = os.path.split(__file__)
 root = Path(curr_folder)
@@ -26,6 +36,78 @@ def pytest_runtest_setup(item):
         data_access = da
 
 
+def skip_without_nltk_data(*resources):
+    """Skips a test that needs NLTK data which was not downloaded (see VqaMedEvaluatorBase.update_nltk)"""
+    import nltk
+    for resource in resources:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            pytest.skip(f'NLTK data "{resource}" is not available')
+
+
+@pytest.fixture(autouse=True)
+def similarity_cache():
+    """Keeps the word similarities of a test in memory, so tests never write to a persistent cache"""
+    cache = WordSimilarityCache(max_pairs=100000)
+    set_similarity_cache(cache)
+    yield cache
+    set_similarity_cache(None)
+
+
+class _WordOverlapEvaluator(VqaMedEvaluatorBase):
+    """An asymmetric score: the part of the prediction's words that are in the ground truth"""
+
+    def get_name(self):
+        return 'word_overlap'
+
+    def evaluate(self):
+        prediction, ground_truth = self.predictions[0].answer.split(), self.ground_truth[0].answer.split()
+        return sum(w in ground_truth for w in prediction) / len(prediction)
+
+
+@pytest.fixture
+def word_overlap_evaluator():
+    """A cheap evaluator class, for code that scores sentence pairs with an evaluator (e.g. distance matrices)"""
+    return _WordOverlapEvaluator
+
+
+@pytest.fixture
+def fake_similarity():
+    """A symmetric stand in for the WordNet similarity (which needs the wordnet corpus)"""
+    def similarity(word1, word2, similarity_threshold=0.925):
+        if word1 == word2:
+            return 1.0
+        return len(set(word1) & set(word2)) / (len(set(word1) | set(word2)) + 1)
+    return similarity
+
+
+@pytest.fixture
+def fake_wordnet(monkeypatch, fake_similarity):
+    """Makes the per pair WBSS evaluation and the process wide WBSS engine use fake_similarity"""
+    monkeypatch.setattr(wbss_evaluator_module, 'wup_measure', fake_similarity)
+    monkeypatch.setattr(wbss_engine_module, 'wup_measure', fake_similarity)
+    monkeypatch.setattr(wbss_engine_module, '_wbss_engine', None)
+    return fake_similarity
+
+
+@pytest.fixture
+def fake_nltk(monkeypatch, fake_wordnet):
+    """Makes the process wide BLEU and WBSS engines need no NLTK data"""
+    bleu_engine = BleuEngine(remove_stopwords=False, tokenize=str.split)
+    monkeypatch.setattr(bleu_engine_module, 'get_bleu_engine', lambda **kwargs: bleu_engine)
+
+
+@pytest.fixture
+def get_evaluator(fake_similarity):
+    """Gets a factory of streaming evaluators whose BLEU and WBSS engines need no NLTK data"""
+    def get_evaluator(metrics=StreamingEvaluator.METRICS):
+        return StreamingEvaluator(metrics=metrics,
+                                  bleu_engine=BleuEngine(remove_stopwords=False, tokenize=str.split),
+                                  wbss_engine=WbssEngine(word_similarity=fake_similarity))
+    return get_evaluator
+
+
 def __generate_data_folder():
     # Just for having test data
     from common.settings import data_access as dd
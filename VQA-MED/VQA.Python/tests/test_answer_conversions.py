@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from common.os_utils import File
+from data_access.api import DataAccess
+from data_access.model_folder import ModelFolder
+
+
+def _get_processed_data(answers):
+    return pd.DataFrame({'question': [f'question {i}' for i in range(len(answers))],
+                         'group': ['train', 'validation'] * (len(answers) // 2),
+                         'answer': answers,
+                         'processed_answer': [answer.lower().strip('.') for answer in answers]})
+
+
+def _get_model_folder(folder) -> ModelFolder:
+    model_folder = os.path.join(folder, 'model')
+    os.makedirs(model_folder, exist_ok=True)
+    File.dump_json({'prediction_data': 'answers'}, os.path.join(model_folder, ModelFolder.ADDITIONAL_INFO_FILE_NAME))
+    return ModelFolder(model_folder)
+
+
+def test_processed_data_stamp_changes_when_data_is_saved_again():
+    df = _get_processed_data(['CT', 'MRI', 'Axial', 'Yes'])
+    with tempfile.TemporaryDirectory() as folder:
+        data_access = DataAccess(folder)
+        assert data_access.processed_data_stamp is None
+
+        data_access.save_processed_data(df)
+        stamp = data_access.processed_data_stamp
+        assert stamp is not None
+        assert stamp == data_access.processed_data_stamp
+
+        data_access.save_processed_data(df.iloc[:2])
+        assert data_access.processed_data_stamp != stamp
+
+
+def test_processed_data_stamp_is_cached():
+    df = _get_processed_data(['CT', 'MRI', 'Axial', 'Yes'])
+    with tempfile.TemporaryDirectory() as folder:
+        DataAccess(folder).save_processed_data(df)
+        data_access = DataAccess(folder)
+        stamp = data_access.processed_data_stamp
+
+        # Regenerated by someone else: noticed only once the cached stamp is too old
+        DataAccess(folder).save_processed_data(df.iloc[:2])
+        assert data_access.processed_data_stamp == stamp
+        data_access.PROCESSED_DATA_STAMP_MAX_AGE_SECONDS = 0
+        assert data_access.processed_data_stamp != stamp
+
+
+def test_answer_conversions_are_rebuilt_when_processed_data_changes(monkeypatch):
+    with tempfile.TemporaryDirectory() as folder:
+        data_access = DataAccess(folder)
+        data_access.save_processed_data(_get_processed_data(['CT', 'ct.', 'MRI', 'Axial']))
+
+        conversions = _get_model_folder(folder).get_answer_conversions(data_access)
+        assert conversions.to_dict() == {'ct': 'CT', 'mri': 'MRI', 'axial': 'Axial'}
+
+        # A new model folder reads the saved conversions, rather than building them again
+        with monkeypatch.context() as m:
+            m.setattr(data_access, 'load_processed_data', lambda *args, **kwargs: None)
+            model_folder = _get_model_folder(folder)
+            assert model_folder.get_answer_conversions(data_access).to_dict() == conversions.to_dict()
+
+        data_access.save_processed_data(_get_processed_data(['Coronal', 'MRI']))
+        assert model_folder.get_answer_conversions(data_access).to_dict() == {'coronal': 'Coronal', 'mri': 'MRI'}
+        assert _get_model_folder(folder).get_answer_conversions(data_access).to_dict() == \
+               {'coronal': 'Coronal', 'mri': 'MRI'}
@@ -0,0 +1,34 @@
+import numpy as np
+
+from pre_processing.approximate_clustering import cluster_approximately, get_candidate_pairs
+
+
+def _letter_vectors(sentences):
+    """A cheap sentence vector: letter counts"""
+    vectors = np.zeros((len(sentences), 26))
+    for i, sentence in enumerate(sentences):
+        for ch in sentence.replace(' ', ''):
+            vectors[i, ord(ch) - ord('a')] += 1
+    return vectors
+
+
+def test_candidate_pairs_are_nearest_neighbors():
+    vectors = np.array([[1, 0], [1, 0.01], [0, 1], [0.01, 1]])
+    rows, cols = get_candidate_pairs(vectors, max_neighbors=3, vector_radius=0.1)
+    assert sorted(zip(rows, cols)) == [(0, 1), (2, 3)]
+
+
+def test_approximate_clusters(word_overlap_evaluator):
+    sentences = ['brain tumor', 'brain tumor', 'tumor of brain', 'brain tumor mass',
+                 'femur fracture', 'fracture of femur', 'femur fracture', 'fracture femur',
+                 'xyz']
+
+    clusters, graph = cluster_approximately(sentences, word_overlap_evaluator, cluster_eps=0.5,
+                                            min_count_for_cluster=3, max_neighbors=5, vector_radius=0.5,
+                                            sentence_vectors=_letter_vectors)
+
+    assert len(clusters) == len(sentences)
+    assert graph.shape == (len(set(sentences)),) * 2
+    assert len(set(clusters[:4])) == 1 and len(set(clusters[4:8])) == 1
+    assert clusters[0] != clusters[4] and -1 not in clusters[:8]
+    assert clusters[8] == -1
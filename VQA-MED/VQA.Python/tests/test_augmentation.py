@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+
+from common.augmentation import ImageAugmenter
+from common.functions import get_images
+from tests.conftest import image_folder
+
+
+def _get_test_image_path():
+    image_name = next(f for f in os.listdir(image_folder) if f.endswith('.jpg'))
+    return os.path.join(image_folder, image_name)
+
+
+def test_augmentations_are_replayable():
+    image_path = _get_test_image_path()
+    paths = [image_path] * 4
+    augmentation_indexes = [0, 1, 2, 1]
+    images = get_images(paths)
+
+    augmenter = ImageAugmenter()
+    augmented = augmenter.augment(images, paths, augmentation_indexes)
+
+    assert augmented.shape == images.shape
+    assert np.array_equal(augmented[0], images[0]), 'Expected augmentation 0 to be the original image'
+    assert not np.array_equal(augmented[1], images[1])
+    assert not np.array_equal(augmented[1], augmented[2])
+    assert np.array_equal(augmented[1], augmented[3]), 'Expected the same augmentation index to be replayed'
+
+    replayed = ImageAugmenter().augment(images[2:3], paths[2:3], augmentation_indexes[2:3])
+    assert np.array_equal(replayed[0], augmented[2])
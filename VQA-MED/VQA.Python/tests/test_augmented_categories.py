@@ -0,0 +1,26 @@
+import pandas as pd
+
+from pre_processing.prepare_data import add_augmented_categories
+
+
+def test_augmented_categories():
+    df = pd.DataFrame({'image_name': ['a.jpg', 'a.jpg', 'b.jpg', 'a.jpg', 'c.jpg', 'b.jpg', 'd.jpg', 'd.jpg'],
+                       'question': ['what organ is this?', 'what is abnormal?', 'what is wrong?', 'which organ?',
+                                    'what is the abnormality?', 'is this normal?', 'what organ?', 'what is abnormal?'],
+                       'answer': ['lung, mediastinum', 'x', 'y', 'skull', 'z', 'no', 'spine', 'w'],
+                       'question_category': ['Organ', 'Abnormality', 'Abnormality', 'Organ', 'Abnormality',
+                                             'Abnormality', 'Organ', 'Abnormality']},
+                      index=[7, 6, 5, 4, 3, 2, 1, 0])
+    predicted = []
+
+    def predict_organs(df_no_data):
+        predicted.append(list(df_no_data.index))
+        return pd.Series('heart and great vessels', index=df_no_data.index)
+
+    add_augmented_categories(df, predict_organs=predict_organs)
+
+    assert df.question_category.tolist() == ['Organ', 'Abnormality_lung_mediastinum',
+                                             'Abnormality_heart_and_great_vessels', 'Organ',
+                                             'Abnormality_heart_and_great_vessels', 'Abnormality_yes_no', 'Organ',
+                                             'Abnormality_spine']
+    assert predicted == [[5, 3]], 'Expected a single prediction batch for rows without an organ question'
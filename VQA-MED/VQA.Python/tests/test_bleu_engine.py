@@ -0,0 +1,80 @@
+import string
+
+import numpy as np
+from nltk.stem.snowball import SnowballStemmer
+from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+
+from evaluate.BleuEvaluator import BleuEvaluator
+from evaluate.bleu_engine import BleuEngine
+from tests.conftest import skip_without_nltk_data
+
+REFERENCES = ['the roof is on fire', 'roof fire', 'group of words to subtract ngrams long or short',
+              'axial ct of the head', '', 'fracture', 'mri', 'The cat sat on the mat, the cat']
+CANDIDATES = ['roof fire', 'the roof is on fire', 'words subtract ngrams long', 'head ct axial', '', '',
+              'fracture', 'the cat the cat sat on the mat']
+
+
+def _nltk_scores(references, candidates, tokenize=str.split, stops=()):
+    stemmer = SnowballStemmer("english")
+    translator = str.maketrans('', '', string.punctuation)
+
+    def normalize(sentence):
+        words = tokenize(sentence.lower().translate(translator))
+        return [stemmer.stem(w) for w in words if w.lower() not in stops]
+
+    scores = []
+    for reference, candidate in zip(references, candidates):
+        gt_words, candidate_words = normalize(reference), normalize(candidate)
+        if len(gt_words) == 0 and len(candidate_words) == 0:
+            scores.append(1)
+        else:
+            scores.append(sentence_bleu([gt_words], candidate_words, smoothing_function=SmoothingFunction().method0))
+    return scores
+
+
+def test_parity_with_nltk():
+    engine = BleuEngine(remove_stopwords=False, tokenize=str.split, max_chunk_size=3)
+
+    scores = engine.score_pairs(REFERENCES, CANDIDATES)
+
+    expected = _nltk_scores(REFERENCES, CANDIDATES)
+    assert scores.tolist() == [float(s) for s in expected], 'Expected exactly the scores of NLTK'
+    assert len(engine) == len(set(REFERENCES) | set(CANDIDATES)), 'Expected each sentence to be normalized once'
+
+
+def test_default_config_parity_with_nltk():
+    skip_without_nltk_data('tokenizers/punkt', 'corpora/stopwords')
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    assert (BleuEvaluator.remove_stopwords, BleuEvaluator.stemming, BleuEvaluator.case_sensitive) == \
+           (True, True, False), 'Expected the configuration this test mirrors'
+    engine = BleuEngine(max_chunk_size=3)
+
+    scores = engine.score_pairs(REFERENCES, CANDIDATES)
+
+    expected = _nltk_scores(REFERENCES, CANDIDATES, tokenize=word_tokenize, stops=set(stopwords.words("english")))
+    assert scores.tolist() == [float(s) for s in expected], 'Expected exactly the scores of NLTK'
+
+    evaluator = BleuEvaluator(predictions=CANDIDATES, ground_truth=REFERENCES)
+    per_pair_score = evaluator._compute_bleu_per_pair(evaluator.predictions, evaluator.ground_truth)
+    assert evaluator.evaluate() == per_pair_score
+
+
+def test_sentence_ids():
+    engine = BleuEngine(remove_stopwords=False, tokenize=str.split)
+    ids = engine.get_sentence_ids(REFERENCES)
+    assert np.array_equal(engine.get_sentence_ids(REFERENCES[::-1]), ids[::-1])
+    assert engine.score_id_pairs(ids, ids).tolist() == engine.score_pairs(REFERENCES, REFERENCES).tolist()
+
+
+def test_batches_match_single_pass():
+    engine = BleuEngine(remove_stopwords=False, tokenize=str.split)
+    batched = []
+    for start in range(0, len(REFERENCES), 3):
+        # Each batch adds new sentences, after count matrices of the previous ones were built
+        batched.extend(engine.score_pairs(REFERENCES[start:start + 3], CANDIDATES[start:start + 3]).tolist())
+
+    single = BleuEngine(remove_stopwords=False, tokenize=str.split).score_pairs(REFERENCES, CANDIDATES)
+    assert batched == single.tolist()
+    assert engine.score_pairs(CANDIDATES, REFERENCES).tolist() == \
+           BleuEngine(remove_stopwords=False, tokenize=str.split).score_pairs(CANDIDATES, REFERENCES).tolist()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+
+from common.exceptions import NoDataException
+from data_access.bottleneck_features import BottleneckFeatureStore
+from tests.conftest import image_folder
+
+
+class _MeanColorModel(object):
+    """A cheap stand in for the frozen image model: the mean of each color channel"""
+    output_shape = (None, 3)
+
+    def __init__(self):
+        self.predicted_count = 0
+
+    def predict(self, images):
+        self.predicted_count += len(images)
+        return images.mean(axis=(1, 2))
+
+
+def _get_test_image_path():
+    image_name = next(f for f in os.listdir(image_folder) if 'pytest' not in f)
+    return os.path.join(image_folder, image_name)
+
+
+def test_identical_images_are_computed_once():
+    image_path = _get_test_image_path()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        copy_path = os.path.join(temp_dir, 'copy.jpg')
+        shutil.copy(image_path, copy_path)
+
+        model = _MeanColorModel()
+        store = BottleneckFeatureStore(os.path.join(temp_dir, 'features'))
+        new_count = store.build([image_path, copy_path, image_path], image_model=model)
+
+        assert new_count == 1, 'Expected identical images to share a single features row'
+        assert model.predicted_count == 1
+
+        features = store.get_image_features([image_path, copy_path])
+        assert features.shape == (2, 3)
+        assert np.array_equal(features[0], features[1])
+
+
+def test_features_are_persisted():
+    image_path = _get_test_image_path()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, 'features')
+        BottleneckFeatureStore(folder).build([image_path], image_model=_MeanColorModel())
+
+        model = _MeanColorModel()
+        store = BottleneckFeatureStore(folder)
+        new_count = store.build([image_path], image_model=model)
+        features = store.get_image_features([image_path])
+        del store  # release the memory mapped file before the folder is deleted
+
+        assert new_count == 0, 'Expected features to be loaded from disk'
+        assert model.predicted_count == 0
+        assert features.shape == (1, 3)
+
+
+def test_changed_images_are_not_served_old_features():
+    image_path = _get_test_image_path()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        changed_path = os.path.join(temp_dir, 'changed.jpg')
+        shutil.copy(image_path, changed_path)
+        store = BottleneckFeatureStore(os.path.join(temp_dir, 'features'))
+        store.build([changed_path], image_model=_MeanColorModel())
+        old_features = np.array(store.get_image_features([changed_path]))
+
+        # Replacing the image with a different one after its features were computed
+        cv2.imwrite(changed_path, 255 - cv2.imread(image_path))
+        os.utime(changed_path, (0, 0))
+        with pytest.raises(NoDataException):
+            store.get_image_features([changed_path])
+
+        assert store.build([changed_path], image_model=_MeanColorModel()) == 1
+        features = np.array(store.get_image_features([changed_path]))
+        del store
+
+        assert not np.array_equal(features, old_features)
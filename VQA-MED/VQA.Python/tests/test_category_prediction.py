@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import pre_processing.prepare_data as prepare_data
+
+
+class _FakeClassifier(object):
+    """Predicts its category for a question with a fixed probability (the question embedding is its id)"""
+
+    def __init__(self, probability_by_question_id):
+        self.probability_by_question_id = probability_by_question_id
+
+    def predict_proba(self, x):
+        probabilities = np.array([self.probability_by_question_id[int(question_id)] for question_id in x[:, 0]])
+        return np.stack([1 - probabilities, probabilities], axis=1)
+
+
+def test_most_probable_category_wins(monkeypatch):
+    classifiers = OrderedDict([('Modality', _FakeClassifier({0: 0.6, 1: 0.8, 2: 0.1})),
+                               ('Plane', _FakeClassifier({0: 0.9, 1: 0.05, 2: 0.2})),
+                               ('Organ', _FakeClassifier({0: 0.7, 1: 0.55, 2: 0.1})),
+                               ('Abnormality_yes_no', None)])
+    monkeypatch.setattr(prepare_data, 'questions_classifiers',
+                        OrderedDict((category, category if classifier else '')
+                                    for category, classifier in classifiers.items()))
+    monkeypatch.setattr(prepare_data, 'get_question_classifier', lambda location: classifiers[location])
+
+    df = pd.DataFrame({'processed_question': ['what plane', 'what modality', 'what plane', 'which organ'],
+                       'question_embedding': [np.array([0.0]), np.array([1.0]), np.array([0.0]), np.array([2.0])],
+                       'question_category': [None, None, None, 'Organ']})
+
+    getattr(prepare_data, '__add_category_prediction')(df)
+
+    # 'what plane' is predicted by all classifiers, and the most probable one wins.
+    # 'Plane' is sure 'what modality' is not a plane question (0.95), which does not count as a prediction
+    assert df.question_category.tolist() == ['Plane', 'Modality', 'Plane', 'Organ']
@@ -0,0 +1,63 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from pre_processing.data_cleaning import TextCleaner, clean_data
+from pre_processing.known_find_and_replace_items import find_and_replace_collection, FindAndReplaceData
+
+TEXTS = ['What does the MRI scan show?', 'magnetic  resonance imaging of the brain', 'the mri scan', 'An   CT image',
+         'in ct scan image', 'cta', 'the mra', 'Magnetic Resonance Angiography', 'no devices here', 'ACT of CTA',
+         'of the ct', '', '  ', 'mri mri, ct image scan', 'what is abnormal in the ct scan?']
+
+
+def _clean_per_value(val):
+    """The original, per cell cleaning"""
+    if isinstance(val, str):
+        new_val = ' '.join(val.split()).strip().lower()
+        for tpl in find_and_replace_collection:
+            pattern = re.compile(tpl.orig, re.IGNORECASE)
+            new_val = pattern.sub(repl=tpl.sub, string=new_val)
+    elif np.isnan(val):
+        new_val = ''
+    else:
+        new_val = val
+    return new_val
+
+
+def test_parity_with_per_value_cleaning():
+    cleaner = TextCleaner(find_and_replace_collection)
+    values = pd.Series(TEXTS * 3 + [np.nan], index=range(5, 5 + 3 * len(TEXTS) + 1))
+
+    cleaned = cleaner.clean_series(values)
+
+    assert cleaned.index.equals(values.index)
+    assert cleaned.tolist() == [_clean_per_value(v) for v in values]
+    assert len(cleaner) == len(set(TEXTS)), 'Expected each distinct text to be cleaned once'
+
+
+def test_process_pool_parity():
+    cleaner = TextCleaner(find_and_replace_collection)
+    cleaned = cleaner.clean_series(TEXTS, workers=2, chunk_size=4)
+    assert cleaned.tolist() == [_clean_per_value(v) for v in TEXTS]
+
+
+def test_process_pool_respects_max_cache_size():
+    distinct_texts = list(set(TEXTS))
+    cleaner = TextCleaner(find_and_replace_collection, max_cache_size=len(distinct_texts) - 1)
+    cleaned = cleaner.clean_series(distinct_texts, workers=2, chunk_size=2)
+    assert cleaned.tolist() == [_clean_per_value(v) for v in distinct_texts]
+    assert len(cleaner) <= cleaner.max_cache_size
+
+
+def test_rules_with_back_references():
+    rules = [FindAndReplaceData(r'(\w)\1', r'\1'), FindAndReplaceData(r'b', 'c')]
+    cleaner = TextCleaner(rules)
+    assert cleaner.clean('aabb') == 'ac'
+
+
+def test_clean_data():
+    df = pd.DataFrame({'question': ['What does the MRI show?', np.nan], 'answer': ['the ct scan', 'MRA']})
+    df = clean_data(df)
+    assert df.processed_question.tolist() == ['what does the mr show?', '']
+    assert df.processed_answer.tolist() == ['ct', 'mra']
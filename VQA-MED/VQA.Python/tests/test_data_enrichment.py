@@ -0,0 +1,40 @@
+import itertools
+from collections import Counter
+
+import pandas as pd
+
+from pre_processing.data_enrichment import _consolidate_image_devices
+
+
+def _consolidate_per_image(df):
+    """The original, per image consolidation"""
+    df = df.copy()
+    for image_name in df.image_name.drop_duplicates().values:
+        df_image = df[df.image_name == image_name]
+        image_imaging_device = list(itertools.chain.from_iterable([d.split() for d in df_image.imaging_device.values]))
+        consolidated = {d for d in image_imaging_device if d}
+        if len(consolidated) > 1:
+            (top1_val, top1_freq), (top2_val, top2_freq) = Counter(image_imaging_device).most_common(2)
+            consolidated = {top1_val} if top1_freq > top2_freq else set()
+        if len(consolidated) == 0:
+            consolidated = {'unknown'}
+        df.loc[df.image_name == image_name, 'imaging_device'] = consolidated.pop()
+    return df
+
+
+def test_consolidation_matches_per_image():
+    df = pd.DataFrame({'image_name': ['a', 'b', 'a', 'c', 'b', 'd', 'a', 'e', 'e', 'f'],
+                       'imaging_device': ['ct', 'mr', 'ct mr', '', 'ct', 'us', 'mr ct ct', '', 'xr', 'ct ct mr']},
+                      index=[9, 8, 7, 6, 5, 4, 3, 2, 1, 0])
+    expected = _consolidate_per_image(df)
+
+    consolidated = _consolidate_image_devices(df.copy())
+
+    assert consolidated.imaging_device.tolist() == expected.imaging_device.tolist()
+    assert consolidated.imaging_device.tolist() == ['ct', 'unknown', 'ct', 'unknown', 'unknown', 'us', 'ct',
+                                                    'xr', 'xr', 'ct']
+
+
+def test_consolidation_without_devices():
+    df = pd.DataFrame({'image_name': ['a', 'b'], 'imaging_device': ['', ' ']})
+    assert _consolidate_image_devices(df).imaging_device.tolist() == ['unknown', 'unknown']
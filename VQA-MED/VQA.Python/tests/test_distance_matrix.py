@@ -0,0 +1,59 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from pre_processing.distance_matrix import DistanceMatrixBuilder
+
+SENTENCES = ['axial ct', 'ct', 'chest x ray', 'x ray', 'mri of the head', 'head mri', 'fracture']
+
+
+def _get_expected(sentences, evaluator_ctor):
+    n = len(sentences)
+    expected = np.zeros((n, n), dtype=np.float32)
+    for row in range(n):
+        for col in range(row, n):
+            score = evaluator_ctor(predictions=[sentences[row]], ground_truth=[sentences[col]]).evaluate()
+            expected[row, col] = expected[col, row] = score
+    return expected
+
+
+def test_distances_match_per_pair_evaluation(word_overlap_evaluator):
+    for workers in [1, 2]:
+        builder = DistanceMatrixBuilder(word_overlap_evaluator, block_size=3, workers=workers)
+        distances = builder.build(SENTENCES)
+        assert distances.dtype == np.float32
+        assert np.array_equal(distances, _get_expected(SENTENCES, word_overlap_evaluator))
+
+
+def test_resume_from_checkpoint(word_overlap_evaluator):
+    with tempfile.TemporaryDirectory() as folder:
+        builder = DistanceMatrixBuilder(word_overlap_evaluator, block_size=3, workers=1, checkpoint_folder=folder)
+        distances = builder.build(SENTENCES)
+        block_files = sorted(Path(folder).glob('*/block_*.npy'))
+        assert len(block_files) == len(builder.get_blocks(len(SENTENCES)))
+
+        # A finished block is loaded rather than recomputed, and a missing one is computed
+        done_block, missing_block = block_files[1], block_files[2]
+        np.save(str(done_block), np.full_like(np.load(str(done_block)), 7))
+        missing_block.unlink()
+        resumed = builder.build(SENTENCES)
+
+        assert (resumed == 7).sum() == 2 * np.load(str(done_block)).size
+        assert missing_block.exists()
+        assert np.array_equal(resumed[resumed != 7], distances[resumed != 7])
+
+
+def test_truncated_checkpoint_is_recomputed(word_overlap_evaluator):
+    with tempfile.TemporaryDirectory() as folder:
+        builder = DistanceMatrixBuilder(word_overlap_evaluator, block_size=3, workers=1, checkpoint_folder=folder)
+        distances = builder.build(SENTENCES)
+
+        # As if the process was killed while writing a block
+        block_file = sorted(Path(folder).glob('*/block_*.npy'))[0]
+        block_file.write_bytes(block_file.read_bytes()[:20])
+        resumed = builder.build(SENTENCES)
+
+        assert np.array_equal(resumed, distances)
+        assert np.array_equal(np.load(str(block_file)), resumed[:3, :3] * np.triu(np.ones((3, 3))))
+        assert not list(Path(folder).glob('*/*.tmp.npy'))
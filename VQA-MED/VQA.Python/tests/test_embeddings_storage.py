@@ -0,0 +1,64 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common.functions import get_question_features
+from data_access.api import DataAccess
+
+EMBEDDING_LENGTH = 12
+
+
+def _get_processed_data():
+    rnd = np.random.RandomState(0)
+    n = 6
+    return pd.DataFrame({'question': [f'question {i}' for i in range(n)],
+                         'group': ['train', 'validation'] * (n // 2),
+                         'question_embedding': list(rnd.rand(n, EMBEDDING_LENGTH)),
+                         'answer_embedding': list(rnd.rand(n, EMBEDDING_LENGTH))})
+
+
+def test_embeddings_are_stored_as_matrices():
+    df = _get_processed_data()
+    with tempfile.TemporaryDirectory() as folder:
+        data_access = DataAccess(folder)
+        data_access.save_processed_data(df)
+
+        df_loaded = data_access.load_processed_data(attach_embeddings=False) \
+            .set_index('question').loc[df.question].reset_index()
+        assert 'question_embedding' not in df_loaded.columns
+        question_embeddings = data_access.load_embeddings('question_embedding')
+        assert question_embeddings.dtype == np.float32
+
+        features = get_question_features(df_loaded, question_embeddings)
+        expected = get_question_features(df).astype(np.float32)
+        assert features.shape == (len(df), EMBEDDING_LENGTH, 1)
+        assert np.array_equal(features, expected)
+
+        df_attached = data_access.attach_embeddings(df_loaded, ['answer_embedding'])
+        assert np.allclose(np.stack(df_attached.answer_embedding.values), np.stack(df.answer_embedding.values), atol=1e-6)
+
+        # By default, the embedding columns are loaded as before
+        df_full = data_access.load_processed_data().set_index('question').loc[df.question].reset_index()
+        assert all(col in df_full.columns for col in DataAccess.EMBEDDING_COLUMNS)
+        assert np.array_equal(get_question_features(df_full), expected)
+        del question_embeddings, data_access  # release the memory mapped file before the folder is deleted
+
+
+def test_shared_embeddings_are_stored_once():
+    df = _get_processed_data()
+    df['question_embedding_idx'] = [0, 1, 0, 1, 2, 0]
+    df['question_embedding'] = [df.question_embedding[idx] for idx in df.question_embedding_idx]
+    with tempfile.TemporaryDirectory() as folder:
+        data_access = DataAccess(folder)
+        data_access.save_processed_data(df.iloc[1:])
+
+        question_embeddings = data_access.load_embeddings('question_embedding')
+        assert question_embeddings.shape == (3, EMBEDDING_LENGTH)
+        assert data_access.load_embeddings('answer_embedding').shape == (len(df) - 1, EMBEDDING_LENGTH)
+
+        df_loaded = data_access.load_processed_data().set_index('question').loc[df.question[1:]].reset_index()
+        features = get_question_features(df_loaded, question_embeddings)
+        assert np.array_equal(features, get_question_features(df.iloc[1:]).astype(np.float32))
+        del question_embeddings, data_access
+
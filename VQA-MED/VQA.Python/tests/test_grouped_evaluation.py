@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
+from evaluate.grouped_evaluation import evaluate_by_group, TOTAL_GROUP
+from common.exceptions import InvalidArgumentException
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'question_category': ['Organ', 'Plane', 'Organ', 'Modality', 'Plane', 'Organ'],
+                         'prediction': ['chest', 'axial', 'head ct', 'mri', 'coronal', 'abdomen'],
+                         'answer': ['chest', 'axial', 'head', 'mri t2', 'sagittal', 'stomach']},
+                        index=[10, 11, 12, 13, 14, 15])
+
+
+def test_groups_match_separate_evaluations(df, get_evaluator):
+    evaluations, df_scores = evaluate_by_group(df, group_column='question_category', evaluator=get_evaluator())
+
+    assert list(evaluations.keys()) == ['Modality', 'Organ', 'Plane', 'Total']
+    assert df_scores.index.tolist() == df.index.tolist()
+
+    for category, df_category in list(df.groupby('question_category')) + [('Total', df)]:
+        evaluator = get_evaluator()
+        evaluator.update(df_category.prediction.values, df_category.answer.values)
+        assert evaluations[category] == evaluator.result()
+
+
+def test_groups_match_get_all_evaluation_per_category(df, fake_nltk):
+    evaluations, _ = evaluate_by_group(df, group_column='question_category')
+
+    # The evaluation per category (and then in total) that evaluate_by_group replaces
+    expected = {}
+    for question_category, df_category in df.groupby('question_category'):
+        expected[question_category] = VqaMedEvaluatorBase.get_all_evaluation(predictions=df_category.prediction.values,
+                                                                             ground_truth=df_category.answer.values)
+    expected[TOTAL_GROUP] = VqaMedEvaluatorBase.get_all_evaluation(predictions=df.prediction.values,
+                                                                   ground_truth=df.answer.values)
+    assert evaluations == expected
+
+
+def test_missing_column(df, get_evaluator):
+    with pytest.raises(InvalidArgumentException):
+        evaluate_by_group(df, group_column='category', evaluator=get_evaluator())
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from common.image_cache import ImageCache
+
+IMAGE_SHAPE = (4, 4, 3)
+IMAGE_BYTES = int(np.prod(IMAGE_SHAPE))
+
+
+@pytest.fixture
+def image_paths():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i in range(4):
+            path = os.path.join(temp_dir, f'image_{i}.jpg')
+            with open(path, 'w') as f:
+                f.write(str(i))
+            paths.append(path)
+        yield paths
+
+
+def _load_image(path):
+    value = int(os.path.basename(path).split('_')[1].split('.')[0])
+    return np.full(IMAGE_SHAPE, value, dtype=np.uint8)
+
+
+def test_hits_and_misses(image_paths):
+    cache = ImageCache(max_bytes=10 * IMAGE_BYTES)
+    for path in image_paths + image_paths:
+        cache.get_or_load(path, _load_image)
+
+    assert cache.misses == len(image_paths)
+    assert cache.hits == len(image_paths)
+    assert cache.evictions == 0
+
+
+def test_least_recently_used_is_evicted(image_paths):
+    cache = ImageCache(max_bytes=2 * IMAGE_BYTES)
+    first, second, third = image_paths[:3]
+    cache.get_or_load(first, _load_image)
+    cache.get_or_load(second, _load_image)
+    cache.get_or_load(first, _load_image)  # 'second' is now the least recently used
+    cache.get_or_load(third, _load_image)
+
+    assert cache.evictions == 1
+    assert cache.current_bytes <= cache.max_bytes
+    assert cache.get(first) is not None
+    assert cache.get(second) is None
+
+
+def test_modified_image_is_reloaded(image_paths):
+    cache = ImageCache(max_bytes=10 * IMAGE_BYTES)
+    path = image_paths[0]
+    cache.get_or_load(path, _load_image)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    assert cache.get(path) is None, 'Expected a modified image to be a cache miss'
+
+
+def test_evicted_images_are_spilled_to_disk(image_paths):
+    with tempfile.TemporaryDirectory() as spill_folder:
+        cache = ImageCache(max_bytes=IMAGE_BYTES, spill_folder=spill_folder, spill_max_bytes=2 * IMAGE_BYTES)
+        for path in image_paths:
+            cache.get_or_load(path, _load_image)
+
+        # Only the last one is in memory, the 2 before it are on disk
+        assert cache.stats['spilled_items'] == 2
+        spilled_image = cache.get(image_paths[-2])
+        assert cache.spill_hits == 1
+        assert np.array_equal(spilled_image, _load_image(image_paths[-2]))
+        assert cache.get(image_paths[0]) is None, 'Expected the oldest image to be dropped from the spill file'
+        cache._spill = None  # release the memory mapped file before the folder is deleted
@@ -0,0 +1,45 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from common.image_cache import get_image_cache
+from common.image_loading import ImageDecoder, STAGES
+from tests.conftest import image_folder
+
+IMAGE_SIZE = (32, 32)
+
+
+def _get_test_image_paths():
+    return sorted(os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.endswith('.jpg'))
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_images_are_stacked_in_order(use_processes):
+    get_image_cache().clear()
+    paths = _get_test_image_paths()
+    paths = paths + paths[::-1]
+
+    decoder = ImageDecoder(workers=2, use_processes=use_processes, max_queue_depth=1, image_size=IMAGE_SIZE)
+    try:
+        images = decoder.get_images(paths)
+    finally:
+        decoder.shutdown()
+
+    expected = np.stack([cv2.resize(cv2.imread(p), IMAGE_SIZE) for p in paths])
+    assert np.array_equal(images, expected)
+    assert decoder.stats['images'] == len(set(paths)), 'Expected each distinct image to be decoded once'
+    assert all(stage in decoder.stats for stage in STAGES)
+
+
+def test_other_sizes_are_not_shared():
+    get_image_cache().clear()
+    decoder = ImageDecoder(workers=1, image_size=IMAGE_SIZE)
+    try:
+        decoder.get_images(_get_test_image_paths())
+    finally:
+        decoder.shutdown()
+
+    assert not decoder.uses_shared_cache
+    assert len(get_image_cache()) == 0, 'Expected images of a non default size not to be cached for other consumers'
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+from common.functions import get_images
+from data_access.image_shards import ImageShardStore
+from tests.conftest import image_folder
+
+
+def _get_test_image_path():
+    image_name = next(f for f in os.listdir(image_folder) if f.endswith('.jpg'))
+    return os.path.join(image_folder, image_name)
+
+
+def test_packed_images_match_decoded_images():
+    image_path = _get_test_image_path()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = [image_path]
+        for i in range(4):
+            copy_path = os.path.join(temp_dir, f'copy_{i}.jpg')
+            shutil.copy(image_path, copy_path)
+            paths.append(copy_path)
+        unpacked_path = os.path.join(temp_dir, 'unpacked.jpg')
+        shutil.copy(image_path, unpacked_path)
+
+        store = ImageShardStore(os.path.join(temp_dir, 'shards'))
+        image_count = store.build(paths, images_per_shard=2)
+        assert image_count == len(paths)
+        assert len(store.index['shards']) == 3
+
+        requested_paths = paths[::-1] + [unpacked_path, paths[1], paths[2]]
+        images = store.get_image_features(requested_paths)
+        store = None  # release the memory mapped files before the folder is deleted
+
+        assert np.array_equal(images, get_images(requested_paths))
+
+
+def test_changed_images_are_decoded():
+    image_path = _get_test_image_path()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        changed_path = os.path.join(temp_dir, 'changed.jpg')
+        shutil.copy(image_path, changed_path)
+
+        store = ImageShardStore(os.path.join(temp_dir, 'shards'))
+        store.build([changed_path])
+
+        # Replacing the image with a different one after it was packed
+        cv2.imwrite(changed_path, 255 - cv2.imread(image_path))
+        os.utime(changed_path, (0, 0))
+        images = store.get_image_features([changed_path])
+        store = None
+
+        assert np.array_equal(images, get_images([changed_path]))
@@ -0,0 +1,40 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from pre_processing.keyword_tagging import KeywordTagger
+from pre_processing.known_find_and_replace_items import diagnosis, locations, planes
+
+TEXTS = ['is this a B-cell lymphoma?', 'cell', 'infarction or infarct', 'mammo - mlo and mammo - mag cc',
+         'what is seen in the lung, mediastinum, pleura?', 'Renal cell carcinoma', 'arteriovenous malformation',
+         'bone-cyst', 'nothing relevant', 'spinalcord', 'acute spinal cord injury', 'lateral, ap and pa views', '']
+
+
+def _find_per_word(words, text):
+    return {w for w in words if re.search(r'\b{0}\b'.format(re.escape(w)), text, re.I)}
+
+
+def test_parity_with_per_word_search():
+    for words in [diagnosis, locations, planes]:
+        tagger = KeywordTagger(words)
+        for text in TEXTS:
+            assert tagger.find(text) == _find_per_word(words, text), text
+
+
+def test_overlapping_words():
+    tagger = KeywordTagger(['b', 'b-cell', 'cell', 'cell line'])
+    assert tagger.find('a B-cell line') == {'b', 'b-cell', 'cell', 'cell line'}
+    assert tagger.find('cellular') == set()
+
+
+def test_tag_columns():
+    df = pd.DataFrame({'question': ['any fracture?', 'is it a cyst?', np.nan],
+                       'answer': ['hernia and fracture', 'no', 'tumor']}, index=[3, 1, 2])
+    tagger = KeywordTagger(diagnosis)
+
+    tags = tagger.tag(df, search_columns=['question', 'answer'])
+
+    assert tags.index.equals(df.index)
+    assert tags.tolist() == [{'fracture', 'hernia'}, {'cyst'}, {'tumor'}]
+    assert tagger.to_string(tags[3]) == 'fracture hernia'
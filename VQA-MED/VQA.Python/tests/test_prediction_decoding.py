@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.functions import probabilities_to_words
+
+
+def _legacy_probabilities_to_words(probabilities, words_decoder, percentile, allow_multi_predictions):
+    """The row by row decoding that was used by VqaModelPredictor._predict_keras"""
+    predictions, probabilities_strs = [], []
+    for curr_p in probabilities:
+        curr_percentile = np.percentile(curr_p, percentile)
+        pass_vals = [(i, v) for i, v in enumerate(curr_p) if v >= curr_percentile]
+        prediction_df = pd.DataFrame({'prediction': list(words_decoder.iloc[[i for i, _ in pass_vals]].str.strip().values),
+                                      'probabilities': [v for _, v in pass_vals]}
+                                     ).sort_values(by='probabilities', ascending=False).reset_index(drop=True)
+        if not allow_multi_predictions:
+            prediction_df = prediction_df.head(1)
+        predictions.append(' '.join([str(w) for w in prediction_df.prediction.values]))
+        probabilities_strs.append(', '.join(['({:.3f})'.format(p) for p in prediction_df.probabilities.values]))
+    return predictions, probabilities_strs
+
+
+@pytest.mark.parametrize("allow_multi_predictions", [True, False])
+@pytest.mark.parametrize("percentile", [99.8, 90, 50])
+def test_decoding_matches_row_by_row_decoding(allow_multi_predictions, percentile):
+    rnd = np.random.RandomState(42)
+    probabilities = rnd.dirichlet(np.ones(300) * 0.1, size=50)
+    words_decoder = pd.Series([f' word_{i} ' for i in range(probabilities.shape[1])])
+
+    expected = _legacy_probabilities_to_words(probabilities, words_decoder, percentile, allow_multi_predictions)
+    actual = probabilities_to_words(probabilities, words_decoder.values, percentile,
+                                    allow_multi_predictions=allow_multi_predictions)
+
+    assert actual == expected
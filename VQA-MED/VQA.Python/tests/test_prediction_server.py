@@ -0,0 +1,92 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+from parsers.prediction_server import PredictionService, _ThreadingHTTPServer, _get_request_handler
+
+
+class _EchoPredictionService(PredictionService):
+    """A service with no models, that answers each question with itself"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batch_sizes = []
+        self.release = threading.Event()
+
+    def _load(self):
+        pass
+
+    def _predict_batch(self, items):
+        self.release.wait()
+        if any(question == 'fail' for question, _ in items):
+            raise ValueError('Failed on purpose')
+        self.batch_sizes.append(len(items))
+        return [{'question': question, 'prediction': question.upper()} for question, _ in items]
+
+
+def test_requests_are_micro_batched():
+    service = _EchoPredictionService(max_batch_size=8, max_wait_ms=50)
+    service.start()
+    try:
+        # Blocking the worker on the first request, so the rest of the requests are batched together
+        first = service.submit('first', 'image.jpg')
+        futures = [service.submit(f'question {i}', 'image.jpg') for i in range(5)]
+        service.release.set()
+
+        assert first.result(timeout=5)['prediction'] == 'FIRST'
+        assert [f.result(timeout=5)['prediction'] for f in futures] == [f'QUESTION {i}' for i in range(5)]
+        assert max(service.batch_sizes) > 1
+        assert service.stats['requests'] == 6
+        assert service.stats['p99_ms'] >= service.stats['p50_ms']
+    finally:
+        service.stop()
+
+
+def test_failing_request_does_not_fail_its_batch():
+    service = _EchoPredictionService(max_batch_size=8, max_wait_ms=50)
+    service.release.set()
+    service.start()
+    try:
+        results = service.predict([{'question': 'ok', 'image_path': 'image.jpg'},
+                                   {'question': 'fail', 'image_path': 'image.jpg'}], timeout=5)
+    finally:
+        service.stop()
+
+    assert results[0]['prediction'] == 'OK'
+    assert 'error' in results[1]
+
+
+def _post(url, body: str) -> (int, object):
+    request = urllib.request.Request(url, data=body.encode('utf-8'), method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as ex:
+        return ex.code, json.loads(ex.read().decode('utf-8'))
+
+
+def test_bad_requests_get_errors():
+    service = _EchoPredictionService(max_batch_size=8, max_wait_ms=50)
+    service.release.set()
+    service.start()
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _get_request_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/predict'
+    try:
+        batch = {'requests': [{'question': 'ok', 'image_path': 'image.jpg'},
+                              {'question': '', 'image_path': 'image.jpg'},
+                              'not a request']}
+        status, response = _post(url, json.dumps(batch))
+        assert status == 200
+        results = response['results']
+        assert results[0]['prediction'] == 'OK'
+        assert 'error' in results[1] and 'error' in results[2]
+
+        for body in ['[]', '"x"', '{"requests": "x"}']:
+            status, response = _post(url, body)
+            assert status == 400 and 'error' in response, body
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.stop()
@@ -0,0 +1,62 @@
+import pytest
+
+from evaluate.BleuEvaluator import BleuEvaluator
+from evaluate.StrictAccuracyEvaluator import StrictAccuracyEvaluator
+from evaluate.VqaMedEvaluatorBase import VqaMedEvaluatorBase
+from evaluate.WbssEvaluator import WbssEvaluator
+from evaluate.streaming_evaluator import StreamingEvaluator, sum_in_order
+from common.exceptions import InvalidArgumentException
+from tests.conftest import skip_without_nltk_data
+
+
+GROUND_TRUTH = ['axial ct', 'stomach', 'chest x ray', 'fracture', 'mri', 'no', 'head ct ct', 'abdomen', 'Yes']
+PREDICTIONS = ['ct', 'abdomen', 'x ray chest', 'fracture', '  ', 'yes', 'ct head', 'stomach cancer', 'yes.']
+
+
+def test_batches_match_single_pass(get_evaluator):
+    single = get_evaluator()
+    single.update(PREDICTIONS, GROUND_TRUTH)
+
+    batched = get_evaluator()
+    for start in range(0, len(PREDICTIONS), 4):
+        batched.update(PREDICTIONS[start:start + 4], GROUND_TRUTH[start:start + 4])
+
+    assert batched.count == single.count == len(PREDICTIONS)
+    assert batched.result() == pytest.approx(single.result(), abs=1e-12)
+    assert list(single.result().keys()) == list(StreamingEvaluator.METRICS)
+
+
+def test_strict_accuracy_matches_evaluator(get_evaluator):
+    evaluator = get_evaluator(metrics=['strict_accuracy'])
+    df_scores = evaluator.update(PREDICTIONS, GROUND_TRUTH)
+
+    expected = StrictAccuracyEvaluator(predictions=PREDICTIONS, ground_truth=GROUND_TRUTH).evaluate()
+    assert evaluator.result()['strict_accuracy'] == expected
+    assert len(df_scores) == len(PREDICTIONS)
+
+
+def test_get_all_evaluation_matches_per_pair_evaluators():
+    skip_without_nltk_data('tokenizers/punkt', 'corpora/stopwords', 'corpora/wordnet')
+    evaluations = VqaMedEvaluatorBase.get_all_evaluation(predictions=PREDICTIONS, ground_truth=GROUND_TRUTH)
+
+    bleu_evaluator = BleuEvaluator(predictions=PREDICTIONS, ground_truth=GROUND_TRUTH)
+    wbss_evaluator = WbssEvaluator(predictions=PREDICTIONS, ground_truth=GROUND_TRUTH)
+    expected = {
+        'strict_accuracy': StrictAccuracyEvaluator(predictions=PREDICTIONS, ground_truth=GROUND_TRUTH).evaluate(),
+        'bleu': bleu_evaluator._compute_bleu_per_pair(bleu_evaluator.predictions, bleu_evaluator.ground_truth),
+        'wbss': wbss_evaluator._compute_wbss_per_pair(wbss_evaluator.predictions, wbss_evaluator.ground_truth)}
+    assert evaluations == pytest.approx(expected, abs=1e-12)
+
+
+def test_sum_in_order():
+    scores = [0.1] * 10 + [1e16, 1.0, -1e16]
+    total = 0.0
+    for score in scores:
+        total += score
+    assert sum_in_order(scores) == total
+    assert sum_in_order(scores[3:], start=sum_in_order(scores[:3])) == total
+
+
+def test_unknown_metric():
+    with pytest.raises(InvalidArgumentException):
+        StreamingEvaluator(metrics=['rouge'])
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from pre_processing.text_embedding import TextEmbedder
+
+INPUT_LENGTH = 4
+EMBEDDING_DIM = 3
+
+
+class _Token(object):
+    def __init__(self, text, position):
+        self.text = text
+        # Static vectors depend on the word only, context sensitive ones on its position as well
+        self.vector = np.full(EMBEDDING_DIM, len(text) + (0 if _FakeNlp.static else 10 * position), dtype=float)
+
+
+class _FakeNlp(object):
+    """Tokenizes by white spaces, and counts the texts it processed"""
+    static = True
+    pipe_names = ['tagger', 'parser', 'ner']
+
+    class _Vectors(object):
+        size = 0
+
+    class _Vocab(object):
+        pass
+
+    def __init__(self, static):
+        _FakeNlp.static = static
+        self.vocab = self._Vocab()
+        self.vocab.vectors = self._Vectors()
+        self.vocab.vectors.size = 10 if static else 0
+        self.processed_texts = []
+        self.tokenizer = self
+
+    def _make_doc(self, txt):
+        self.processed_texts.append(txt)
+        return [_Token(w, i) for i, w in enumerate(txt.split())]
+
+    def pipe(self, texts, batch_size=None, disable=None):
+        return (self._make_doc(txt) for txt in texts)
+
+
+@pytest.mark.parametrize("static", [True, False])
+def test_embeddings(static):
+    nlp = _FakeNlp(static)
+    embedder = TextEmbedder(nlp=nlp, input_length=INPUT_LENGTH, embedding_dim=EMBEDDING_DIM)
+    texts = ['what modality is shown', '', 'what modality is shown', 'a b c d e f', None]
+
+    embeddings = embedder.embed(texts)
+
+    assert embeddings.dtype == np.float32
+    assert embeddings.shape == (len(texts), INPUT_LENGTH * EMBEDDING_DIM)
+    assert nlp.processed_texts == ['what modality is shown', 'a b c d e f'], 'Expected each text to be embedded once'
+    assert np.array_equal(embeddings[0], embeddings[2])
+    assert not embeddings[1].any() and not embeddings[4].any(), 'Expected empty texts to have a zero embedding'
+
+    first_token = embeddings[0].reshape(INPUT_LENGTH, EMBEDDING_DIM)[0]
+    assert np.all(first_token == len('what'))
+
+    embedder.embed(['what modality is shown'])
+    assert len(nlp.processed_texts) == 2, 'Expected embeddings to be memoized'
+
+
+def test_unique_embeddings():
+    embedder = TextEmbedder(nlp=_FakeNlp(static=True), input_length=INPUT_LENGTH, embedding_dim=EMBEDDING_DIM)
+    texts = ['what modality is shown', None, 'what modality is shown', 'is this ct', '']
+
+    codes, table = embedder.embed_unique(texts)
+
+    assert list(codes) == [0, 1, 0, 2, 1], 'Expected a row per distinct text, with empty texts sharing a row'
+    assert table.shape == (3, INPUT_LENGTH * EMBEDDING_DIM)
+    assert np.array_equal(table[codes], embedder.embed(texts))
+
+
+def test_memo_is_bounded():
+    nlp = _FakeNlp(static=True)
+    embedder = TextEmbedder(nlp=nlp, input_length=INPUT_LENGTH, embedding_dim=EMBEDDING_DIM, max_memo_size=3)
+    texts = [f'question number {i}' for i in range(5)]
+
+    embeddings = embedder.embed(texts + texts[:2])
+
+    assert np.array_equal(embeddings[:2], embeddings[5:])
+    assert len(embedder._embedding_by_text) <= 3 and len(embedder._vector_by_token) <= 3
+    embedder.embed(texts[:2])
+    embedder.embed(texts[2:])
+    assert len(embedder._embedding_by_text) <= 3
+    assert np.array_equal(embedder.embed(texts), embeddings[:5])
@@ -0,0 +1,93 @@
+import re
+
+import pandas as pd
+import pytest
+
+from common.exceptions import InvalidArgumentException
+from evaluate.text_normalization import TextNormalizer, CONTRACTIONS, MANUAL_MAP, ARTICLES, PUNCTUATION
+
+
+class _ReferenceNormalizer(object):
+    """The original StrictAccuracyEvaluator normalization, character by character"""
+    period_strip = re.compile(r"(?!<=\d)(\.)(?!\d)")
+    comma_strip = re.compile(r"(\d)(,)(\d)")
+
+    def __init__(self):
+        self.contractions = dict(CONTRACTIONS)
+        self.manualMap = dict(MANUAL_MAP)
+        self.articles = list(ARTICLES)
+        self.punctuation = list(PUNCTUATION)
+
+    def normalize(self, text):
+        return self._process_digit_article(self._process_punctuation(text))
+
+    def clean_prediction_spaces(self, prediction):
+        return prediction.replace('\n', ' ').replace('\t', ' ').strip()
+
+    def _process_punctuation(self, text):
+        out_text = text
+        for p in self.punctuation:
+            if (p + ' ' in text or ' ' + p in text) or (re.search(self.comma_strip, text) is not None):
+                out_text = out_text.replace(p, '')
+            else:
+                out_text = out_text.replace(p, ' ')
+        out_text = self.period_strip.sub("", out_text, re.UNICODE)
+        return out_text
+
+    def _process_digit_article(self, text):
+        out_text = []
+        for word in text.lower().split():
+            word = self.manualMap.setdefault(word, word)
+            if word not in self.articles:
+                out_text.append(word)
+        for wordId, word in enumerate(out_text):
+            if word in self.contractions:
+                out_text[wordId] = self.contractions[word]
+        return ' '.join(out_text)
+
+
+TEXTS = ['Axial', 'the left kidney', 'An MRI - T2 weighted', 'yes.', 'Yes', 'no!', 'dont know', 'Im sure, its',
+         '1,000 cells', '1, 2 and 3', 'one two three ten', 'a (b) [c] {d}', 'x-ray', 'x - ray', 'ct/mri', 'ct / mri',
+         '3.5 cm mass.', 'e.g. i.e. etc.', 'a' + '.b' * 40, 'hello__world', '"quoted"', 'what?', '', '   ',
+         'line\nbreak\tand tab  ', 'weird @`<>=+\\ chars', 'cant, wont; shouldve', 'the a an', 'Ive Im Id\'ve',
+         'none-zero', 'ow\'s\'at', 'y\'allll youre']
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_parity(text):
+    reference = _ReferenceNormalizer()
+    normalizer = TextNormalizer()
+
+    assert normalizer.normalize(text) == reference.normalize(text)
+    assert normalizer.normalize_prediction(text) == reference.normalize(reference.clean_prediction_spaces(text))
+
+
+def test_series_parity():
+    reference = _ReferenceNormalizer()
+    normalizer = TextNormalizer(max_memo_size=5)
+    texts = pd.Series(TEXTS * 2, index=range(100, 100 + 2 * len(TEXTS)))
+
+    normalized = normalizer.normalize_series(texts)
+    normalized_predictions = normalizer.normalize_series(texts, is_prediction=True)
+
+    assert normalized.index.equals(texts.index)
+    assert normalized.tolist() == [reference.normalize(t) for t in texts]
+    assert normalized_predictions.tolist() == [reference.normalize(reference.clean_prediction_spaces(t))
+                                               for t in texts]
+    assert len(normalizer) <= 5
+
+
+@pytest.mark.parametrize('texts', [['yes', None, 'no'], [None, None], ['yes', float('nan')]])
+def test_missing_values_are_rejected(texts):
+    normalizer = TextNormalizer()
+    with pytest.raises(InvalidArgumentException):
+        normalizer.normalize_series(texts, is_prediction=True)
+    with pytest.raises(InvalidArgumentException):
+        normalizer.normalize_series(texts)
+
+
+def test_memo_is_bounded():
+    normalizer = TextNormalizer(max_memo_size=3)
+    normalizer.normalize_series([f'word{i} other{i}' for i in range(10)])
+    assert len(normalizer) <= 3
+    assert len(normalizer._words) <= 3
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from evaluate.WbssEvaluator import WbssEvaluator
+from evaluate.wbss_engine import WbssEngine, benchmark
+
+GROUND_TRUTH = ['axial ct', 'stomach', 'chest x ray', 'fracture', 'mri', 'no', 'head ct ct', 'abdomen']
+PREDICTIONS = ['ct', 'abdomen', 'x ray chest', 'fracture', '  ', 'yes', 'ct head', 'stomach cancer']
+
+
+def test_engine_matches_per_pair_evaluation(fake_wordnet):
+    evaluator = WbssEvaluator(predictions=PREDICTIONS, ground_truth=GROUND_TRUTH)
+    expected = [1.0 if gt == p else 0.0 if p.strip() == '' else evaluator._calculateWBSS(gt, p)
+                for gt, p in zip(GROUND_TRUTH, PREDICTIONS)]
+
+    engine = WbssEngine(word_similarity=fake_wordnet, max_chunk_size=3)
+    scores = engine.score_pairs(GROUND_TRUTH, PREDICTIONS)
+
+    assert np.allclose(scores, expected, rtol=0, atol=1e-12)
+
+
+def test_only_needed_pairs_are_computed(fake_similarity):
+    calls = []
+
+    def counting_similarity(word1, word2):
+        calls.append((word1, word2))
+        return fake_similarity(word1, word2)
+
+    engine = WbssEngine(word_similarity=counting_similarity)
+    engine.score_pairs(['chest x ray', 'head'], ['x ray', 'skull'])
+
+    # Only words of the same (ground truth, prediction) pair are compared, each pair of words once
+    expected_pairs = {frozenset(p) for p in [('chest', 'x'), ('chest', 'ray'), ('x', 'ray'), ('head', 'skull')]}
+    assert {frozenset(c) for c in calls} == expected_pairs
+    assert len(calls) == len(expected_pairs)
+
+    engine.score_pairs(['ray x'], ['chest'])
+    assert len(calls) == len(expected_pairs), 'Expected known similarities not to be computed again'
+
+
+def test_benchmark(fake_wordnet):
+    results = benchmark(GROUND_TRUTH, PREDICTIONS, engine=WbssEngine(word_similarity=fake_wordnet))
+    assert results['pairs'] == len(GROUND_TRUTH)
+    assert results['engine_score'] == pytest.approx(results['per_pair_score'], abs=1e-12)
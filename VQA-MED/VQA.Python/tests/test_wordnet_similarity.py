@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+from evaluate.wordnet_similarity import WordSimilarityCache
+
+
+class _CountingSimilarity(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, word1, word2):
+        self.calls.append((word1, word2))
+        return len(set(word1) & set(word2)) / len(set(word1) | set(word2))
+
+
+def test_cache_is_symmetric_and_bounded():
+    compute = _CountingSimilarity()
+    cache = WordSimilarityCache(max_pairs=2)
+
+    similarity = cache.get_or_compute('chest', 'thorax', compute)
+    assert cache.get_or_compute('thorax', 'chest', compute) == similarity
+    assert len(compute.calls) == 1, 'Expected (b, a) to be served by the (a, b) entry'
+
+    cache.get_or_compute('ct', 'mri', compute)
+    cache.get_or_compute('head', 'skull', compute)
+    assert len(cache) == 2
+    assert cache.get('chest', 'thorax') is None, 'Expected the least recently used pair to be evicted'
+
+
+def test_similarities_persist_across_caches():
+    compute = _CountingSimilarity()
+    with tempfile.TemporaryDirectory() as folder:
+        db_location = os.path.join(folder, 'similarity.db')
+        cache = WordSimilarityCache(max_pairs=10, db_location=db_location)
+        similarity = cache.get_or_compute('abdomen', 'stomach', compute)
+        cache.close()
+
+        other_cache = WordSimilarityCache(max_pairs=10, db_location=db_location)
+        assert other_cache.get_or_compute('stomach', 'abdomen', compute) == similarity
+        assert len(compute.calls) == 1
+        assert other_cache.stats['db_hits'] == 1
+        other_cache.close()
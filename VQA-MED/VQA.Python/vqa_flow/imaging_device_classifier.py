@@ -7,7 +7,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
 
 from common.constatns import vqa_models_folder
-from common.functions import get_features
+from common.functions import get_images
 from keras import Model
 from keras.layers import Dense, BatchNormalization, Activation
 
@@ -111,11 +111,8 @@ def extract_features(df_test, df_train, devices):
     features_list = []
     labels_list = []
     for df in [df_train, df_test]:
-        features = get_features(df)
-        images_features = features[1]
-        # text = features[0]
-        # for t in text:
-        #     t[:] = 0
+        # The device is predicted by the image alone, so question embeddings are not gathered
+        images_features = get_images(df['path'])
 
         # labeler = LabelBinarizer()
         labeler = OneHotEncoder(sparse=False)
@@ -19,6 +19,7 @@ from data_access.api import DataAccess
 from common.settings import data_access as data_api
 
 from common.os_utils import File
+from common.functions import get_question_features
 from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
 
@@ -32,9 +33,10 @@ logger = logging.getLogger(__name__)
 CLASS_NAME = 'Modality'#'Organ'#'Plane'#'Abnormality'
 
 
-def get_classifier_data(df_arg: pd.DataFrame) -> (pd.DataFrame, dict):
-    df = df_arg.drop_duplicates(subset=['question'])
-    df.loc[:, 'x'] = df.question_embedding
+def get_classifier_data(df_arg: pd.DataFrame, question_embeddings: np.ndarray = None) -> (pd.DataFrame, dict):
+    df = df_arg.drop_duplicates(subset=['question']).copy()
+    # Embeddings are gathered for the distinct questions only
+    df['x'] = list(get_question_features(df, question_embeddings)[..., 0])
 
     lst_classes = sorted(df.question_category.drop_duplicates().values, key=lambda s: s == CLASS_NAME)
     classes = {v: i for i, v in enumerate(lst_classes)}
@@ -43,8 +45,7 @@ def get_classifier_data(df_arg: pd.DataFrame) -> (pd.DataFrame, dict):
 
 
 def get_data(data_access: DataAccess) -> pd.DataFrame:
-    df = data_access.load_processed_data(
-        columns=['question', 'answer', 'question_category', 'answer_embedding', 'question_embedding'])
+    df = data_access.load_processed_data(columns=['question', 'answer', 'question_category', 'question_embedding_idx'])
     return df
 
 
@@ -67,7 +68,7 @@ def main(data_access: DataAccess) -> None:
     ab_idx = ~(data.question_category == CLASS_NAME)
     data.loc[ab_idx, 'question_category'] = 'Else'
 
-    df, classes = get_classifier_data(data)
+    df, classes = get_classifier_data(data, data_access.load_embeddings('question_embedding'))
     desc = df.y.describe()
     print(desc)
 